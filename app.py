@@ -6,7 +6,7 @@ from collector.collector_routes import collector_bp
 from collector_admin.admin_routes import admin_bp
 from market.market_routes import market_bp
 from collector.init_db import init_database
-from collector.collector import DataCollector
+from collector.daemon import CollectorDaemon
 from jinja2 import ChoiceLoader, FileSystemLoader
 
 # 配置日志
@@ -65,8 +65,10 @@ try:
 except Exception as e:
     logging.error(f'数据库初始化失败: {str(e)}')
 
-# 初始化采集器
-collector = DataCollector.get_instance()
+# 采集器默认作为独立进程运行（python -m collector），
+# 设置 COLLECTOR_EMBEDDED=1 时在 Web 进程内启动（单进程开发环境使用）
+if os.getenv('COLLECTOR_EMBEDDED') == '1':
+    CollectorDaemon().start_background()
 
 # 注册蓝图
 app.register_blueprint(collector_bp)
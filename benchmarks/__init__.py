@@ -0,0 +1 @@
+# 性能基准测试脚本，需要本地 MySQL（读取 .env 中的数据库配置）
@@ -0,0 +1,128 @@
+"""
+采集器端到端基准测试
+在子进程中启动本地模拟市场接口，让 DataCollector 对它完整运行一段时间（采集、比对、写入 MySQL），
+报告采集次数/秒、订单数/秒、每个快照的数据库写入耗时和峰值内存。
+
+用法: python -m benchmarks.bench_collector --duration 60 --products 20 --size 3000 --mutation 0.1
+会在 collector_tasks 中创建服务器 --server 的临时任务并在结束后删除，请使用专用的基准测试数据库
+"""
+import sys
+import os
+import re
+import json
+import time
+import signal
+import socket
+import resource
+import argparse
+import subprocess
+
+# 添加项目根目录到系统路径
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from benchmarks.fake_market import URL_TEMPLATE, add_server_arguments, server_argv
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args):
+    """在子进程中启动模拟服务，避免其 CPU 和内存计入采集器"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fake_market', '--port', str(port), *server_argv(args)],
+        cwd=ROOT_DIR, stdout=subprocess.PIPE, text=True
+    )
+    process.stdout.readline()  # 启动提示
+    return process, URL_TEMPLATE.format(host='127.0.0.1', port=port)
+
+
+def stop_server(process):
+    """停止模拟服务并返回其请求统计"""
+    process.send_signal(signal.SIGINT)
+    output, _ = process.communicate(timeout=10)
+    match = re.search(r'请求统计: (\{.*\})', output)
+    return json.loads(match.group(1)) if match else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='采集器端到端基准测试')
+    parser.add_argument('--duration', type=float, default=60, help='运行时间（秒）')
+    parser.add_argument('--server', type=int, default=9, help='临时任务使用的服务器编号')
+    parser.add_argument('--products', type=int, default=20, help='临时任务数（商品 1..N）')
+    parser.add_argument('--workers', type=int, default=8, help='并发请求数')
+    parser.add_argument('--rate-limit', type=float, default=50.0, help='每秒最多请求数')
+    parser.add_argument('--interval', type=int, default=1, help='同一任务的最小采集间隔（秒）')
+    parser.add_argument('--archive-snapshots', action='store_true', help='同时写入原始快照归档')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_server(args)
+    # 采集器模块在导入时读取 SC_API_URL，必须先设置环境变量
+    os.environ['SC_API_URL'] = url
+
+    from collector.collector_config import FETCH_CONFIG, SCHEDULER_CONFIG, ARCHIVE_CONFIG
+    from collector.init_db import init_database, create_market_table
+    from collector.storage import drop_market_data
+    from collector.collector import DataCollector
+    from models.database import Database
+
+    FETCH_CONFIG.update(max_workers=args.workers, rate_limit=args.rate_limit, burst=args.workers)
+    SCHEDULER_CONFIG['request_budget'] = args.rate_limit
+    ARCHIVE_CONFIG['enabled'] = args.archive_snapshots
+
+    keys = [(args.server, product) for product in range(1, args.products + 1)]
+    db = Database()
+    collector = None
+    try:
+        init_database()
+        for server_type, product_type in keys:
+            drop_market_data(db, server_type, product_type)
+            create_market_table(db, server_type, product_type)
+        db.executemany("""
+            INSERT IGNORE INTO collector_tasks (server_type, product_type) VALUES (%s, %s)
+        """, keys)
+        db.execute("""
+            UPDATE collector_status
+            SET is_running = 1,
+                current_plan = %s,
+                request_interval = %s,
+                control_version = control_version + 1
+            WHERE id = 1
+        """, (json.dumps([{'server_type': s, 'product_type': p} for s, p in keys]), args.interval))
+
+        print(f"{len(keys)} 个任务，每个 {args.size} 条订单，变化比例 {args.mutation:.0%}，运行 {args.duration:.0f} 秒...")
+        started = time.perf_counter()
+        collector = DataCollector.get_instance()
+        if not collector.is_running:
+            collector.start_collection()
+        time.sleep(args.duration)
+        stats = dict(collector.stats)
+        elapsed = time.perf_counter() - started
+        collector.stop_collection("基准测试结束")
+    finally:
+        counters = stop_server(server)
+        for server_type, product_type in keys:
+            drop_market_data(db, server_type, product_type)
+        db.execute("DELETE FROM collector_tasks WHERE server_type = %s", (args.server,))
+        db.execute("DELETE FROM collector_batches WHERE server_type = %s", (args.server,))
+        db.execute("DELETE FROM collector_batch_summary WHERE server_type = %s", (args.server,))
+        db.close()
+
+    pipeline = stats.get('pipeline', {})
+    write = pipeline.get('write', {})
+    batch_size = pipeline.get('avg_batch_size') or 1
+    print(f"采集次数     {stats['fetch_count'] / elapsed:>10.1f} 次/秒（跳过 {stats['skip_count']}，失败 {stats['error_count']}）")
+    print(f"写入订单     {stats['order_count'] / elapsed:>10.0f} 条/秒")
+    print(f"写入耗时     {write.get('avg_ms', 0) / batch_size:>10.1f} ms/快照（平均每批 {batch_size} 个快照）")
+    print(f"排队耗时     {pipeline.get('queue_wait', {}).get('avg_ms', 0):>10.1f} ms")
+    print(f"峰值内存     {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:>10.1f} MB")
+    print(f"模拟服务统计 {counters}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+快照解析基准测试：旧版逐条循环（fromisoformat + 嵌套字典取值，每个快照所有订单都生成 SQL）
+对比列式解析和比对（只为新增和变化的订单生成 SQL）
+
+用法: python -m benchmarks.bench_parse --size 20000 --rounds 5
+只测试 CPU 部分（到生成 SQL 文本为止），不连接数据库
+"""
+import sys
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+from pymysql.converters import escape_item
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collector.columns import SnapshotColumns
+from collector.order_stream import parse_stream
+from collector.snapshot_index import OrderIndex
+from benchmarks.sample_data import load_sample, mutate
+
+
+def legacy_rows(data, batch_id):
+    """旧版 save_market_data 的逐条处理：每条订单解析时间并组装一行"""
+    rows = []
+    for item in data:
+        posted_time = datetime.fromisoformat(item['posted'].replace('Z', '+00:00'))
+        seller = item['seller']
+        rows.append((
+            item['id'], item['kind'], item['quantity'], item['quality'], item['price'],
+            seller['id'], seller['company'], seller['realmId'],
+            seller['certificates'], seller['contest_wins'], 1 if seller['npc'] else 0,
+            item['fees'], posted_time, batch_id, 1, 1, 'api'
+        ))
+    return rows
+
+
+def render(rows):
+    """与 Database.execute_values 相同的转义，生成 VALUES 部分的 SQL 文本"""
+    return ','.join('(' + ','.join(escape_item(v, 'utf8mb4') for v in row) + ')' for row in rows)
+
+
+def legacy(data, batch_id):
+    return render(legacy_rows(data, batch_id))
+
+
+def columnar(index, data, batch_id):
+    """列式处理：批量转换为列，在列上比对，只为变化的订单组装行"""
+    columns = SnapshotColumns.from_items(data)
+    diff = index.diff(columns)
+    sql = render(columns.row(entry[0], batch_id) for entry in diff.inserted + diff.changed)
+    index.apply(diff)
+    columns.summary()
+    return sql
+
+
+def measure(name, func, snapshots, orders):
+    started = time.perf_counter()
+    for i, snapshot in enumerate(snapshots):
+        func(snapshot, i)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<14} {orders / elapsed:>12.0f} 条/秒    {elapsed * 1000 / len(snapshots):>8.1f} ms/快照")
+    return orders / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='快照解析基准测试')
+    parser.add_argument('--sample', default='0_1.json', help='doc 目录下的样例文件')
+    parser.add_argument('--size', type=int, default=20000, help='每个快照的订单数')
+    parser.add_argument('--rounds', type=int, default=5, help='快照数')
+    parser.add_argument('--change-ratio', type=float, default=0.1, help='相邻快照发生变化的订单比例')
+    args = parser.parse_args()
+
+    base = load_sample(args.sample, args.size)
+    snapshots = [base] + [mutate(base, args.change_ratio, seed=i) for i in range(args.rounds - 1)]
+    bodies = [json.dumps(s).encode() for s in snapshots]
+    print(f"样例 {args.sample}，快照大小 {args.size} 条，{args.rounds} 个快照，变化比例 {args.change_ratio:.0%}")
+
+    orders = sum(len(s) for s in snapshots)
+    before = measure('逐条循环', legacy, snapshots, orders)
+    index = OrderIndex('bench')
+    after = measure('列式比对', lambda s, i: columnar(index, s, i), snapshots, orders)
+    print(f"提升 {after / before:.1f} 倍")
+
+    # 从响应体开始：json.loads + 逐条循环 对比 流式解析 + 列式比对
+    before = measure('loads+循环', lambda b, i: legacy(json.loads(b), i), bodies, orders)
+    index = OrderIndex('bench')
+
+    def streamed(body, batch_id):
+        columns = parse_stream(body[j:j + 65536] for j in range(0, len(body), 65536))
+        diff = index.diff(columns)
+        render(columns.row(entry[0], batch_id) for entry in diff.inserted + diff.changed)
+        index.apply(diff)
+
+    after = measure('流式+列式', streamed, bodies, orders)
+    print(f"提升 {after / before:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+市场表写入基准测试：逐行 UPDATE（旧写入路径）对比多行 upsert（MarketWriter），
+以及 LOAD DATA LOCAL INFILE 导入（需要 MySQL 开启 local_infile，未开启时该项会改用多行 upsert 并提示）
+
+用法: python -m benchmarks.bench_upsert --rows 3000 --rounds 5
+      python -m benchmarks.bench_upsert --rows 50000 --rounds 3 --skip-legacy
+在临时商品 {server}/{product} 上运行，结束后删除其市场数据和批次台账记录
+"""
+import sys
+import os
+import time
+import argparse
+from datetime import datetime
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from collector.init_db import init_database, create_market_table
+from collector.market_writer import MarketWriter
+from collector.columns import SnapshotColumns
+from collector.storage import drop_market_data, unified_layout
+from benchmarks.sample_data import load_sample, mutate
+
+
+def legacy_save(db, table_name, data, batch_id):
+    """旧版 save_market_data：IN 查询 + 逐行 UPDATE + 批量 INSERT"""
+    market_ids = [item['id'] for item in data]
+    records = db.fetch_all(f"""
+        SELECT market_id, data_version
+        FROM {table_name}
+        WHERE market_id IN ({','.join(['%s'] * len(market_ids))})
+    """, market_ids)
+    existing = {r['market_id']: r['data_version'] for r in records}
+
+    updates, inserts = [], []
+    for item in data:
+        posted_time = datetime.fromisoformat(item['posted'].replace('Z', '+00:00'))
+        if item['id'] in existing:
+            updates.append((
+                item['quantity'], item['quality'], item['price'], item['fees'],
+                posted_time, batch_id, existing[item['id']] + 1, item['id']
+            ))
+        else:
+            inserts.append((
+                item['id'], item['kind'], item['quantity'], item['quality'], item['price'],
+                item['seller']['id'], item['fees'], posted_time, batch_id, 1, 1, 'api'
+            ))
+
+    if updates:
+        db.executemany(f"""
+            UPDATE {table_name} SET
+                quantity = %s, quality = %s, price = %s,
+                fees = %s, posted_time = %s, batch_id = %s,
+                data_version = %s, updated_at = NOW()
+            WHERE market_id = %s
+        """, updates)
+    if inserts:
+        db.executemany(f"""
+            INSERT INTO {table_name} (
+                market_id, kind, quantity, quality, price,
+                seller_id, fees, posted_time,
+                batch_id, data_version, is_valid, data_source
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, inserts)
+
+
+def run_case(name, save, snapshots):
+    """依次写入快照，返回 (首次写入行/秒, 后续更新行/秒)"""
+    rates = []
+    for snapshot in snapshots:
+        started = time.perf_counter()
+        save(snapshot)
+        rates.append(len(snapshot) / (time.perf_counter() - started))
+    update_rate = sum(rates[1:]) / len(rates[1:]) if len(rates) > 1 else 0
+    print(f"{name:<10} 首次写入 {rates[0]:>10.0f} 行/秒    更新 {update_rate:>10.0f} 行/秒")
+    return rates[0], update_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='市场表写入基准测试')
+    parser.add_argument('--rows', type=int, default=3000, help='每个快照的订单数')
+    parser.add_argument('--rounds', type=int, default=5, help='更新轮数')
+    parser.add_argument('--change-ratio', type=float, default=1.0, help='每轮发生变化的订单比例')
+    parser.add_argument('--server', type=int, default=9, help='临时表的服务器编号')
+    parser.add_argument('--product', type=int, default=999, help='临时表的商品编号')
+    parser.add_argument('--skip-legacy', action='store_true', help='跳过逐行更新（快照很大时非常慢）')
+    args = parser.parse_args()
+
+    base = load_sample('0_1.json', args.rows)
+    snapshots = [base] + [mutate(base, args.change_ratio, seed=i) for i in range(args.rounds)]
+    table_name = f"market_{args.server}_{args.product}"
+
+    init_database()
+    db = Database(local_infile=True)
+    try:
+        print(f"快照大小 {args.rows} 条，更新 {args.rounds} 轮，变化比例 {args.change_ratio:.0%}")
+        batch = iter(range(1, 1_000_000))
+        columns = [SnapshotColumns.from_items(s) for s in snapshots]
+
+        before = None
+        if not args.skip_legacy and not unified_layout():  # 旧写入路径只支持单表布局
+            drop_market_data(db, args.server, args.product)
+            create_market_table(db, args.server, args.product)
+            before = run_case('逐行更新', lambda s: legacy_save(db, table_name, s, next(batch)), snapshots)
+
+        drop_market_data(db, args.server, args.product)
+        create_market_table(db, args.server, args.product)
+        writer = MarketWriter(db)
+        after = run_case('多行upsert', lambda s: writer.save(args.server, args.product, s), columns)
+
+        drop_market_data(db, args.server, args.product)
+        create_market_table(db, args.server, args.product)
+        bulk_writer = MarketWriter(db, bulk_threshold=1)
+        bulk = run_case('LOAD DATA', lambda s: bulk_writer.save(args.server, args.product, s), columns)
+        if bulk_writer.ingest['values'].count:
+            print("数据库未开启 local_infile，LOAD DATA 一项实际使用的是多行 upsert")
+
+        if before and before[1]:
+            print(f"多行upsert 更新吞吐提升 {after[1] / before[1]:.1f} 倍")
+        if after[0] and not bulk_writer.ingest['values'].count:
+            print(f"LOAD DATA 相对多行upsert：首次写入 {bulk[0] / after[0]:.1f} 倍，更新 {bulk[1] / after[1]:.1f} 倍")
+    finally:
+        drop_market_data(db, args.server, args.product)
+        for table_name in ('collector_batches', 'collector_batch_summary'):
+            db.execute(
+                f"DELETE FROM {table_name} WHERE server_type = %s AND product_type = %s",
+                (args.server, args.product)
+            )
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
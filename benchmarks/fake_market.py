@@ -0,0 +1,223 @@
+"""
+本地市场接口模拟服务
+按 simcompanies.com 的路径 /api/v3/market/all/{server_type}/{product_type}/ 返回订单数据，
+可配置订单数、响应延迟、每次请求的订单变化比例，以及 429 和超时的比例。
+支持 ETag / If-None-Match，数据没有变化时返回 304。
+
+用法:
+    python -m benchmarks.fake_market --port 8765 --size 3000 --latency 0.05 --mutation 0.1
+    SC_API_URL="http://127.0.0.1:8765/api/v3/market/all/{server_type}/{product_type}/" python -m collector
+
+数据来源：默认由 doc/0_1.json 放大生成；--archive 指定归档目录时按顺序循环返回归档中的原始响应
+"""
+import sys
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.sample_data import load_sample, mutate
+
+PATH_PREFIX = '/api/v3/market/all/'
+URL_TEMPLATE = 'http://{host}:{port}/api/v3/market/all/{{server_type}}/{{product_type}}/'
+
+
+class MarketState:
+    """每个 (server_type, product_type) 的当前快照，每次请求按变化比例演化"""
+
+    def __init__(self, size, mutation, sample='0_1.json', archive=None, seed=0):
+        self.size = size
+        self.mutation = mutation
+        self.sample = sample
+        self._rng = random.Random(seed)
+        self._bodies = {}      # key -> (body, etag)
+        self._orders = {}
+        self._recorded = self._load_archive(archive) if archive else None
+        self._lock = threading.Lock()
+
+    def body(self, key):
+        """返回本次请求的响应体和 ETag"""
+        with self._lock:
+            if self._recorded is not None:
+                return self._next_recorded(key)
+            orders = self._orders.get(key)
+            if orders is None:
+                orders = load_sample(self.sample, self.size)
+            elif self.mutation:
+                orders = mutate(orders, self.mutation, seed=self._rng.random())
+            else:
+                return self._bodies[key]
+            self._orders[key] = orders
+            body = json.dumps(orders).encode()
+            self._bodies[key] = (body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"')
+            return self._bodies[key]
+
+    def _next_recorded(self, key):
+        bodies = self._recorded.get(key) or self._recorded.get('*')
+        body = bodies[0]
+        bodies.rotate(-1)
+        return body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+    @staticmethod
+    def _load_archive(path):
+        """读取归档中的全部原始响应；没有对应商品的请求使用任意一个归档快照"""
+        from collector.archive import ArchiveReader, iter_index
+        reader = ArchiveReader()
+        recorded = {}
+        try:
+            for record in iter_index(path=path):
+                if record.unchanged:
+                    continue
+                body = reader.read(record)
+                recorded.setdefault((record.server_type, record.product_type), deque()).append(body)
+                recorded.setdefault('*', deque()).append(body)
+        finally:
+            reader.close()
+        if not recorded:
+            raise ValueError(f"归档目录 {path} 中没有记录")
+        return recorded
+
+
+class FakeMarketHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        parts = self.path[len(PATH_PREFIX):].strip('/').split('/') if self.path.startswith(PATH_PREFIX) else []
+        if len(parts) != 2 or not all(p.isdigit() for p in parts):
+            self._send(404, b'{"detail": "not found"}')
+            return
+
+        if server.latency:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+        roll = random.random()
+        if roll < server.rate_429:
+            server.count('throttled')
+            self._send(429, b'{"detail": "rate limited"}', {'Retry-After': str(server.retry_after)})
+            return
+        if roll < server.rate_429 + server.rate_timeout:
+            server.count('timeouts')
+            time.sleep(server.timeout_delay)  # 超过采集器的读取超时
+            self._send(504, b'{"detail": "timeout"}')
+            return
+
+        body, etag = server.state.body((int(parts[0]), int(parts[1])))
+        if self.headers.get('If-None-Match') == etag:
+            server.count('not_modified')
+            self._send(304, b'', {'ETag': etag})
+            return
+        server.count('payloads')
+        server.count('payload_bytes', len(body))
+        self._send(200, body, {'ETag': etag})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客户端已超时断开
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeMarketServer(ThreadingHTTPServer):
+    """模拟市场接口，counters 记录各类响应的次数"""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, size=3000, latency=0.0, mutation=0.1,
+                 rate_429=0.0, rate_timeout=0.0, timeout_delay=10.0, retry_after=2,
+                 sample='0_1.json', archive=None):
+        super().__init__((host, port), FakeMarketHandler)
+        self.state = MarketState(size, mutation, sample, archive)
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_timeout = rate_timeout
+        self.timeout_delay = timeout_delay
+        self.retry_after = retry_after
+        self.counters = {}
+        self._counter_lock = threading.Lock()
+
+    @property
+    def url_template(self):
+        host, port = self.server_address[:2]
+        return URL_TEMPLATE.format(host=host, port=port)
+
+    def count(self, name, value=1):
+        with self._counter_lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def start_background(self):
+        thread = threading.Thread(target=self.serve_forever, name='fake-market', daemon=True)
+        thread.start()
+        return thread
+
+
+def add_server_arguments(parser):
+    """模拟服务的命令行参数，bench_collector 复用"""
+    parser.add_argument('--size', type=int, default=3000, help='每个商品的订单数')
+    parser.add_argument('--latency', type=float, default=0.05, help='平均响应延迟（秒）')
+    parser.add_argument('--mutation', type=float, default=0.1, help='每次请求发生变化的订单比例，0 表示数据不变')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='返回 429 的请求比例')
+    parser.add_argument('--rate-timeout', type=float, default=0.0, help='超时的请求比例')
+    parser.add_argument('--timeout-delay', type=float, default=10.0, help='超时请求的等待时间（秒）')
+    parser.add_argument('--sample', default='0_1.json', help='doc 目录下的样例文件')
+    parser.add_argument('--archive', help='使用归档目录中的原始响应代替生成的数据')
+
+
+def server_argv(args):
+    """把 add_server_arguments 解析出的参数还原为命令行，用于在子进程中启动模拟服务"""
+    argv = [
+        '--size', str(args.size), '--latency', str(args.latency), '--mutation', str(args.mutation),
+        '--rate-429', str(args.rate_429), '--rate-timeout', str(args.rate_timeout),
+        '--timeout-delay', str(args.timeout_delay), '--sample', args.sample
+    ]
+    if args.archive:
+        argv += ['--archive', args.archive]
+    return argv
+
+
+def server_from_args(args, host='127.0.0.1', port=0):
+    return FakeMarketServer(
+        host, port, size=args.size, latency=args.latency, mutation=args.mutation,
+        rate_429=args.rate_429, rate_timeout=args.rate_timeout,
+        timeout_delay=args.timeout_delay, sample=args.sample, archive=args.archive
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地市场接口模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.host, args.port)
+    print(f"模拟市场接口已启动: SC_API_URL={server.url_template}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"请求统计: {json.dumps(server.counters)}", flush=True)
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+基准测试样例数据
+doc/0_1.json、doc/1_1.json 是展开后的订单格式，这里转换回接口返回的格式，
+并可按需复制放大到指定订单数
+"""
+import os
+import json
+import random
+
+DOC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'doc')
+
+
+def load_sample(name='0_1.json', size=None):
+    """读取样例文件并转换为接口格式，size 指定时复制放大（生成新的订单ID）"""
+    with open(os.path.join(DOC_DIR, name), encoding='utf-8') as f:
+        records = json.load(f)
+
+    orders = [
+        {
+            'id': r['order_id'],
+            'kind': r['kind'],
+            'quantity': r['quantity'],
+            'quality': r['quality'],
+            'price': r['price'],
+            'seller': {
+                'id': r['seller_id'],
+                'company': r['seller_company'],
+                'realmId': r['seller_realm_id'],
+                'logo': '',
+                'certificates': 0,
+                'contest_wins': 0,
+                'npc': False,
+                'courseId': None,
+                'ip': ''
+            },
+            'posted': r['posted_time'],
+            'fees': r['fees']
+        }
+        for r in records
+    ]
+
+    if size is None or size <= len(orders):
+        return orders[:size] if size else orders
+
+    base_id = max(o['id'] for o in orders) + 1
+    scaled = []
+    for i in range(size):
+        order = dict(orders[i % len(orders)])
+        order['id'] = base_id + i if i >= len(orders) else order['id']
+        scaled.append(order)
+    return scaled
+
+
+def mutate(orders, ratio, seed=None):
+    """返回修改了 ratio 比例订单价格和数量的新快照"""
+    rng = random.Random(seed)
+    result = []
+    for order in orders:
+        if rng.random() < ratio:
+            order = dict(order)
+            order['price'] = round(order['price'] * rng.uniform(0.95, 1.05), 3)
+            order['quantity'] = max(1, int(order['quantity'] * rng.uniform(0.5, 1.0)))
+        result.append(order)
+    return result
@@ -0,0 +1,50 @@
+"""
+独立运行采集进程: python -m collector [--sharded]
+默认同一时间只有持有采集锁的进程在采集，其余进程作为备用等待接管；
+--sharded 时所有进程同时采集，任务按进程自动分片
+"""
+import sys
+import os
+import argparse
+import logging
+from logging.handlers import RotatingFileHandler
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collector.collector_config import LOG_CONFIG
+from collector.daemon import CollectorDaemon
+
+
+def setup_logging():
+    """配置日志：与 Web 进程写入同一目录，使用独立的日志文件"""
+    log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    file_handler = RotatingFileHandler(
+        os.path.join(log_dir, 'collector_daemon.log'),
+        maxBytes=LOG_CONFIG['max_bytes'],
+        backupCount=LOG_CONFIG['backup_count'],
+        encoding='utf-8'
+    )
+    formatter = logging.Formatter(LOG_CONFIG['format'])
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(file_handler)
+    root_logger.addHandler(stream_handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SimCompanies 市场数据采集进程')
+    parser.add_argument('--sharded', action='store_true', help='分片模式：多个进程同时运行，各自采集一部分任务')
+    args = parser.parse_args()
+
+    setup_logging()
+    daemon = CollectorDaemon(sharded=args.sharded)
+    daemon.install_signal_handlers()
+    daemon.run()
@@ -0,0 +1,234 @@
+"""
+原始快照归档
+采集到的每个有变化的原始响应都追加写入压缩的段文件：每条记录是一个独立的 gzip member，
+段文件本身仍是合法的 gzip 文件；旁边的 .idx 文件按行记录
+(采集时间, 服务器, 商品, 偏移, 长度)，回放时按索引定位，不需要解压整个段。
+数据未变化的采集只在索引中记一行长度为 0 的记录（与该商品上一条记录的响应相同），
+重建价格汇总时据此补上在线汇总中未变化采集的样本。
+
+目录结构: {path}/{YYYY-MM-DD}/{HHMMSS}-{主机}-{进程号}.seg.gz
+超过 ARCHIVE_CONFIG["keep_days"] 天的日期目录、以及总大小超过 ARCHIVE_CONFIG["max_bytes"] 时最早的段文件
+由采集进程的清理线程（collector/retention.py 的 RetentionJob）删除，见 prune_archive
+"""
+import os
+import gzip
+import shutil
+import zlib
+import time
+import socket
+import threading
+import logging
+from datetime import datetime, timedelta
+
+from collector.collector_config import ARCHIVE_CONFIG
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def archive_root(path=None):
+    path = path or ARCHIVE_CONFIG['path']
+    return path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+
+
+class ArchiveRecord:
+    """索引中的一条记录"""
+
+    __slots__ = ('fetched_at', 'server_type', 'product_type', 'segment', 'offset', 'length')
+
+    def __init__(self, fetched_at, server_type, product_type, segment, offset, length):
+        self.fetched_at = fetched_at      # 采集时间(epoch秒)
+        self.server_type = server_type
+        self.product_type = product_type
+        self.segment = segment            # 段文件路径
+        self.offset = offset
+        self.length = length              # 0 表示数据未变化的采集，没有响应体
+
+    @property
+    def unchanged(self):
+        return self.length == 0
+
+
+class SnapshotArchive:
+    """只追加的段文件写入器，多个采集线程可以同时调用 append"""
+
+    def __init__(self, path=None, config=None):
+        config = dict(ARCHIVE_CONFIG, **(config or {}))
+        self.root = archive_root(path)
+        self.segment_size = config['segment_size']
+        self.compress_level = config['compress_level']
+        self._owner = f"{socket.gethostname()}-{os.getpid()}"
+        self._segment = None   # (日期, 数据文件, 索引文件)
+        self._lock = threading.Lock()
+
+    def compressor(self):
+        """流式压缩器，输出为一个完整的 gzip member，配合 append_compressed 使用"""
+        return zlib.compressobj(self.compress_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def append(self, server_type, product_type, body, fetched_at=None):
+        """追加一条原始响应"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        member = gzip.compress(body, compresslevel=self.compress_level, mtime=int(fetched_at))
+        self.append_compressed(server_type, product_type, member, fetched_at)
+
+    def append_compressed(self, server_type, product_type, member, fetched_at=None):
+        """追加一条已压缩为 gzip member 的原始响应"""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._lock:
+            data_file, index_file = self._current(fetched_at)
+            offset = data_file.tell()
+            if member:
+                data_file.write(member)
+                data_file.flush()
+            index_file.write(f"{fetched_at:.3f}\t{server_type}\t{product_type}\t{offset}\t{len(member)}\n")
+            index_file.flush()
+
+    def append_unchanged(self, server_type, product_type, fetched_at=None):
+        """记录一次数据未变化的采集：只写索引，不写响应体"""
+        self.append_compressed(server_type, product_type, b'', fetched_at)
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+    def _current(self, fetched_at):
+        """返回当前段文件，日期变化或超过段大小时切换到新段"""
+        day = datetime.fromtimestamp(fetched_at).strftime('%Y-%m-%d')
+        if self._segment is not None:
+            segment_day, data_file, index_file = self._segment
+            if segment_day == day and data_file.tell() < self.segment_size:
+                return data_file, index_file
+            self._close_segment()
+
+        directory = os.path.join(self.root, day)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.fromtimestamp(fetched_at).strftime('%H%M%S')}-{self._owner}"
+        data_path = os.path.join(directory, f"{name}.seg.gz")
+        data_file = open(data_path, 'ab')
+        index_file = open(f"{data_path}.idx", 'a', encoding='utf-8')
+        self._segment = (day, data_file, index_file)
+        logger.info(f"开始写入归档段文件: {data_path}")
+        return data_file, index_file
+
+    def _close_segment(self):
+        if self._segment is not None:
+            _, data_file, index_file = self._segment
+            data_file.close()
+            index_file.close()
+            self._segment = None
+
+
+def iter_index(start=None, end=None, server_type=None, product_type=None, path=None):
+    """按条件读取索引，按采集时间排序返回 ArchiveRecord 列表"""
+    root = archive_root(path)
+    if not os.path.isdir(root):
+        return []
+    start_day = datetime.fromtimestamp(start).strftime('%Y-%m-%d') if start else None
+    end_day = datetime.fromtimestamp(end).strftime('%Y-%m-%d') if end else None
+
+    records = []
+    for day in sorted(os.listdir(root)):
+        if (start_day and day < start_day) or (end_day and day > end_day):
+            continue
+        directory = os.path.join(root, day)
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.seg.gz.idx'):
+                continue
+            segment = os.path.join(directory, name[:-len('.idx')])
+            with open(os.path.join(directory, name), encoding='utf-8') as index_file:
+                for line in index_file:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) != 5:
+                        continue  # 写入中断的最后一行
+                    record = ArchiveRecord(
+                        float(parts[0]), int(parts[1]), int(parts[2]),
+                        segment, int(parts[3]), int(parts[4])
+                    )
+                    if start and record.fetched_at < start:
+                        continue
+                    if end and record.fetched_at >= end:
+                        continue
+                    if server_type is not None and record.server_type != server_type:
+                        continue
+                    if product_type is not None and record.product_type != product_type:
+                        continue
+                    records.append(record)
+    records.sort(key=lambda r: r.fetched_at)
+    return records
+
+
+class ArchiveReader:
+    """按索引记录读取原始响应，复用打开的段文件"""
+
+    def __init__(self):
+        self._files = {}
+
+    def read(self, record):
+        """读取记录的原始响应，数据未变化的记录没有响应体，调用方应先检查 record.unchanged"""
+        if record.unchanged:
+            raise ValueError("数据未变化的归档记录没有响应体")
+        data_file = self._files.get(record.segment)
+        if data_file is None:
+            data_file = self._files[record.segment] = open(record.segment, 'rb')
+        data_file.seek(record.offset)
+        return gzip.decompress(data_file.read(record.length))
+
+    def close(self):
+        for data_file in self._files.values():
+            data_file.close()
+        self._files.clear()
+
+
+def prune_archive(keep_days=None, max_bytes=None, path=None):
+    """删除过期的归档：早于 keep_days 天的日期目录整个删除；总大小仍超过 max_bytes 时从最早的段文件开始删除，
+    当天的目录不按大小删除（其中的段文件可能正在写入）。返回 (删除的段文件数, 释放的字节数)"""
+    keep_days = ARCHIVE_CONFIG.get('keep_days') if keep_days is None else keep_days
+    max_bytes = ARCHIVE_CONFIG.get('max_bytes') if max_bytes is None else max_bytes
+    root = archive_root(path)
+    if not os.path.isdir(root):
+        return 0, 0
+
+    segments = []  # (日期, 段文件路径, 段文件和索引的字节数)
+    for day in sorted(os.listdir(root)):
+        directory = os.path.join(root, day)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.seg.gz'):
+                segment = os.path.join(directory, name)
+                size = 0
+                for file_path in (segment, f"{segment}.idx"):
+                    try:
+                        size += os.path.getsize(file_path)
+                    except OSError:
+                        pass
+                segments.append((day, segment, size))
+
+    cutoff = (datetime.now() - timedelta(days=keep_days)).strftime('%Y-%m-%d') if keep_days else None
+    today = datetime.now().strftime('%Y-%m-%d')
+    total = sum(size for _, _, size in segments)
+    removed = freed = 0
+    for day, segment, size in segments:
+        expired = cutoff is not None and day < cutoff
+        oversize = max_bytes is not None and total > max_bytes and day < today
+        if not expired and not oversize:
+            continue
+        for file_path in (segment, f"{segment}.idx"):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass  # 同一主机上的其他采集进程已经删除
+        total -= size
+        removed += 1
+        freed += size
+
+    # 删除已经清空的日期目录
+    for day in os.listdir(root):
+        directory = os.path.join(root, day)
+        if day < today and os.path.isdir(directory) and not os.listdir(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+    if removed:
+        logger.info(f"清理归档: 删除 {removed} 个段文件，释放 {freed / 1024 / 1024:.1f}MB")
+    return removed, freed
@@ -0,0 +1,118 @@
+"""
+采集批次台账
+每个写入的快照在 collector_batches 中占一行，自增主键即批次号（batch_id），
+记录采集起止时间、响应字节数、订单数、新增/更新/下架数和数据库写入耗时。
+collector_batch_summary 为每个任务保存累计批次数和最新批次号，与台账在同一个事务中更新，
+后台查询各任务的批次数和最新批次只需读取汇总表并按主键读取台账，不扫描台账和市场表
+"""
+import time
+import logging
+from datetime import datetime, timezone
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+class FetchInfo:
+    """快照的采集信息（采集起止时间为 epoch 秒）；FetchResult 带有同名属性，可以直接使用。
+    batch_id 为台账中已有的批次（回放已采集过的快照时），设置后不再登记新的批次"""
+
+    __slots__ = ('started_at', 'finished_at', 'http_bytes', 'batch_id')
+
+    def __init__(self, started_at=None, finished_at=None, http_bytes=None, batch_id=None):
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.http_bytes = http_bytes
+        self.batch_id = batch_id
+
+
+def _utc(epoch):
+    """epoch 秒转换为不带时区的 UTC 时间（与市场表 posted_time 一致）"""
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+def open_batch(db, server_type, product_type, fetch, diff):
+    """写入快照前登记批次，返回新的批次号；fetch 带有已登记的批次号时直接返回该批次号"""
+    fetch = fetch or FetchInfo(finished_at=time.time())
+    if getattr(fetch, 'batch_id', None):
+        return fetch.batch_id
+    db.execute("""
+        INSERT INTO collector_batches (
+            server_type, product_type, fetch_started_at, fetch_finished_at, http_bytes,
+            order_count, inserted_count, updated_count, removed_count
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        server_type, product_type, _utc(fetch.started_at), _utc(fetch.finished_at), fetch.http_bytes,
+        len(diff.columns), len(diff.inserted), len(diff.changed), len(diff.removed)
+    ))
+    return db.lastrowid
+
+
+def record_write_times(db, timings):
+    """批量记录各批次的写入耗时 [(batch_id, 毫秒)]，一条语句完成"""
+    if not timings:
+        return
+    params = [value for timing in timings for value in timing]
+    params.extend(batch_id for batch_id, _ in timings)
+    db.execute(f"""
+        UPDATE collector_batches
+        SET write_ms = CASE id {' '.join(['WHEN %s THEN %s'] * len(timings))} END
+        WHERE id IN ({','.join(['%s'] * len(timings))})
+    """, params)
+
+
+def record_batches(db, opened):
+    """更新任务的批次汇总 [(server_type, product_type, batch_id)]：批次数累加、最新批次号取最大值，
+    每批快照一条多行 upsert（按任务排序，多个写入进程之间加锁顺序一致）"""
+    if not opened:
+        return
+    summary = {}
+    for server_type, product_type, batch_id in opened:
+        count, last = summary.get((server_type, product_type), (0, 0))
+        summary[(server_type, product_type)] = (count + 1, max(last, batch_id))
+    db.execute_values(
+        "INSERT INTO collector_batch_summary (server_type, product_type, batch_count, last_batch_id) VALUES",
+        ((*key, count, last) for key, (count, last) in sorted(summary.items())),
+        "(%s, %s, %s, %s)",
+        """ON DUPLICATE KEY UPDATE
+            batch_count = batch_count + VALUES(batch_count),
+            last_batch_id = GREATEST(last_batch_id, VALUES(last_batch_id))"""
+    )
+
+
+def find_batches(db, start=None, end=None):
+    """按采集完成时间查找已登记的批次，返回 {(server_type, product_type, 采集完成时间(epoch毫秒)): batch_id}；
+    fetch_finished_at 没有索引，只供回放等离线工具使用"""
+    conditions = ["fetch_finished_at IS NOT NULL"]
+    params = []
+    if start is not None:
+        conditions.append("fetch_finished_at >= %s")
+        params.append(_utc(start))
+    if end is not None:
+        conditions.append("fetch_finished_at < %s")
+        params.append(_utc(end))
+    rows = db.fetch_all(f"""
+        SELECT id, server_type, product_type, fetch_finished_at
+        FROM collector_batches
+        WHERE {' AND '.join(conditions)}
+    """, params)
+    return {
+        (row['server_type'], row['product_type'],
+         round(row['fetch_finished_at'].replace(tzinfo=timezone.utc).timestamp() * 1000)): row['id']
+        for row in rows
+    }
+
+
+def latest_batches(db):
+    """各任务的累计批次数和最新批次，返回 {(server_type, product_type): row}；
+    最新批次已被数据清理删除时，row 中该批次的字段为 None"""
+    rows = db.fetch_all("""
+        SELECT s.server_type, s.product_type, s.batch_count, s.last_batch_id AS batch_id,
+               b.order_count, b.inserted_count, b.updated_count, b.removed_count,
+               b.write_ms, b.created_at
+        FROM collector_batch_summary s
+        LEFT JOIN collector_batches b ON b.id = s.last_batch_id
+    """)
+    return {(row['server_type'], row['product_type']): row for row in rows}
@@ -0,0 +1,93 @@
+"""
+表目录缓存
+进程内缓存当前数据库中全部表及其字段，一次 information_schema.columns 查询加载，
+建表、删表、加字段后由调用方使之失效。表是否存在、字段是否齐全、市场表列表和
+接口中的表名校验都通过这里判断，不再为每个任务单独查询 information_schema。
+
+其他进程（采集进程和 Web 进程）建表时本进程不会立即知道：缓存超过 CATALOG_CONFIG["ttl"] 后重新加载，
+查询不存在的表时最多每 CATALOG_CONFIG["miss_refresh"] 秒重新加载一次。
+其他进程删除的表在缓存中仍显示存在，访问时数据库返回 1146（表不存在），
+调用方在异常处理中调用 catalog.missing_table(e)，缓存随即失效
+"""
+import re
+import time
+import threading
+import logging
+
+import pymysql
+
+from collector.collector_config import CATALOG_CONFIG
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+MARKET_TABLE_PATTERN = re.compile(r'^market_(\d+)_(\d+)$')
+
+# 表不存在的错误码
+_NO_SUCH_TABLE = 1146
+
+
+class TableCatalog:
+    """表名 -> 字段名元组（按字段顺序）"""
+
+    def __init__(self):
+        self._tables = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, db):
+        rows = db.fetch_all("""
+            SELECT table_name AS table_name, column_name AS column_name
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE()
+            ORDER BY table_name, ordinal_position
+        """)
+        tables = {}
+        for row in rows:
+            tables.setdefault(row['table_name'], []).append(row['column_name'])
+        with self._lock:
+            self._tables = {name: tuple(columns) for name, columns in tables.items()}
+            self._loaded_at = time.monotonic()
+        return self._tables
+
+    def tables(self, db):
+        """全部表 {表名: 字段名元组}，缓存过期时重新加载"""
+        tables = self._tables
+        if tables is None or time.monotonic() - self._loaded_at > CATALOG_CONFIG['ttl']:
+            tables = self._load(db)
+        return tables
+
+    def columns(self, db, table_name):
+        """表的字段名元组，表不存在时返回 None"""
+        tables = self.tables(db)
+        if table_name not in tables and time.monotonic() - self._loaded_at > CATALOG_CONFIG['miss_refresh']:
+            tables = self._load(db)  # 可能是其他进程新建的表
+        return tables.get(table_name)
+
+    def exists(self, db, table_name):
+        return self.columns(db, table_name) is not None
+
+    def market_tables(self, db):
+        """单商品市场表 [(表名, server_type, product_type)]，按表名排序"""
+        result = []
+        for name in sorted(self.tables(db)):
+            match = MARKET_TABLE_PATTERN.match(name)
+            if match:
+                result.append((name, int(match.group(1)), int(match.group(2))))
+        return result
+
+    def invalidate(self):
+        """建表、删表或修改字段后调用，下次访问时重新加载"""
+        with self._lock:
+            self._tables = None
+
+    def missing_table(self, error):
+        """数据库错误为表不存在（1146）时使缓存失效，返回是否为该错误"""
+        if isinstance(error, pymysql.err.MySQLError) and error.args and error.args[0] == _NO_SUCH_TABLE:
+            logger.info(f"表目录中的表已被删除，重新加载: {error.args[1] if len(error.args) > 1 else error}")
+            self.invalidate()
+            return True
+        return False
+
+
+catalog = TableCatalog()
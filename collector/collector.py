@@ -9,6 +9,7 @@ import threading
 import logging
 import logging.handlers
 import codecs
+from concurrent.futures import wait, FIRST_COMPLETED
 
 # 添加项目根目录到系统路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -16,12 +17,23 @@ root_dir = os.path.dirname(current_dir)
 sys.path.append(root_dir)
 
 # 修改导入方式
-from collector.collector_config import BASE_API_URL
-from models.database import Database
+from collector.collector_config import (
+    SCHEDULER_CONFIG, PIPELINE_CONFIG, STATUS_CONFIG, ARCHIVE_CONFIG, ROLLUP_CONFIG
+)
+from collector.archive import SnapshotArchive
+from collector.fetcher import ConcurrentFetcher, FetchCancelled
+from collector.scheduler import AdaptiveScheduler
+from collector.pipeline import Pipeline
+from collector.retry import RetryPolicy
+from collector.state import CollectorState, StatusCheckpointer, read_control
+from collector.catalog import catalog
+from models.database import thread_database, pool_stats
+from models import query_stats
 
 class DataCollector:
     _instance = None
     _lock = threading.Lock()
+    shard = None  # 分片模式下由采集进程设置为 ShardCoordinator，只采集本进程认领的任务
 
     @classmethod
     def get_instance(cls):
@@ -41,20 +53,18 @@ class DataCollector:
         self.logger = logging.getLogger('collector')
         self.logger.info("正在初始化数据采集器...")
         
-        self.db = Database()
         self.session = requests.Session()
         self._stop_event = threading.Event()  # 添加停止事件
+        self.stats = {'fetch_count': 0, 'skip_count': 0, 'error_count': 0, 'order_count': 0}  # 运行统计，写入 collector_status.runtime_stats
+        self.state = CollectorState()  # 内存中的采集器状态，由状态线程定期写回
+        self.retry = RetryPolicy()     # 每个任务的退避和熔断状态
+        self._control = None
+        self._control_changed = threading.Event()
+        self._persist_stop = True  # 停止时是否把运行状态写回数据库
         
         # 检查表是否存在
         try:
-            table_exists = self.db.fetch_one("""
-                SELECT COUNT(*) as count 
-                FROM information_schema.tables 
-                WHERE table_schema = DATABASE() 
-                AND table_name = 'collector_status'
-            """)
-            
-            if not table_exists or table_exists['count'] == 0:
+            if not catalog.exists(self.db, 'collector_status'):
                 self.logger.warning("collector_status表不存在，尝试初始化数据库...")
                 from collector.init_db import init_database
                 init_database()
@@ -109,6 +119,11 @@ class DataCollector:
         if threading.current_thread() is threading.main_thread():
             self._setup_signal_handlers()
 
+    @property
+    def db(self):
+        """当前线程的数据库连接：start_collection/stop_collection 会在 Web 请求线程中调用，不与采集线程共用连接"""
+        return thread_database()
+
     def _setup_signal_handlers(self):
         """设置信号处理器"""
         try:
@@ -164,6 +179,9 @@ class DataCollector:
         finally:
             self.is_running = False
             self._collector_thread = None
+            if not self._persist_stop:
+                self._persist_stop = True
+                return
             # 确保数据库状态更新
             try:
                 self.db.execute("""
@@ -176,15 +194,29 @@ class DataCollector:
             except Exception as e:
                 self.logger.error(f"更新数据库状态失败: {str(e)}")
 
-    def stop_collection(self, reason="手动停止"):
-        """停止采集进程"""
+    def stop_collection(self, reason="手动停止", persist=True):
+        """停止采集进程；persist=False 时只停止本进程，不修改数据库中的运行状态（交给其他采集进程接管）"""
         self.logger.info(f"尝试停止采集进程: {reason}")
         try:
             # 1. 设置停止事件和状态
+            self._persist_stop = persist
             self._stop_event.set()
             self.is_running = False
             
-            # 2. 立即更新数据库状态
+            # 2. 强制结束当前请求
+            if self.session:
+                self.session.close()
+                self.session = requests.Session()
+
+            # 3. 等待线程结束，写入队列中已有的快照和内存中的状态会先写完
+            if self._collector_thread and self._collector_thread.is_alive():
+                self._collector_thread.join(timeout=PIPELINE_CONFIG['drain_timeout'] + 1)
+                self._collector_thread = None
+
+            # 4. 更新数据库状态并通知其他进程
+            if not persist:
+                self.logger.info(f"采集进程已停止（保留运行状态）: {reason}")
+                return
             self.db.execute("""
                 UPDATE collector_status 
                 SET is_running = 0,
@@ -195,267 +227,281 @@ class DataCollector:
                     plan_index = 0,
                     error_message = NULL,
                     next_request_time = NULL,
+                    control_version = control_version + 1,
                     updated_at = NOW()
                 WHERE id = 1
             """)
-
-            # 3. 强制结束当前请求
-            if self.session:
-                self.session.close()
-                self.session = requests.Session()
-
-            # 4. 等待线程结束（最多1秒）
-            if self._collector_thread and self._collector_thread.is_alive():
-                self._collector_thread.join(timeout=1)
-                self._collector_thread = None
                 
             self.logger.info(f"数据采集器停止成功: {reason}")
 
         except Exception as e:
             self._handle_stop_error(e)
 
-    def save_market_data(self, server_type, product_type, data):
-        """保存市场数据(增量更新)"""
-        if not data:
-            return 0
-            
-        table_name = f"market_{server_type}_{product_type}"
-        new_count = 0
-        update_count = 0
-        
-        try:
-            # 生成新的批次号
-            batch_id = int(time.time())
-            
-            # 更新采集器状态的批次号
-            self.db.execute("""
-                UPDATE collector_status 
-                SET batch_id = %s
-                WHERE id = 1
-            """, (batch_id,))
-            
-            # 批量获取现有记录
-            market_ids = [item['id'] for item in data]
-            existing_records = {}
-            if market_ids:
-                records = self.db.fetch_all(f"""
-                    SELECT market_id, data_version 
-                    FROM {table_name} 
-                    WHERE market_id IN ({','.join(['%s'] * len(market_ids))})
-                """, market_ids)
-                existing_records = {r['market_id']: r['data_version'] for r in records}
-            
-            # 批量处理数据
-            updates = []
-            inserts = []
-            
-            for item in data:
-                posted_time = datetime.fromisoformat(item['posted'].replace('Z', '+00:00'))
-                
-                if item['id'] in existing_records:
-                    # 更新已存在的记录
-                    current_version = existing_records[item['id']]
-                    updates.append((
-                        item['quantity'],
-                        item['quality'],
-                        item['price'],
-                        item['seller']['certificates'],
-                        item['seller']['contest_wins'],
-                        item['fees'],
-                        posted_time,
-                        batch_id,
-                        current_version + 1,  # 版本号递增
-                        item['id']  # WHERE market_id = ?
-                    ))
-                else:
-                    # 插入新记录
-                    inserts.append((
-                        item['id'],
-                        item['kind'],
-                        item['quantity'],
-                        item['quality'],
-                        item['price'],
-                        item['seller']['id'],
-                        item['seller']['company'],
-                        item['seller']['realmId'],
-                        item['seller']['certificates'],
-                        item['seller']['contest_wins'],
-                        1 if item['seller']['npc'] else 0,
-                        item['fees'],
-                        posted_time,
-                        batch_id,
-                        1,  # 初始版本号
-                        1,  # 有效数据
-                        'api'  # 数据来源
-                    ))
-            
-            # 批量更新
-            if updates:
-                self.db.executemany(f"""
-                    UPDATE {table_name} SET
-                        quantity = %s,
-                        quality = %s,
-                        price = %s,
-                        seller_certificates = %s,
-                        seller_contest_wins = %s,
-                        fees = %s,
-                        posted_time = %s,
-                        batch_id = %s,
-                        data_version = %s,
-                        updated_at = NOW()
-                    WHERE market_id = %s
-                """, updates)
-                update_count = len(updates)
-                
-            # 批量插入
-            if inserts:
-                self.db.executemany(f"""
-                    INSERT INTO {table_name} (
-                        market_id, kind, quantity, quality, price,
-                        seller_id, seller_name, seller_realm_id,
-                        seller_certificates, seller_contest_wins,
-                        seller_is_npc, fees, posted_time,
-                        batch_id, data_version, is_valid, data_source
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, inserts)
-                new_count = len(inserts)
-            
-            self.logger.info(f"表 {table_name} 新增 {new_count} 条数据，更新 {update_count} 条数据")
-            return new_count + update_count
-            
-        except Exception as e:
-            self.logger.error(f"保存市场数据失败: {str(e)}")
-            raise
-
     def run(self):
         """运行采集器"""
         self.logger.info("数据采集器开始运行")
-        
-        while self.is_running and not self._stop_event.is_set():
-            try:
-                # 检查停止事件
-                if self._stop_event.is_set():
-                    break
-
-                # 1. 检查运行状态
-                status = self.db.fetch_one("""
-                    SELECT * FROM collector_status 
-                    WHERE id = 1
-                """)
-                
-                if not status or not status['is_running'] or self._stop_event.is_set():
-                    self.logger.info("采集器状态已变更为停止")
-                    break
-
-                # 2. 检查是否需要等待
-                if status['last_request_time']:
-                    elapsed = (datetime.now() - status['last_request_time']).total_seconds()
-                    request_interval = status['request_interval']
-                    if elapsed < request_interval:
-                        wait_time = request_interval - elapsed
-                        next_request_time = datetime.now() + timedelta(seconds=wait_time)
-                        # 更新下次请求时间
-                        self.db.execute("""
-                            UPDATE collector_status 
-                            SET next_request_time = %s
-                            WHERE id = 1
-                        """, (next_request_time,))
-                        self.logger.debug(f"等待 {wait_time:.1f} 秒后继续")
-                        time.sleep(wait_time)
-
-                # 3. 获取当前方案和执行位置
-                current_plan = json.loads(status['current_plan']) if status['current_plan'] else []
-                plan_index = status['plan_index'] or 0
-                
-                if not current_plan:
-                    self.logger.error("没有可用的采集方案")
-                    time.sleep(10)
-                    continue
-
-                # 4. 获取当前要执行的任务
-                if plan_index >= len(current_plan):
-                    plan_index = 0
-                    self.logger.info("开始新一轮采集")
-                    
-                current_task = current_plan[plan_index]
-                
-                # 获取当前任务ID
-                task_id = self.db.fetch_one("""
-                    SELECT id FROM collector_tasks 
-                    WHERE server_type = %s AND product_type = %s
-                """, (current_task['server_type'], current_task['product_type']))
-                
-                if not task_id:
-                    self.logger.error("任务配置已被删除")
-                    time.sleep(10)
-                    continue
 
-                self.logger.info(f"开始执行任务: 服务器{current_task['server_type']}/商品{current_task['product_type']}")
+        # 启动时读取一次控制参数，之后由状态线程在参数变化时通知
+        self._control = read_control(self.db)
+        self._control_changed.clear()
+        checkpointer = StatusCheckpointer(
+            self.state, self._control, self._on_control_change,
+            worker_id=self.shard.worker_id if self.shard is not None else None
+        )
+        checkpointer.start()
+
+        # 写入线程启动后先预加载当前方案中各任务的订单索引
+        plan = json.loads(self._control['current_plan']) if self._control['current_plan'] else []
+        warm_keys = [(t['server_type'], t['product_type']) for t in plan]
+        if self.shard is not None:
+            warm_keys = [key for key in warm_keys if key in self.shard.owned]
+        pipeline = Pipeline(self.state, warm_keys=warm_keys)
+        pipeline.start()
+        archive = SnapshotArchive() if ARCHIVE_CONFIG['enabled'] else None
+        fetcher = ConcurrentFetcher(self.session, self._stop_event, sink=pipeline.put, archive=archive)
+        in_flight = {}     # 采集中的请求 Future -> (server_type, product_type)
+        pending_writes = 0  # 已进入写入队列、尚未写完的快照数
+        scheduler = None
+        current_plan = None
+        next_checkpoint = 0
+        shard_version = None
 
-                # 5. 更新当前任务状态
-                self.db.execute("""
-                    UPDATE collector_status 
-                    SET current_server_type = %s,
-                        current_product_type = %s,
-                        current_task_id = %s,
-                        plan_index = %s,
-                        last_request_time = NOW(),
-                        error_message = NULL
-                    WHERE id = 1
-                """, (
-                    current_task['server_type'],
-                    current_task['product_type'],
-                    task_id['id'],
-                    (plan_index + 1) % len(current_plan)
-                ))
-
-                # 6. 执行采集（添加超时检查）
-                url = BASE_API_URL.format(
-                    server_type=current_task['server_type'],
-                    product_type=current_task['product_type']
-                )
-                self.logger.info(f"开始采集数据，API地址: {url}")
+        try:
+            while self.is_running and not self._stop_event.is_set():
                 try:
-                    # 设置较短的超时时间
-                    response = self.session.get(url, timeout=(3, 5))  # (连接超时, 读取超时)
-                    response.raise_for_status()
-                    data = response.json()
-                    self.logger.info(f"采集成功: {url}, 获取到 {len(data)} 条数据")
-                except requests.Timeout:
-                    self.logger.error(f"采集超时: {url}")
-                    if self._stop_event.is_set():
-                        break
-                    raise
-                except requests.RequestException as e:
-                    self.logger.error(f"采集请求失败: {url}, 错误: {str(e)}")
+                    # 1. 控制参数变化时重新加载方案和间隔
+                    if current_plan is None or self._control_changed.is_set():
+                        self._control_changed.clear()
+                        control = self._control
+                        current_plan = json.loads(control['current_plan']) if control['current_plan'] else []
+                        next_checkpoint = 0
+
+                    if not pipeline.writer.is_alive():
+                        raise RuntimeError("写入线程已退出")
+
+                    # 2. 检查当前方案
+                    if not current_plan:
+                        self.logger.error("没有可用的采集方案")
+                        self._stop_event.wait(10)
+                        continue
+
+                    # request_interval 为同一任务两次采集之间的最小间隔
+                    if scheduler is None or scheduler.min_interval != self._control['request_interval']:
+                        if scheduler is not None:
+                            self._checkpoint_schedule(scheduler)
+                        scheduler = AdaptiveScheduler(self._control['request_interval'])
+                        next_checkpoint = 0
+
+                    # 分片变化时立即重新同步任务列表
+                    if self.shard is not None and self.shard.version != shard_version:
+                        shard_version = self.shard.version
+                        next_checkpoint = 0
+
+                    # 3. 定期同步任务列表并写回调度状态
+                    if time.monotonic() >= next_checkpoint:
+                        self._sync_schedule(scheduler, current_plan)
+                        self._checkpoint_schedule(scheduler)
+                        next_checkpoint = time.monotonic() + SCHEDULER_CONFIG['checkpoint_interval']
+
+                    # 4. 处理写入完成的快照
+                    for snapshot in pipeline.drain_completed():
+                        pending_writes -= 1
+                        self._handle_written(snapshot, fetcher, scheduler, pipeline)
+
+                    # 5. 填满并发槽位：按到期时间提交任务
+                    while len(in_flight) < fetcher.max_workers:
+                        task_key = scheduler.pop_due()
+                        if task_key is None:
+                            break
+                        self.logger.info(f"开始执行任务: 服务器{task_key[0]}/商品{task_key[1]}")
+                        self.retry.attempt(task_key)
+                        in_flight[fetcher.submit(*task_key)] = task_key
+
+                    if not in_flight and not pending_writes:
+                        # 没有进行中的请求，等待下一个任务到期（最多 1 秒，以便及时响应控制参数变化）
+                        wait_time = min(
+                            scheduler.seconds_until_next(),
+                            max(next_checkpoint - time.monotonic(), 0)
+                        )
+                        self.state.update(next_request_time=datetime.now() + timedelta(seconds=wait_time))
+                        self._stop_event.wait(min(wait_time, 1))
+                        continue
+
+                    # 6. 处理已完成的请求，有数据的快照已由采集线程放入写入队列
+                    if not in_flight:
+                        self._stop_event.wait(0.2)
+                        continue
+                    done, _ = wait(list(in_flight), timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task_key = in_flight.pop(future)
+                        if self._stop_event.is_set():
+                            break
+                        try:
+                            result = self._handle_fetch_result(future, task_key, fetcher, scheduler, pipeline)
+                        except Exception:
+                            scheduler.defer(task_key, scheduler.min_interval)
+                            raise
+                        if result is None:
+                            continue  # 已按失败或取消重新安排
+                        if result.unchanged:
+                            scheduler.record(task_key, 0.0)
+                            if ROLLUP_CONFIG['enabled']:
+                                # 未变化的采集同样是一个样本，K线的收盘价和挂单量延续到当前时间桶
+                                pipeline.put_unchanged(result)
+                        else:
+                            pending_writes += 1
+
+                except Exception as e:
                     if self._stop_event.is_set():
                         break
-                    raise
-
-                # 检查是否需要停止
-                if self._stop_event.is_set():
-                    break
-
-                # 7. 保存数据
-                self.save_market_data(
-                    current_task['server_type'],
-                    current_task['product_type'],
-                    data
-                )
-
-                self.logger.info(f"采集成功: 服务器{current_task['server_type']}/商品{current_task['product_type']}, {len(data)}条数据")
+                    error_msg = f"采集失败: {str(e)}"
+                    self.logger.exception(error_msg)
+                    self.state.update(error_message=error_msg)
+                    self._stop_event.wait(5)
+        finally:
+            # 取消尚未开始的请求，等待写入线程写完队列中的快照
+            fetcher.shutdown()
+            pipeline.stop(PIPELINE_CONFIG['drain_timeout'])
+            if scheduler is not None:
+                try:
+                    for snapshot in pipeline.drain_completed():
+                        self._handle_written(snapshot, fetcher, scheduler, pipeline)
+                    self._checkpoint_schedule(scheduler)
+                except Exception as e:
+                    self.logger.error(f"保存调度状态失败: {str(e)}")
+            checkpointer.stop(STATUS_CONFIG['checkpoint_interval'] + 5)
+            if archive is not None:
+                archive.close()
+
+    def _on_control_change(self, control):
+        """状态线程回调：管理后台修改了控制参数"""
+        self._control = control
+        if not control['is_running']:
+            self.logger.info("采集器状态已变更为停止")
+            self.is_running = False
+            self._stop_event.set()
+        else:
+            self._control_changed.set()
+
+    def _sync_schedule(self, scheduler, current_plan):
+        """按采集方案和任务表同步调度器中的任务"""
+        plan_keys = {(t['server_type'], t['product_type']) for t in current_plan}
+        tasks = self.db.fetch_all("""
+            SELECT id, server_type, product_type, poll_interval,
+                   change_rate, last_poll_time, next_due_time
+            FROM collector_tasks
+        """)
+        if self.shard is not None:
+            plan_keys &= self.shard.owned
+        tasks = [t for t in tasks if (t['server_type'], t['product_type']) in plan_keys]
+        removed = scheduler.retain({(t['server_type'], t['product_type']) for t in tasks})
+        if removed:
+            self.logger.warning(f"{removed} 个任务已被删除或分配给其他采集进程，已从调度中移除")
+        scheduler.load(tasks)
+
+    def _checkpoint_schedule(self, scheduler):
+        """将调度状态写回 collector_tasks，重启后可以继续按原节奏采集"""
+        rows = scheduler.take_dirty()
+        if rows:
+            self.db.executemany("""
+                UPDATE collector_tasks 
+                SET poll_interval = %s,
+                    change_rate = %s,
+                    last_poll_time = %s,
+                    next_due_time = %s
+                WHERE id = %s
+            """, rows)
+
+    def _handle_fetch_result(self, future, task_key, fetcher, scheduler, pipeline):
+        """处理一个已完成的请求，返回 FetchResult；数据未变化时直接更新采集器状态。
+        请求被取消或失败时重新安排该任务并返回 None，不影响其他任务"""
+        server_type, product_type = task_key
+        try:
+            result = future.result()
+        except FetchCancelled:
+            scheduler.defer(task_key, scheduler.min_interval)
+            return None
+        except (requests.RequestException, ValueError) as e:
+            self._handle_fetch_error(task_key, e, fetcher, scheduler)
+            return None
+
+        if not result.unchanged:
+            return result
+
+        self.retry.success(task_key)
+        self.stats['fetch_count'] += 1
+        self.stats['skip_count'] += 1
+        if self._update_task_status(task_key, scheduler, pipeline):
+            self.logger.info(
+                f"数据未变化，跳过写入: 服务器{server_type}/商品{product_type}"
+                f"（累计跳过 {self.stats['skip_count']}/{self.stats['fetch_count']} 次）"
+            )
+        return result
+
+    def _handle_fetch_error(self, task_key, error, fetcher, scheduler):
+        """请求失败：按退避策略延后该任务，429 时按 Retry-After 暂停所有请求"""
+        server_type, product_type = task_key
+        delay, retry_after = self.retry.failure(task_key, error)
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+        if status == 429 and retry_after:
+            fetcher.throttle(retry_after)
+        scheduler.defer(task_key, delay)
+
+        if isinstance(error, requests.Timeout):
+            error_msg = f"采集超时: 服务器{server_type}/商品{product_type}"
+        elif isinstance(error, ValueError):
+            error_msg = f"解析响应失败: 服务器{server_type}/商品{product_type}, 错误: {str(error)}"
+        else:
+            error_msg = f"采集请求失败: 服务器{server_type}/商品{product_type}, 错误: {str(error)}"
+        self.logger.error(f"{error_msg}，{delay:.0f} 秒后重试")
+        self.stats['error_count'] += 1
+        self.stats['retry'] = self.retry.snapshot()
+        self.state.update(error_message=error_msg, runtime_stats=dict(self.stats))
+
+    def _handle_written(self, snapshot, fetcher, scheduler, pipeline):
+        """处理写入线程交回的快照：记录指纹和变化率，更新采集器状态"""
+        task_key = snapshot.result.key
+        server_type, product_type = task_key
+        if snapshot.error is not None:
+            scheduler.defer(task_key, scheduler.min_interval)
+            error_msg = f"采集失败: 保存服务器{server_type}/商品{product_type}数据出错: {str(snapshot.error)}"
+            self.logger.error(error_msg)
+            self.state.update(error_message=error_msg)
+            return
 
-            except Exception as e:
-                if self._stop_event.is_set():
-                    break
-                error_msg = f"采集失败: {str(e)}"
-                self.logger.exception(error_msg)
-                self.db.execute("""
-                    UPDATE collector_status 
-                    SET error_message = %s
-                    WHERE id = 1
-                """, (error_msg,))
-                time.sleep(5)
+        fetcher.remember(snapshot.result)
+        self.retry.success(task_key)
+        scheduler.record(task_key, snapshot.diff.change_ratio)
+        self.stats['fetch_count'] += 1
+        self.stats['order_count'] += len(snapshot.result.data)
+        if self._update_task_status(task_key, scheduler, pipeline):
+            summary = snapshot.result.data.summary()
+            self.logger.info(
+                f"采集成功: 服务器{server_type}/商品{product_type}, {summary['orders']}条数据，"
+                f"最低价 {summary['min_price']}，加权均价 {summary['avg_price']}"
+            )
+
+    def _update_task_status(self, task_key, scheduler, pipeline):
+        """更新当前任务和运行统计，任务已被删除时返回 False"""
+        task_id = scheduler.task_id(task_key)
+        if task_id is None:
+            self.logger.error("任务配置已被删除")
+            return False
+
+        self.stats['pipeline'] = pipeline.stats()
+        self.stats['db_pool'] = pool_stats()
+        if query_stats.enabled():
+            self.stats['queries'] = query_stats.top_statements(5)  # 采集进程中总耗时最多的语句
+        self.stats['retry'] = self.retry.snapshot()
+        self.state.update(
+            current_server_type=task_key[0],
+            current_product_type=task_key[1],
+            current_task_id=task_id,
+            last_request_time=datetime.now(),
+            error_message=None,
+            runtime_stats=dict(self.stats)
+        )
+        return True
 
     def _handle_start_error(self, e):
         """处理启动错误"""
@@ -1,9 +1,127 @@
 """
 采集器配置文件
 """
+import os
 
-# API基础URL
-BASE_API_URL = "https://www.simcompanies.com/api/v3/market/all/{server_type}/{product_type}/"
+# API基础URL（可用环境变量 SC_API_URL 指向本地模拟服务，见 benchmarks/fake_market.py）
+BASE_API_URL = os.getenv(
+    'SC_API_URL',
+    "https://www.simcompanies.com/api/v3/market/all/{server_type}/{product_type}/"
+)
+
+# 并发采集配置
+FETCH_CONFIG = {
+    "max_workers": 8,        # 同时进行中的请求数
+    "rate_limit": 4.0,       # 每秒最多请求数（令牌桶速率）
+    "burst": 4,              # 令牌桶容量（允许的瞬时突发请求数）
+    "connect_timeout": 3,    # 连接超时（秒）
+    "read_timeout": 5,       # 读取超时（秒）
+    "chunk_size": 64*1024,   # 流式解析时每次读取的响应块大小（字节）
+    "spool_size": 256*1024   # 接收响应时在内存中暂存的上限，超出部分写入临时文件；比较哈希后再按块读回解析（字节）
+}
+
+# 原始快照归档配置
+ARCHIVE_CONFIG = {
+    "enabled": True,                 # 是否归档有变化的原始响应
+    "path": "archive",               # 归档目录（相对项目根目录）
+    "segment_size": 64*1024*1024,    # 单个段文件大小上限（64MB）
+    "compress_level": 6,             # gzip 压缩级别
+    "keep_days": 14,                 # 归档保留天数，由采集进程的清理线程删除更早的日期目录；None 表示不按天数清理
+    "max_bytes": 50*1024*1024*1024   # 归档总大小上限（50GB），超出时删除最早的段文件；None 表示不限制
+}
+
+# 市场数据存储布局（见 collector/storage.py；从 per_table 切换到 unified 前先用 collector.migrate_storage 迁移数据）
+STORAGE_CONFIG = {
+    "layout": os.getenv('SC_STORAGE_LAYOUT', 'per_table'),  # per_table: 每个商品一张表；unified: 统一的 market_orders 分区表
+    "partition_months_ahead": 3,   # unified 布局预先创建的未来月分区数
+    "order_events": True,          # 是否把订单的变化追加写入 market_order_events（见 collector/order_events.py）
+    "count_ttl": 300               # unified 布局下后台各商品订单数的缓存时间（秒）
+}
+
+# 表目录缓存配置（见 collector/catalog.py）
+CATALOG_CONFIG = {
+    "ttl": 300,            # 缓存有效期（秒），过期后重新加载，以发现其他进程创建或删除的表
+    "miss_refresh": 30     # 查询不存在的表时重新加载的最小间隔（秒）
+}
+
+# 价格汇总（K线）配置
+ROLLUP_CONFIG = {
+    "enabled": True,           # 写入快照时同步更新 1m/1h/1d 汇总表
+    "day_offset_hours": 8,     # 日K线按 UTC+8 零点划分
+    "max_candles": 1000        # K线接口单次最多返回的数量
+}
+
+# 数据保留配置（见 collector/retention.py；python -m collector.retention 可手动执行）
+RETENTION_CONFIG = {
+    "enabled": True,           # 采集进程是否在后台定期执行清理
+    "interval": 3600,          # 清理间隔（秒）
+    "keep_days": {             # 各类数据的保留天数，None 表示不清理
+        "market": 30,                 # 市场表中已下架订单（is_valid = 0）按最后更新时间计算
+        "market_rollup_1m": 7,        # 分钟K线，更早的数据由小时K线和日K线代替
+        "market_rollup_1h": 180,
+        "market_rollup_1d": None,
+        "collector_batches": 30,      # 采集批次台账
+        "market_order_events": 180    # 订单变化日志
+    },
+    "policies": {},            # 单个市场表的保留天数，覆盖 keep_days["market"]，如 {"market_0_1": 90}
+    "chunk_size": 1000,        # 每次删除的行数（按主键顺序）
+    "pause": 0.1,              # 每块之间的等待时间（秒），降低对采集写入的影响
+    "archive": True,           # 删除前把行写入压缩文件
+    "path": "retention",       # 清理归档目录（相对项目根目录）
+    "lock_name": "sc_retention"   # GET_LOCK 锁名，多个采集进程中只有一个执行清理
+}
+
+# 批量导入配置（LOAD DATA LOCAL INFILE，需要 MySQL 开启 local_infile，未开启时自动改用多行 upsert）
+INGEST_CONFIG = {
+    "bulk_load": False,        # 是否对大快照使用 LOAD DATA 导入
+    "bulk_threshold": 5000     # 需要写入的订单数达到该值时使用 LOAD DATA
+}
+
+# 采集失败重试配置
+RETRY_CONFIG = {
+    "base_delay": 5,           # 首次失败后的重试延迟（秒）
+    "max_delay": 300,          # 指数退避的最大延迟（秒）
+    "failure_threshold": 5,    # 连续失败该次数后打开熔断器
+    "cooldown": 600,           # 熔断冷却时间（秒），试探失败后加倍
+    "max_cooldown": 3600       # 最长熔断冷却时间（秒）
+}
+
+# 采集流水线配置
+PIPELINE_CONFIG = {
+    "queue_size": 16,          # 待写入快照队列长度，写满时采集线程阻塞
+    "write_batch_size": 8,     # 单个事务最多合并的快照数
+    "write_linger": 0.2,       # 凑批等待时间（秒）
+    "drain_timeout": 30        # 停止时等待队列写完的最长时间（秒）
+}
+
+# 采集器状态写回配置
+STATUS_CONFIG = {
+    "checkpoint_interval": 2   # 状态写回和控制参数检查的间隔（秒）
+}
+
+# 采集进程租约配置
+LEASE_CONFIG = {
+    "lock_name": "sc_collector",  # GET_LOCK 锁名（会加上数据库名前缀）
+    "heartbeat_interval": 5,      # 持有锁时的心跳和控制参数检查间隔（秒）
+    "retry_interval": 3,          # 备用进程尝试获取锁的间隔（秒）
+    "stale_after": 30             # 心跳超过该时间未更新视为采集进程已停止（秒）
+}
+
+# 分片采集配置（python -m collector --sharded）
+SHARD_CONFIG = {
+    "heartbeat_interval": 5,   # 心跳和重新分配任务的间隔（秒）
+    "worker_timeout": 20,      # 心跳超过该时间视为采集进程已退出，其任务重新分配（秒）
+    "claim_ttl": 30            # 任务认领有效期，超过后其他进程可以接管（秒）
+}
+
+# 自适应调度配置
+SCHEDULER_CONFIG = {
+    "max_staleness": 1800,       # 单个任务最长采集周期（秒）
+    "target_change": 0.2,        # 预计有该比例的订单发生变化时再次采集
+    "smoothing": 0.3,            # 变化率指数平滑系数
+    "request_budget": 2.0,       # 全部任务平均每秒请求数上限
+    "checkpoint_interval": 30    # 调度状态写回数据库的间隔（秒）
+}
 
 # 服务器类型配置
 SERVERS = {
@@ -1,11 +1,14 @@
 from flask import Blueprint, render_template, jsonify, request, redirect
-from models.database import Database
-from collector.collector_config import SERVERS, PRODUCT_TYPES, PRODUCT_GROUPS
+from models.database import Database, pool_stats
+from models import query_stats
+from collector.collector_config import SERVERS, PRODUCT_TYPES, PRODUCT_GROUPS, LEASE_CONFIG, SHARD_CONFIG
+from collector.batch_ledger import latest_batches
+from collector.storage import order_counts
+from collector.init_db import create_market_table
 from collector_admin.utils.auth import login_required
 import json
 import logging
 import os
-from collector.collector import DataCollector
 from datetime import datetime, timedelta
 
 # 配置日志
@@ -38,46 +41,18 @@ def task_list():
         """
         tasks = db.fetch_all(tasks_sql)
         
-        # 获取各表实际记录数和最新批次的数据量
+        # 获取各商品的订单数（兼容两种存储布局），批次数和最新批次的数据量从批次台账读取
+        keys = [(task['server_type'], task['product_type']) for task in tasks]
+        counts = order_counts(db, keys)
+        batches = latest_batches(db)
         table_stats = {}
-        for task in tasks:
-            table_name = f"market_{task['server_type']}_{task['product_type']}"
-            # 先检查表是否存在
-            exists = db.fetch_one("""
-                SELECT COUNT(*) as count 
-                FROM information_schema.tables 
-                WHERE table_schema = DATABASE() 
-                AND table_name = %s
-            """, (table_name,))
-            
-            if exists and exists['count'] > 0:
-                # 获取总记录数和最新批次的数据量
-                stats = db.fetch_one(f"""
-                    SELECT 
-                        COUNT(*) as total_count,
-                        COUNT(DISTINCT batch_id) as batch_count,
-                        (
-                            SELECT COUNT(*) 
-                            FROM {table_name} 
-                            WHERE batch_id = (
-                                SELECT MAX(batch_id) 
-                                FROM {table_name}
-                            )
-                        ) as last_batch_count
-                    FROM {table_name}
-                """)
-                
-                table_stats[table_name] = {
-                    'total_count': stats['total_count'] if stats else 0,
-                    'batch_count': stats['batch_count'] if stats else 0,
-                    'last_batch_count': stats['last_batch_count'] if stats else 0
-                }
-            else:
-                table_stats[table_name] = {
-                    'total_count': 0,
-                    'batch_count': 0,
-                    'last_batch_count': 0
-                }
+        for key in keys:
+            batch = batches.get(key)
+            table_stats[f"market_{key[0]}_{key[1]}"] = {
+                'total_count': counts[key],
+                'batch_count': batch['batch_count'] if batch else 0,
+                'last_batch_count': (batch['order_count'] or 0) if batch else 0
+            }
         
         # 获取采集器状态
         collector_status = db.fetch_one("""
@@ -95,6 +70,26 @@ def task_list():
     finally:
         db.close()
 
+def _aggregate_worker_status(workers):
+    """汇总分片模式下各采集进程的状态：最近一次请求取最晚的，下一次请求取最早的，
+    错误信息按进程列出，runtime_stats 中的计数求和（各进程的完整统计见 workers[].status）"""
+    statuses = [w['status'] for w in workers]
+    last_times = [s['last_request_time'] for s in statuses if s.get('last_request_time')]
+    next_times = [s['next_request_time'] for s in statuses if s.get('next_request_time')]
+    errors = [f"{w['worker_id']}: {w['status']['error_message']}" for w in workers if w['status'].get('error_message')]
+    totals = {}
+    for s in statuses:
+        for name, value in (s.get('runtime_stats') or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[name] = totals.get(name, 0) + value
+    return {
+        'current_task_id': ', '.join(str(s['current_task_id']) for s in statuses if s.get('current_task_id')) or None,
+        'last_request_time': max(last_times) if last_times else '',
+        'next_request_time': min(next_times) if next_times else '',
+        'error_message': '; '.join(errors) or None,
+        'runtime_stats': totals
+    }
+
 @collector_bp.route('/collector/status')
 @login_required
 def get_collector_status():
@@ -109,6 +104,10 @@ def get_collector_status():
                 error_message,
                 last_request_time,
                 next_request_time,
+                runtime_stats,
+                lease_owner,
+                lease_heartbeat,
+                TIMESTAMPDIFF(SECOND, lease_heartbeat, NOW()) as lease_age,
                 ct.server_type as task_server_type,
                 ct.product_type as task_product_type
             FROM collector_status cs
@@ -122,15 +121,38 @@ def get_collector_status():
                 'message': '采集器状态记录不存在'
             }), 404
             
+        # 分片模式下存活的采集进程及其吞吐和各自的采集状态
+        workers = db.fetch_all("""
+            SELECT worker_id, task_count, stats, status
+            FROM collector_workers
+            WHERE heartbeat_at >= NOW() - INTERVAL %s SECOND
+            ORDER BY worker_id
+        """, (SHARD_CONFIG['worker_timeout'],))
+        workers = [{
+            'worker_id': w['worker_id'],
+            'task_count': w['task_count'],
+            'stats': json.loads(w['stats']) if w['stats'] else {},
+            'status': json.loads(w['status']) if w['status'] else {}
+        } for w in workers]
+            
         # 直接返回时间字段，不提供默认值
-        return jsonify({
+        result = {
             'is_running': bool(status['is_running']),
             'current_task_id': status['current_task_id'],
             'last_request_time': status['last_request_time'].strftime('%Y-%m-%d %H:%M:%S') if status['last_request_time'] else '',
             'next_request_time': status['next_request_time'].strftime('%Y-%m-%d %H:%M:%S') if status['next_request_time'] else '',
             'request_interval': status['request_interval'],
-            'error_message': status['error_message']
-        })
+            'error_message': status['error_message'],
+            'runtime_stats': json.loads(status['runtime_stats']) if status['runtime_stats'] else {},
+            'lease_owner': status['lease_owner'],
+            'lease_alive': status['lease_age'] is not None and status['lease_age'] <= LEASE_CONFIG['stale_after'],
+            'db_pool': pool_stats(),  # 本 Web 进程的连接池计数，采集进程的计数在 runtime_stats 中
+            'workers': workers
+        }
+        sharded = [w for w in workers if w['status']]
+        if sharded:
+            result.update(_aggregate_worker_status(sharded))
+        return jsonify(result)
     except Exception as e:
         logger.error(f"获取采集器状态失败: {str(e)}")
         return jsonify({
@@ -149,17 +171,6 @@ def toggle_collector():
     
     db = Database()
     try:
-        # 获取采集器实例
-        try:
-            collector = DataCollector.get_instance()
-            logger.info("成功获取采集器实例")
-        except Exception as e:
-            logger.error(f"获取采集器实例失败: {str(e)}", exc_info=True)
-            return jsonify({
-                'status': 'error',
-                'message': f'获取采集器实例失败: {str(e)}'
-            }), 500
-
         if data['is_running']:
             # 检查采集器当前状态
             status = db.fetch_one("""
@@ -207,14 +218,12 @@ def toggle_collector():
                         plan_index = 0,
                         error_message = NULL,
                         is_running = 1,
+                        control_version = control_version + 1,
                         updated_at = NOW()
                     WHERE id = 1
                 """, (json.dumps(collection_plan),))
-                logger.info("数据库状态更新成功")
-
-                # 启动采集器
-                collector.start_collection()
-                logger.info("采集器启动成功")
+                # 采集进程检测到 control_version 变化后启动采集
+                logger.info("数据库状态更新成功，等待采集进程启动采集")
                 
             except Exception as e:
                 error_msg = f"启动采集器失败: {str(e)}"
@@ -247,9 +256,19 @@ def toggle_collector():
                         'message': '采集器已经停止'
                     })
 
-                # 停止采集器
-                collector.stop_collection()
-                logger.info("采集器停止成功")
+                # 采集进程检测到 control_version 变化后停止采集
+                db.execute("""
+                    UPDATE collector_status
+                    SET is_running = 0,
+                        current_task_id = NULL,
+                        current_server_type = NULL,
+                        current_product_type = NULL,
+                        next_request_time = NULL,
+                        control_version = control_version + 1,
+                        updated_at = NOW()
+                    WHERE id = 1
+                """)
+                logger.info("已通知采集进程停止采集")
                 return jsonify({'status': 'success'})
                 
             except Exception as e:
@@ -302,45 +321,6 @@ def delete_task():
     finally:
         db.close()
 
-def create_market_table(db, server_type, product_type):
-    """创建市场数据表"""
-    table_name = f"market_{server_type}_{product_type}"
-    
-    try:
-        db.execute(f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                id BIGINT AUTO_INCREMENT PRIMARY KEY,
-                market_id BIGINT NOT NULL COMMENT '市场订单ID',
-                kind TINYINT NOT NULL COMMENT '商品类型标识',
-                quantity INT NOT NULL COMMENT '数量',
-                quality TINYINT NOT NULL COMMENT '品质',
-                price DECIMAL(10,3) NOT NULL COMMENT '价格',
-                seller_id BIGINT NOT NULL COMMENT '卖家ID',
-                seller_name VARCHAR(100) NOT NULL COMMENT '卖家名称',
-                seller_realm_id TINYINT NOT NULL COMMENT '卖家服务器ID',
-                seller_certificates INT DEFAULT 0 COMMENT '卖家证书数',
-                seller_contest_wins INT DEFAULT 0 COMMENT '卖家比赛获胜次数',
-                seller_is_npc TINYINT(1) DEFAULT 0 COMMENT '是否NPC',
-                fees INT DEFAULT 0 COMMENT '交易费用',
-                posted_time DATETIME NOT NULL COMMENT '发布时间',
-                batch_id BIGINT NOT NULL COMMENT '采集批次号',
-                data_version INT NOT NULL DEFAULT 1 COMMENT '数据版本号',
-                is_valid TINYINT(1) NOT NULL DEFAULT 1 COMMENT '数据是否有效',
-                data_source VARCHAR(50) NOT NULL DEFAULT 'api' COMMENT '数据来源',
-                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
-                updated_at DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-                KEY idx_seller_id (seller_id),
-                KEY idx_posted_time (posted_time),
-                KEY idx_batch_id (batch_id),
-                UNIQUE KEY uk_market_id (market_id) COMMENT '市场订单ID唯一约束'
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 
-            COMMENT='市场数据表{server_type}服务器{product_type}商品'
-        """)
-        return True
-    except Exception as e:
-        logger.error(f"创建市场数据表失败: {str(e)}")
-        return False
-
 @collector_bp.route('/task/create', methods=['POST'])
 @login_required
 def create_task():
@@ -410,7 +390,8 @@ def delete_all_tasks():
                 current_task_id = NULL,
                 current_server_type = NULL,
                 current_product_type = NULL,
-                error_message = NULL
+                error_message = NULL,
+                control_version = control_version + 1
             WHERE id = 1
         """)
         
@@ -455,7 +436,8 @@ def update_interval():
         # 更新间隔时间
         db.execute("""
             UPDATE collector_status 
-            SET request_interval = %s
+            SET request_interval = %s,
+                control_version = control_version + 1
             WHERE id = 1
         """, (interval,))
         
@@ -588,49 +570,23 @@ def get_tasks():
         """
         tasks = db.fetch_all(tasks_sql)
         
-        # 获取各表实际记录数和最新批次的数据量
+        # 获取各商品的订单数（兼容两种存储布局），批次数、最新批次的数据量和最后更新时间从批次台账读取
+        keys = [(task['server_type'], task['product_type']) for task in tasks]
+        counts = order_counts(db, keys)
+        batches = latest_batches(db)
         table_stats = {}
+        for key in keys:
+            batch = batches.get(key)
+            table_stats[f"market_{key[0]}_{key[1]}"] = {
+                'total_count': counts[key],
+                'batch_count': batch['batch_count'] if batch else 0,
+                'last_batch_count': (batch['order_count'] or 0) if batch else 0,
+                'last_update_time': batch['created_at'].strftime('%Y-%m-%d %H:%M:%S') if batch and batch['created_at'] else '-'
+            }
+
         for task in tasks:
-            table_name = f"market_{task['server_type']}_{task['product_type']}"
-            # 先检查表是否存在
-            exists = db.fetch_one("""
-                SELECT COUNT(*) as count 
-                FROM information_schema.tables 
-                WHERE table_schema = DATABASE() 
-                AND table_name = %s
-            """, (table_name,))
-            
-            if exists and exists['count'] > 0:
-                # 获取总记录数、最新批次的数据量和最后更新时间
-                stats = db.fetch_one(f"""
-                    SELECT 
-                        COUNT(*) as total_count,
-                        COUNT(DISTINCT batch_id) as batch_count,
-                        (
-                            SELECT COUNT(*) 
-                            FROM {table_name} 
-                            WHERE batch_id = (
-                                SELECT MAX(batch_id) 
-                                FROM {table_name}
-                            )
-                        ) as last_batch_count,
-                        MAX(updated_at) as last_update_time
-                    FROM {table_name}
-                """)
-                
-                table_stats[table_name] = {
-                    'total_count': stats['total_count'] if stats else 0,
-                    'batch_count': stats['batch_count'] if stats else 0,
-                    'last_batch_count': stats['last_batch_count'] if stats else 0,
-                    'last_update_time': stats['last_update_time'].strftime('%Y-%m-%d %H:%M:%S') if stats and stats['last_update_time'] else '-'
-                }
-            else:
-                table_stats[table_name] = {
-                    'total_count': 0,
-                    'batch_count': 0,
-                    'last_batch_count': 0,
-                    'last_update_time': '-'
-                }
+            task['next_due_time'] = task['next_due_time'].strftime('%Y-%m-%d %H:%M:%S') if task['next_due_time'] else None
+            task['last_poll_time'] = task['last_poll_time'].strftime('%Y-%m-%d %H:%M:%S') if task['last_poll_time'] else None
 
         return jsonify({
             'code': 0,
@@ -641,4 +597,80 @@ def get_tasks():
             }
         })
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
+
+@collector_bp.route('/collector/batches', methods=['GET'])
+@login_required
+def get_batches():
+    """获取任务最近的采集批次（批次台账）"""
+    server_type = request.args.get('server_type', type=int)
+    product_type = request.args.get('product_type', type=int)
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    if server_type is None or product_type is None:
+        return jsonify({'code': 1, 'msg': '缺少 server_type 或 product_type'}), 400
+
+    db = Database()
+    try:
+        batches = db.fetch_all("""
+            SELECT id AS batch_id, fetch_started_at, fetch_finished_at, http_bytes,
+                   order_count, inserted_count, updated_count, removed_count,
+                   write_ms, created_at
+            FROM collector_batches
+            WHERE server_type = %s AND product_type = %s
+            ORDER BY id DESC
+            LIMIT %s
+        """, (server_type, product_type, limit))
+
+        for batch in batches:
+            for field in ('fetch_started_at', 'fetch_finished_at', 'created_at'):
+                batch[field] = batch[field].strftime('%Y-%m-%d %H:%M:%S') if batch[field] else None
+
+        return jsonify({
+            'code': 0,
+            'msg': 'success',
+            'data': {'batches': batches}
+        })
+    finally:
+        db.close()
+
+
+@collector_bp.route('/collector/query_stats', methods=['GET'])
+@login_required
+def get_query_stats():
+    """SQL 执行统计和最近的慢查询（需设置 DB_QUERY_STATS=1）；reset=1 时返回后清零（只清零本进程）。
+    statements/slow_queries 只包含处理本次请求的 Web 进程（gunicorn 的一个 worker），
+    collectors 为各采集进程写入运行状态的总耗时最多的语句（每个进程前 5 条）"""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    data = query_stats.snapshot(limit)
+    data['scope'] = f"Web 进程 {data['pid']}（只统计处理本次请求的 worker，其他 worker 的统计不在其中）"
+    data['db_pool'] = pool_stats()
+    if request.args.get('reset', type=int) == 1:
+        query_stats.reset()
+
+    db = Database()
+    try:
+        collectors = []
+        status = db.fetch_one("SELECT lease_owner, runtime_stats FROM collector_status WHERE id = 1")
+        if status and status['runtime_stats']:
+            collectors.append({
+                'process': status['lease_owner'],
+                'statements': json.loads(status['runtime_stats']).get('queries', [])
+            })
+        workers = db.fetch_all("""
+            SELECT worker_id, status
+            FROM collector_workers
+            WHERE heartbeat_at >= NOW() - INTERVAL %s SECOND AND status IS NOT NULL
+            ORDER BY worker_id
+        """, (SHARD_CONFIG['worker_timeout'],))
+        for worker in workers:
+            runtime_stats = json.loads(worker['status']).get('runtime_stats') or {}
+            collectors.append({'process': worker['worker_id'], 'statements': runtime_stats.get('queries', [])})
+        data['collectors'] = collectors
+    finally:
+        db.close()
+
+    return jsonify({
+        'code': 0,
+        'msg': 'success',
+        'data': data
+    })
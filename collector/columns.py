@@ -0,0 +1,154 @@
+"""
+列式快照
+把一次快照的订单按列保存（整数列使用 array，价格以千分之一为单位，
+发布时间为按秒四舍五入的定长 UTC 时间字符串 YYYY-MM-DDTHH:MM:SS，字符串顺序即时间顺序）。
+每批订单逐列转换，取值、切片和取整都在 map/itemgetter 中完成，没有逐条的 Python 循环；
+比对和统计直接在列上进行，只有需要写入数据库的订单才会重新组装成行
+"""
+import operator
+from array import array
+from itertools import repeat
+from datetime import datetime, timezone, timedelta
+
+_UTC_SUFFIXES = ('Z', '+00:00')
+_ONE_SECOND = timedelta(seconds=1)
+
+
+def _round_utc(value):
+    """UTC 时间字符串按秒四舍五入：小数部分不小于 0.5 秒时进位，否则只做切片"""
+    if len(value) > 20 and value[19] == '.' and value[20] >= '5':
+        return (datetime.fromisoformat(value[:19]) + _ONE_SECOND).isoformat()
+    return value[:19]
+
+
+def posted_key(value):
+    """接口返回的发布时间转换为 UTC 的 YYYY-MM-DDTHH:MM:SS。
+    按秒四舍五入，与 MySQL 把带小数秒的时间写入 DATETIME 列时的处理一致，
+    这样从数据库加载的订单与接口返回的同一订单得到相同的发布时间"""
+    if value.endswith(_UTC_SUFFIXES):
+        return _round_utc(value)
+    posted = datetime.fromisoformat(value)
+    if posted.tzinfo is not None:
+        posted = posted.astimezone(timezone.utc).replace(tzinfo=None)
+    if posted.microsecond >= 500000:
+        posted += _ONE_SECOND
+    return posted.replace(microsecond=0).isoformat()
+
+
+def posted_column(values):
+    """批量转换发布时间：全部为 UTC 时只做切片和进位"""
+    if all(map(str.endswith, values, repeat(_UTC_SUFFIXES))):
+        return list(map(_round_utc, values))
+    return [posted_key(value) for value in values]
+
+
+def datetime_key(value):
+    """数据库中不带时区的 UTC 时间转换为与 posted_key 相同的格式"""
+    return value.replace(microsecond=0).isoformat()
+
+
+_item = {name: operator.itemgetter(name) for name in (
+    'id', 'kind', 'quantity', 'quality', 'price', 'fees', 'posted', 'seller'
+)}
+_seller = {name: operator.itemgetter(name) for name in (
+    'id', 'company', 'realmId', 'certificates', 'contest_wins', 'npc'
+)}
+
+
+class SnapshotColumns:
+    """一次快照的列式表示"""
+
+    __slots__ = (
+        'market_id', 'kind', 'quantity', 'quality', 'price', 'seller_id', 'seller_name',
+        'seller_realm_id', 'seller_certificates', 'seller_contest_wins', 'seller_is_npc',
+        'fees', 'posted'
+    )
+
+    def __init__(self):
+        self.market_id = array('q')
+        self.kind = array('h')
+        self.quantity = array('q')
+        self.quality = array('h')
+        self.price = array('q')               # 价格 × 1000
+        self.seller_id = array('q')
+        self.seller_name = []
+        self.seller_realm_id = array('h')
+        self.seller_certificates = array('q')
+        self.seller_contest_wins = array('q')
+        self.seller_is_npc = array('b')
+        self.fees = array('q')
+        self.posted = []                      # 发布时间，UTC YYYY-MM-DDTHH:MM:SS
+
+    @classmethod
+    def from_items(cls, items):
+        columns = cls()
+        columns.extend(items)
+        return columns
+
+    def extend(self, items):
+        """追加一批接口订单字典，每列一次批量转换"""
+        if not items:
+            return
+        sellers = list(map(_item['seller'], items))
+        self.market_id.extend(map(_item['id'], items))
+        self.kind.extend(map(_item['kind'], items))
+        self.quantity.extend(map(_item['quantity'], items))
+        self.quality.extend(map(_item['quality'], items))
+        self.price.extend(map(round, map(operator.mul, map(_item['price'], items), repeat(1000))))
+        self.fees.extend(map(_item['fees'], items))
+        self.posted.extend(posted_column(list(map(_item['posted'], items))))
+        self.seller_id.extend(map(_seller['id'], sellers))
+        self.seller_name.extend(map(_seller['company'], sellers))
+        self.seller_realm_id.extend(map(_seller['realmId'], sellers))
+        self.seller_certificates.extend(map(_seller['certificates'], sellers))
+        self.seller_contest_wins.extend(map(_seller['contest_wins'], sellers))
+        self.seller_is_npc.extend(map(bool, map(_seller['npc'], sellers)))
+
+    def __len__(self):
+        return len(self.market_id)
+
+    def states(self):
+        """按行返回比对用的状态：(价格(千分之一), 数量, 品质, 费用, 发布时间)"""
+        return zip(self.price, self.quantity, self.quality, self.fees, self.posted)
+
+    def row(self, i, batch_id):
+        """第 i 个订单转换为市场表的一行（字段顺序与 INSERT 列顺序一致，卖家信息另存在 sellers 表）"""
+        return (
+            self.market_id[i],
+            self.kind[i],
+            self.quantity[i],
+            self.quality[i],
+            self.price[i] / 1000,
+            self.seller_id[i],
+            self.fees[i],
+            self.posted[i],
+            batch_id
+        )
+
+    def summary(self):
+        """快照统计：订单数、最低价、按数量加权的均价、总数量"""
+        if not self.market_id:
+            return {'orders': 0, 'min_price': None, 'avg_price': None, 'quantity': 0}
+        quantity = sum(self.quantity)
+        weighted = sum(map(operator.mul, self.price, self.quantity))
+        return {
+            'orders': len(self.market_id),
+            'min_price': min(self.price) / 1000,
+            'avg_price': round(weighted / quantity / 1000, 3) if quantity else None,
+            'quantity': quantity
+        }
+
+    def by_quality(self):
+        """按品质统计：{品质: [最低价(千分之一), 价格×数量之和(千分之一), 总数量, 订单数]}"""
+        stats = {}
+        for quality, price, quantity in zip(self.quality, self.price, self.quantity):
+            entry = stats.get(quality)
+            if entry is None:
+                stats[quality] = [price, price * quantity, quantity, 1]
+            else:
+                if price < entry[0]:
+                    entry[0] = price
+                entry[1] += price * quantity
+                entry[2] += quantity
+                entry[3] += 1
+        return stats
@@ -0,0 +1,122 @@
+"""
+独立采集进程
+在 Web 进程之外运行采集器：先获取采集锁，持有锁期间按 collector_status 的控制参数
+启动或停止采集；失去锁时停止采集并回到等待状态。
+分片模式下不获取采集锁，多个进程同时运行，各自只采集自己认领的任务。
+两种模式下都会启动后台数据清理线程（见 collector/retention.py）
+"""
+import signal
+import threading
+import logging
+
+from collector.collector_config import LEASE_CONFIG, RETENTION_CONFIG, SHARD_CONFIG
+from collector.lease import CollectorLease
+from collector.retention import RetentionJob
+from collector.shard import ShardCoordinator
+from collector.state import read_control
+from models.database import Database
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+class CollectorDaemon:
+    """采集守护进程：租约 + 控制参数监听"""
+
+    def __init__(self, sharded=False):
+        self.lease = CollectorLease()
+        self.shard = ShardCoordinator() if sharded else None
+        self.collector = None
+        self._shutdown = threading.Event()
+        self._control_version = None
+        self.retention = RetentionJob(self._shutdown) if RETENTION_CONFIG['enabled'] else None
+
+    def run(self):
+        """阻塞运行直到收到停止信号"""
+        from collector.init_db import init_database
+        init_database()
+        if self.retention is not None:
+            self.retention.start()
+        if self.shard is not None:
+            self._run_sharded()
+            return
+        logger.info(f"采集进程 {self.lease.owner} 已启动，等待获取采集锁...")
+
+        try:
+            while not self._shutdown.is_set():
+                if not self.lease.held:
+                    if not self.lease.acquire():
+                        self._shutdown.wait(LEASE_CONFIG['retry_interval'])
+                        continue
+                    self._control_version = None
+
+                if not self.lease.heartbeat():
+                    self._stop_collector("失去采集锁")
+                    continue
+
+                self._apply_control()
+                self._shutdown.wait(LEASE_CONFIG['heartbeat_interval'])
+        finally:
+            self._stop_collector("采集进程退出")
+            self.lease.release()
+            logger.info(f"采集进程 {self.lease.owner} 已退出")
+
+    def _run_sharded(self):
+        """分片模式：定期心跳并重新分配任务，采集线程只调度本进程认领的任务"""
+        from collector.collector import DataCollector
+        DataCollector.shard = self.shard
+        logger.info(f"采集进程 {self.shard.worker_id} 以分片模式启动")
+
+        try:
+            while not self._shutdown.is_set():
+                stats = self.collector.stats if self.collector is not None else None
+                if self.shard.heartbeat(stats):
+                    self._apply_control()
+                self._shutdown.wait(SHARD_CONFIG['heartbeat_interval'])
+        finally:
+            self._stop_collector("采集进程退出")
+            self.shard.release()
+            logger.info(f"采集进程 {self.shard.worker_id} 已退出")
+
+    def start_background(self):
+        """在后台线程中运行（嵌入 Web 进程时使用）"""
+        thread = threading.Thread(target=self.run, name='collector-daemon', daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self, signum=None, frame=None):
+        logger.info("采集进程收到停止信号")
+        self._shutdown.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGINT, self.shutdown)
+
+    def _apply_control(self):
+        """采集器未运行时检查控制参数，管理后台要求运行时启动采集"""
+        if self.collector is not None and self.collector.is_running:
+            return  # 运行中的控制参数变化由采集器的状态线程处理
+
+        db = Database()
+        try:
+            control = read_control(db)
+        finally:
+            db.close()
+        if not control or control['control_version'] == self._control_version:
+            return
+        self._control_version = control['control_version']
+
+        if control['is_running'] and control['current_plan']:
+            from collector.collector import DataCollector
+            if self.collector is None:
+                # 实例化时会按数据库中的运行状态自动启动采集
+                self.collector = DataCollector.get_instance()
+                if threading.current_thread() is threading.main_thread():
+                    self.install_signal_handlers()  # 覆盖采集器自己的信号处理器
+            if not self.collector.is_running:
+                self.collector.start_collection()
+
+    def _stop_collector(self, reason):
+        """停止本进程的采集，保留数据库中的运行状态，以便接管的进程继续采集"""
+        if self.collector is not None and self.collector.is_running:
+            self.collector.stop_collection(reason, persist=False)
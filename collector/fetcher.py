@@ -0,0 +1,232 @@
+"""
+并发采集引擎
+在共享的 requests.Session 上用有界线程池同时发起多个市场请求，
+并通过全局令牌桶限制对 simcompanies.com 的请求速率
+"""
+import time
+import hashlib
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from collector.collector_config import BASE_API_URL, FETCH_CONFIG
+from collector.order_stream import parse_stream
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+class FetchCancelled(Exception):
+    """采集器停止时被取消的请求"""
+
+
+class FetchResult:
+    """一次采集请求的结果"""
+
+    __slots__ = ('key', 'data', 'unchanged', 'fingerprint', 'fetch_seconds',
+                 'started_at', 'finished_at', 'http_bytes')
+
+    def __init__(self, key, data=None, unchanged=False, fingerprint=None):
+        self.key = key
+        self.data = data                # 解析后的 SnapshotColumns，未变化时为 None
+        self.unchanged = unchanged      # 与上一次保存的快照相同
+        self.fingerprint = fingerprint  # (etag, last_modified, digest)
+        self.fetch_seconds = 0.0        # 请求和解析耗时
+        self.started_at = None          # 请求开始时间(epoch秒)，写入批次台账
+        self.finished_at = None         # 解析完成时间(epoch秒)
+        self.http_bytes = 0             # 响应体字节数
+
+
+class TokenBucket:
+    """线程安全的令牌桶限速器"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """服务器要求限流时暂停发放令牌"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self, stop_event=None):
+        """获取一个令牌，返回 False 表示等待期间收到了停止信号"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait_time = self._paused_until - now
+                else:
+                    wait_time = None
+            if wait_time is not None:
+                if stop_event is not None:
+                    if stop_event.wait(wait_time):
+                        return False
+                else:
+                    time.sleep(wait_time)
+                continue
+
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_time = (1 - self._tokens) / self.rate
+
+            if stop_event is not None:
+                if stop_event.wait(wait_time):
+                    return False
+            else:
+                time.sleep(wait_time)
+
+
+class ConcurrentFetcher:
+    """有界线程池采集器，所有请求共享同一个令牌桶"""
+
+    def __init__(self, session, stop_event, sink=None, archive=None, config=None):
+        config = dict(FETCH_CONFIG, **(config or {}))
+        self.session = session
+        self._sink = sink  # 有数据变化的结果交给 sink(result, stop_event)，返回 False 表示已停止
+        self._archive = archive  # SnapshotArchive，有变化的原始响应在解析前归档，未变化的采集只记索引
+        self.max_workers = config['max_workers']
+        self.timeout = (config['connect_timeout'], config['read_timeout'])
+        self.chunk_size = config['chunk_size']
+        self.spool_size = config['spool_size']
+        self._stop_event = stop_event
+        self._bucket = TokenBucket(config['rate_limit'], config['burst'])
+        self._fingerprints = {}  # (server_type, product_type) -> (etag, last_modified, digest)
+
+        # 连接池大小与并发数一致，避免请求在连接池上排队
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='collector-fetch'
+        )
+
+    def submit(self, server_type, product_type):
+        """提交一个采集请求，返回 Future，结果为 FetchResult（有 sink 时数据已交给 sink）"""
+        return self._executor.submit(self._fetch, (server_type, product_type))
+
+    def throttle(self, seconds):
+        """收到 429 时按 Retry-After 暂停所有请求"""
+        logger.warning(f"服务器要求限流，暂停请求 {seconds:.0f} 秒")
+        self._bucket.pause(seconds)
+
+    def remember(self, result):
+        """数据保存成功后记录快照指纹，之后相同的响应将被跳过"""
+        if result.fingerprint:
+            self._fingerprints[result.key] = result.fingerprint
+
+    def forget(self, key):
+        """清除任务的快照指纹，下次采集将强制完整写入"""
+        self._fingerprints.pop(key, None)
+
+    def _unchanged(self, key, started_at):
+        """数据未变化的结果（带采集时间，用于价格汇总的样本），同一时间记入归档索引，重建汇总时得到相同的样本"""
+        result = FetchResult(key, unchanged=True)
+        result.started_at = started_at
+        result.finished_at = time.time()
+        if self._archive is not None:
+            try:
+                self._archive.append_unchanged(key[0], key[1], result.finished_at)
+            except OSError as e:
+                logger.error(f"归档未变化的采集失败: {str(e)}")
+        return result
+
+    def _fetch(self, key):
+        """在工作线程中执行单个请求"""
+        if not self._bucket.acquire(self._stop_event):
+            raise FetchCancelled()
+
+        url = BASE_API_URL.format(server_type=key[0], product_type=key[1])
+        previous = self._fingerprints.get(key)
+        headers = {}
+        if previous:
+            etag, last_modified, _ = previous
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        logger.info(f"开始采集数据，API地址: {url}")
+        started = time.monotonic()
+        started_at = time.time()
+        digest = hashlib.blake2b(digest_size=16)
+        compressor = self._archive.compressor() if self._archive is not None else None
+        compressed = []
+        received = 0
+
+        def read_back(spool):
+            """从暂存文件按块读回响应，同时做归档压缩"""
+            spool.seek(0)
+            for chunk in iter(lambda: spool.read(self.chunk_size), b''):
+                if compressor is not None:
+                    compressed.append(compressor.compress(chunk))
+                yield chunk
+
+        try:
+            # (连接超时, 读取超时)
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+            try:
+                if response.status_code == 304:
+                    return self._unchanged(key, started_at)
+                response.raise_for_status()
+
+                # 接收时计算哈希并把响应块写入暂存文件（不超过 spool_size 时在内存中）：
+                # 与上次保存的快照相同时不解析（接口不返回 ETag，这是最常见的情况），
+                # 有变化时按块读回解析，内存中只保留暂存部分和当前解析的块
+                with tempfile.SpooledTemporaryFile(max_size=self.spool_size) as spool:
+                    for chunk in response.iter_content(self.chunk_size):
+                        received += len(chunk)
+                        digest.update(chunk)
+                        spool.write(chunk)
+                    if previous and previous[2] == digest.digest():
+                        return self._unchanged(key, started_at)
+                    data = parse_stream(read_back(spool))
+            finally:
+                response.close()
+        except requests.RequestException:
+            if self._stop_event.is_set():
+                raise FetchCancelled()
+            raise
+
+        # 没有缓存校验头时，用响应体的哈希判断数据是否变化
+        fingerprint = (
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            digest.digest()
+        )
+
+        result = FetchResult(key, data=data, fingerprint=fingerprint)
+        result.fetch_seconds = time.monotonic() - started
+        result.started_at = started_at
+        result.finished_at = started_at + result.fetch_seconds
+        result.http_bytes = received
+
+        if compressor is not None:
+            compressed.append(compressor.flush())
+            try:
+                # 归档时间与批次台账的采集完成时间相同，回放时据此找到已登记的批次
+                self._archive.append_compressed(key[0], key[1], b''.join(compressed), result.finished_at)
+            except OSError as e:
+                logger.error(f"归档原始响应失败: {str(e)}")
+        if self._sink is not None and not self._sink(result, self._stop_event):
+            raise FetchCancelled()
+        return result
+
+    def shutdown(self):
+        """停止线程池并取消尚未开始的请求"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
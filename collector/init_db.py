@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 import logging
 
 # 添加项目根目录到系统路径
@@ -8,6 +9,12 @@ root_dir = os.path.dirname(current_dir)
 sys.path.append(root_dir)
 
 from models.database import Database
+from collector.storage import MarketTable, create_unified_table, unified_layout
+from collector.rollup import create_rollup_tables
+from collector.order_events import create_events_table
+from collector.sellers import create_sellers_table
+from collector.migrate_sellers import strict_seller_columns
+from collector.catalog import catalog
 
 # 配置日志
 logger = logging.getLogger('collector')
@@ -31,6 +38,10 @@ def init_database():
                 next_request_time DATETIME NULL COMMENT '下次请求时间',
                 error_message TEXT NULL COMMENT '错误信息',
                 batch_id BIGINT NULL COMMENT '当前采集批次号',
+                runtime_stats TEXT NULL COMMENT '运行统计(JSON)',
+                control_version INT NOT NULL DEFAULT 0 COMMENT '控制参数版本号',
+                lease_owner VARCHAR(100) NULL COMMENT '持有采集锁的进程',
+                lease_heartbeat DATETIME NULL COMMENT '采集进程心跳时间',
                 created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
                 updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='采集器状态表'
@@ -42,12 +53,120 @@ def init_database():
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 server_type INT NOT NULL COMMENT '服务器类型',
                 product_type INT NOT NULL COMMENT '商品类型',
+                poll_interval DOUBLE NULL COMMENT '当前采集周期(秒)',
+                change_rate DOUBLE NULL COMMENT '估计的订单变化率(每秒)',
+                last_poll_time DATETIME NULL COMMENT '上次采集时间',
+                next_due_time DATETIME NULL COMMENT '下次采集时间',
+                owner_id VARCHAR(100) NULL COMMENT '分片模式下认领该任务的采集进程',
+                lease_until DATETIME NULL COMMENT '认领有效期',
                 created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
                 updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
                 UNIQUE KEY uk_task (server_type, product_type) COMMENT '服务器和商品类型唯一'
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='采集任务表'
         """)
         
+        # 创建采集进程表（分片模式下每个采集进程一行）
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS collector_workers (
+                worker_id VARCHAR(100) PRIMARY KEY COMMENT '采集进程标识(主机:进程号)',
+                started_at DATETIME NOT NULL COMMENT '启动时间',
+                heartbeat_at DATETIME NOT NULL COMMENT '心跳时间',
+                task_count INT NOT NULL DEFAULT 0 COMMENT '认领的任务数',
+                stats TEXT NULL COMMENT '吞吐统计(JSON)',
+                status TEXT NULL COMMENT '采集状态(JSON，分片模式下代替 collector_status 中的状态字段)'
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='采集进程表'
+        """)
+        
+        # 创建采集批次台账（自增主键即批次号）
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS collector_batches (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY COMMENT '批次号',
+                server_type INT NOT NULL COMMENT '服务器类型',
+                product_type INT NOT NULL COMMENT '商品类型',
+                fetch_started_at DATETIME(3) NULL COMMENT '请求开始时间(UTC)',
+                fetch_finished_at DATETIME(3) NULL COMMENT '响应解析完成时间(UTC)',
+                http_bytes INT NULL COMMENT '响应体字节数',
+                order_count INT NOT NULL DEFAULT 0 COMMENT '快照订单数',
+                inserted_count INT NOT NULL DEFAULT 0 COMMENT '新增订单数',
+                updated_count INT NOT NULL DEFAULT 0 COMMENT '更新订单数',
+                removed_count INT NOT NULL DEFAULT 0 COMMENT '下架订单数',
+                write_ms INT NULL COMMENT '数据库写入耗时(毫秒)',
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '写入时间',
+                KEY idx_task (server_type, product_type, id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='采集批次台账'
+        """)
+        
+        # 创建任务批次汇总（累计批次数和最新批次号，写入快照时与台账在同一个事务中更新）
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS collector_batch_summary (
+                server_type INT NOT NULL COMMENT '服务器类型',
+                product_type INT NOT NULL COMMENT '商品类型',
+                batch_count BIGINT NOT NULL DEFAULT 0 COMMENT '累计批次数（不随台账清理减少）',
+                last_batch_id BIGINT NOT NULL COMMENT '最新批次号',
+                PRIMARY KEY (server_type, product_type)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='任务批次汇总'
+        """)
+        
+        # 汇总表为空时（首次创建）按现有台账补齐，只执行一次
+        summary = db.fetch_one("SELECT 1 AS found FROM collector_batch_summary LIMIT 1")
+        if not summary:
+            db.execute("""
+                INSERT IGNORE INTO collector_batch_summary (server_type, product_type, batch_count, last_batch_id)
+                SELECT server_type, product_type, COUNT(*), MAX(id)
+                FROM collector_batches
+                GROUP BY server_type, product_type
+            """)
+        
+        # 旧版本用秒级时间戳作为批次号，新台账的批次号从其之后开始，保证批次号单调递增
+        empty = db.fetch_one("SELECT COUNT(*) as count FROM collector_batches")
+        if empty and empty['count'] == 0:
+            last = db.fetch_one("SELECT MAX(batch_id) as batch_id FROM collector_status")
+            start = max(int(last['batch_id'] or 0) if last else 0, int(time.time())) + 1
+            db.execute(f"ALTER TABLE collector_batches AUTO_INCREMENT = {start}")
+        
+        # 为旧版本创建的表补充新增字段（先刷新表目录，包含上面新建的表）
+        catalog.invalidate()
+        ensure_columns(db, 'collector_tasks', {
+            'poll_interval': "DOUBLE NULL COMMENT '当前采集周期(秒)'",
+            'change_rate': "DOUBLE NULL COMMENT '估计的订单变化率(每秒)'",
+            'last_poll_time': "DATETIME NULL COMMENT '上次采集时间'",
+            'next_due_time': "DATETIME NULL COMMENT '下次采集时间'",
+            'owner_id': "VARCHAR(100) NULL COMMENT '分片模式下认领该任务的采集进程'",
+            'lease_until': "DATETIME NULL COMMENT '认领有效期'"
+        })
+        
+        ensure_columns(db, 'collector_status', {
+            'runtime_stats': "TEXT NULL COMMENT '运行统计(JSON)'",
+            'control_version': "INT NOT NULL DEFAULT 0 COMMENT '控制参数版本号'",
+            'lease_owner': "VARCHAR(100) NULL COMMENT '持有采集锁的进程'",
+            'lease_heartbeat': "DATETIME NULL COMMENT '采集进程心跳时间'"
+        })
+        
+        ensure_columns(db, 'collector_workers', {
+            'status': "TEXT NULL COMMENT '采集状态(JSON，分片模式下代替 collector_status 中的状态字段)'"
+        })
+        
+        # 创建价格汇总表（1m/1h/1d）
+        create_rollup_tables(db)
+        
+        # 创建订单变化日志表和卖家表
+        create_events_table(db)
+        create_sellers_table(db)
+        
+        # 统一表布局：创建 market_orders 并补充未来的月分区
+        if unified_layout():
+            create_unified_table(db)
+        catalog.invalidate()
+        
+        # 尚未删除内联卖家字段的市场表：新版写入器不再写入这些字段，NOT NULL 时插入会失败。
+        # 修改字段需要重建表，不在启动时执行，由迁移脚本处理
+        strict = strict_seller_columns(db)
+        if strict:
+            logger.warning(
+                f"{len(strict)} 张市场表的卖家字段仍为 NOT NULL，新版采集器写入会失败，"
+                f"请先执行 python -m collector.migrate_sellers"
+            )
+        
         # 初始化采集器状态
         db.execute("""
             INSERT IGNORE INTO collector_status (id, is_running, request_interval) VALUES (1, 0, 60)
@@ -61,24 +180,27 @@ def init_database():
     finally:
         db.close()
 
+def ensure_columns(db, table_name, columns):
+    """为已存在的表补充缺失的字段"""
+    existing_names = set(catalog.columns(db, table_name) or ())
+    
+    for column, definition in columns.items():
+        if column not in existing_names:
+            db.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}")
+            catalog.invalidate()
+            logger.info(f"表 {table_name} 新增字段 {column}")
+
 def create_market_table(db, server_type, product_type):
-    """创建市场数据表"""
-    table_name = f"market_{server_type}_{product_type}"
+    """创建市场数据表（统一表布局下所有商品共用 market_orders，只需确认该表存在）"""
+    table = MarketTable(server_type, product_type)
+    table_name = table.name
     
     try:
-        # 1. 检查表是否已存在
-        exists = db.fetch_one("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.tables 
-            WHERE table_schema = DATABASE() 
-            AND table_name = %s
-        """, (table_name,))
-        
-        if exists and exists['count'] > 0:
-            logger.info(f"表 {table_name} 已存在")
-            return True
-            
-        # 2. 创建表
+        if table.unified:
+            return create_unified_table(db)
+        
+        # 表目录中可能仍保留其他进程已删除的表，因此总是执行 CREATE TABLE IF NOT EXISTS，不依据缓存跳过
+        known = catalog.exists(db, table_name)
         db.execute(f"""
             CREATE TABLE IF NOT EXISTS {table_name} (
                 id BIGINT AUTO_INCREMENT PRIMARY KEY,
@@ -87,12 +209,7 @@ def create_market_table(db, server_type, product_type):
                 quantity INT NOT NULL COMMENT '数量',
                 quality TINYINT NOT NULL COMMENT '品质',
                 price DECIMAL(10,3) NOT NULL COMMENT '价格',
-                seller_id BIGINT NOT NULL COMMENT '卖家ID',
-                seller_name VARCHAR(100) NOT NULL COMMENT '卖家名称',
-                seller_realm_id TINYINT NOT NULL COMMENT '卖家服务器ID',
-                seller_certificates INT DEFAULT 0 COMMENT '卖家证书数',
-                seller_contest_wins INT DEFAULT 0 COMMENT '卖家比赛获胜次数',
-                seller_is_npc TINYINT(1) DEFAULT 0 COMMENT '是否NPC',
+                seller_id BIGINT NOT NULL COMMENT '卖家ID(卖家信息见 sellers 表)',
                 fees INT DEFAULT 0 COMMENT '交易费用',
                 posted_time DATETIME NOT NULL COMMENT '发布时间',
                 batch_id BIGINT NOT NULL COMMENT '采集批次号',
@@ -109,7 +226,11 @@ def create_market_table(db, server_type, product_type):
             COMMENT='市场数据表{server_type}服务器{product_type}商品'
         """)
         
-        logger.info(f"成功创建表 {table_name}")
+        if known:
+            logger.info(f"表 {table_name} 已存在")
+        else:
+            catalog.invalidate()
+            logger.info(f"成功创建表 {table_name}")
         return True
         
     except Exception as e:
@@ -0,0 +1,84 @@
+"""
+采集器租约
+通过 MySQL GET_LOCK 保证同一时间只有一个采集进程在工作。
+锁绑定在专用连接上，持有锁的进程退出或连接断开时 MySQL 立即释放锁，
+备用进程下一次重试即可接管
+"""
+import os
+import socket
+import logging
+
+from collector.collector_config import LEASE_CONFIG
+from models.database import Database
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+class CollectorLease:
+    """基于 GET_LOCK 的单实例租约，并在 collector_status 中写入心跳"""
+
+    def __init__(self, name=None):
+        self.name = name or f"{os.getenv('DB_NAME')}.{LEASE_CONFIG['lock_name']}"
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._db = None
+        self.held = False
+
+    def acquire(self):
+        """尝试获取租约（不等待），返回是否持有"""
+        try:
+            if self._db is None:
+                self._db = Database(pooled=False)  # 锁绑定在连接上，不能归还连接池
+            row = self._db.fetch_one("SELECT GET_LOCK(%s, 0) AS acquired", (self.name,))
+            self.held = bool(row and row['acquired'] == 1)
+            if self.held:
+                logger.info(f"采集进程 {self.owner} 获得采集锁 {self.name}")
+                self.heartbeat()
+        except Exception as e:
+            logger.error(f"获取采集锁失败: {str(e)}")
+            self._reset()
+        return self.held
+
+    def heartbeat(self):
+        """确认租约仍然有效并写入心跳，连接断开时返回 False"""
+        if not self.held:
+            return False
+        try:
+            row = self._db.fetch_one(
+                "SELECT IS_USED_LOCK(%s) = CONNECTION_ID() AS held", (self.name,)
+            )
+            if not row or not row['held']:
+                raise RuntimeError("采集锁已被释放")
+            self._db.execute("""
+                UPDATE collector_status
+                SET lease_owner = %s,
+                    lease_heartbeat = NOW()
+                WHERE id = 1
+            """, (self.owner,))
+            return True
+        except Exception as e:
+            logger.error(f"采集进程 {self.owner} 失去采集锁: {str(e)}")
+            self._reset()
+            return False
+
+    def release(self):
+        """主动释放租约"""
+        if self.held and self._db is not None:
+            try:
+                self._db.execute("""
+                    UPDATE collector_status
+                    SET lease_owner = NULL,
+                        lease_heartbeat = NULL
+                    WHERE id = 1 AND lease_owner = %s
+                """, (self.owner,))
+                self._db.fetch_one("SELECT RELEASE_LOCK(%s) AS released", (self.name,))
+                logger.info(f"采集进程 {self.owner} 释放采集锁")
+            except Exception as e:
+                logger.error(f"释放采集锁失败: {str(e)}")
+        self._reset()
+
+    def _reset(self):
+        self.held = False
+        if self._db is not None:
+            self._db.close()
+            self._db = None
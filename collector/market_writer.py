@@ -0,0 +1,273 @@
+"""
+市场数据写入
+将快照与内存订单索引比对，只把新增、变化和下架的订单写入市场表，并在同一事务中
+把这些变化追加到订单变化日志（market_order_events）、更新价格汇总表。
+卖家信息只写入 sellers 表（每批快照合并为一次 upsert，只包含新出现或有变化的卖家），市场表只保存 seller_id。
+需要写入的订单较多时（大快照、回放补录）可以改用 LOAD DATA LOCAL INFILE：
+先把订单写成临时 TSV 文件导入临时表 market_staging，再用一条 INSERT ... SELECT 合并进市场表
+"""
+import os
+import time
+import logging
+import tempfile
+import itertools
+
+import pymysql
+
+from collector.snapshot_index import OrderIndex
+from collector.batch_ledger import open_batch, record_batches, record_write_times, _utc
+from collector.storage import MarketTable
+from collector.catalog import catalog
+from collector.rollup import RollupAccumulator
+from collector.order_events import diff_events, write_events
+from collector.sellers import SellerCache, write_sellers
+from collector.collector_config import ROLLUP_CONFIG, STORAGE_CONFIG
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+# 客户端或服务端不允许 LOAD DATA LOCAL 时的错误码
+_LOCAL_INFILE_ERRORS = (1148, 2068, 3948)
+
+_MARKET_COLUMNS = """
+    market_id, kind, quantity, quality, price,
+    seller_id, fees, posted_time, batch_id
+"""
+
+_UPSERT_UPDATE = """ON DUPLICATE KEY UPDATE
+    quantity = VALUES(quantity),
+    quality = VALUES(quality),
+    price = VALUES(price),
+    fees = VALUES(fees),
+    posted_time = VALUES(posted_time),
+    batch_id = VALUES(batch_id),
+    data_version = data_version + 1,
+    is_valid = 1,
+    updated_at = NOW()
+"""
+
+
+class IngestStats:
+    """一种写入方式的累计行数和耗时"""
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def add(self, rows, seconds):
+        self.count += 1
+        self.rows += rows
+        self.seconds += seconds
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'rows': self.rows,
+            'rows_per_sec': round(self.rows / self.seconds) if self.seconds else 0
+        }
+
+
+class MarketWriter:
+    """市场表写入器，每张表维护一份订单索引"""
+
+    def __init__(self, db, bulk_threshold=None, derived=True):
+        self.db = db
+        self._indexes = {}  # 逻辑表名 -> OrderIndex，各商品订单的最新状态
+        self._quality_stats = {}  # 逻辑表名 -> 最后写入的快照按品质的统计，数据未变化的采集据此记入汇总
+        # 是否写入由快照派生的数据（订单变化日志、价格汇总）；回放归档时关闭，避免重复计入已采集过的快照
+        self.derived = derived
+        self.sellers = SellerCache()
+        # 需要写入的订单数达到该值时使用 LOAD DATA；None 表示不使用，连接未开启 local_infile 时同样不使用
+        self.bulk_threshold = bulk_threshold if db.local_infile else None
+        self.ingest = {'values': IngestStats(), 'bulk': IngestStats()}
+
+    def warm(self, keys, skip_missing=False):
+        """在事务之外加载卖家缓存和各表的订单索引 [(server_type, product_type)]，已加载的跳过；
+        skip_missing 时同样跳过尚未建表的任务（启动时预加载）"""
+        if self.sellers.sellers is None:
+            self.sellers.warm(self.db)
+        for server_type, product_type in keys:
+            table = MarketTable(server_type, product_type)
+            if table.label in self._indexes or (skip_missing and not catalog.exists(self.db, table.name)):
+                continue
+            self._indexes[table.label] = OrderIndex.warm(self.db, table)
+
+    def save(self, server_type, product_type, data, fetch=None):
+        """保存一次快照，返回比对结果"""
+        return self.save_many([(server_type, product_type, data, fetch)])[0]
+
+    def save_many(self, snapshots):
+        """在一个事务中保存多个快照 [(server_type, product_type, data, fetch)]，返回各自的比对结果；
+        fetch 为采集信息（FetchInfo 或 FetchResult），每个快照在批次台账中登记一行，diff.batch_id 为其批次号。
+        data 为 None 表示数据未变化的采集：只按上一个快照的统计记入价格汇总，比对结果为 None"""
+        pending = []
+        diffs = []
+        sellers = {}
+        try:
+            # 尚未加载的索引在开启事务之前加载，不在事务中执行全表读取
+            self.warm((server_type, product_type) for server_type, product_type, data, _ in snapshots if data is not None)
+            with self.db.transaction():
+                timings = []
+                opened = []
+                rollups = RollupAccumulator()
+                for server_type, product_type, data, fetch in snapshots:
+                    table = MarketTable(server_type, product_type)
+                    at = fetch.finished_at if fetch is not None and fetch.finished_at else time.time()
+                    if data is None:
+                        stats = self._quality_stats.get(table.label)
+                        if self.derived and ROLLUP_CONFIG['enabled'] and stats is not None:
+                            rollups.add_stats(server_type, product_type, stats, at)
+                        diffs.append(None)
+                        continue
+
+                    index = self._indexes[table.label]
+
+                    diff = index.diff(data)
+                    self.sellers.collect(data, sellers)
+                    diff.batch_id = open_batch(self.db, server_type, product_type, fetch, diff)
+                    if not getattr(fetch, 'batch_id', None):
+                        opened.append((server_type, product_type, diff.batch_id))
+                    if diff.inserted or diff.changed or diff.removed:
+                        started = time.perf_counter()
+                        self.write_diff(table, diff, diff.batch_id)
+                        if self.derived and STORAGE_CONFIG['order_events']:
+                            write_events(self.db, diff_events(server_type, product_type, index, diff, _utc(at)))
+                        if not getattr(fetch, 'batch_id', None):
+                            timings.append((diff.batch_id, round((time.perf_counter() - started) * 1000)))
+                    stats = data.by_quality()
+                    if self.derived and ROLLUP_CONFIG['enabled']:
+                        rollups.add_stats(server_type, product_type, stats, at)
+                    pending.append((table.label, index, diff, stats))
+                    diffs.append(diff)
+                write_sellers(self.db, sellers)
+                record_batches(self.db, opened)
+                record_write_times(self.db, timings)
+                rollups.flush(self.db)
+
+        except Exception as e:
+            # 事务已回滚，丢弃本批涉及的索引，下次从数据库重新加载
+            for server_type, product_type, _, _ in snapshots:
+                self._indexes.pop(f"market_{server_type}_{product_type}", None)
+            catalog.missing_table(e)
+            logger.error(f"保存市场数据失败: {str(e)}")
+            raise
+
+        # 事务提交后再合并进索引和卖家缓存，保证与数据库一致
+        self.sellers.apply(sellers)
+        for table_name, index, diff, stats in pending:
+            index.apply(diff)
+            self._quality_stats[table_name] = stats
+            logger.info(
+                f"表 {table_name} 批次 {diff.batch_id} 新增 {len(diff.inserted)} 条，更新 {len(diff.changed)} 条，"
+                f"未变化 {diff.unchanged} 条，下架 {len(diff.removed)} 条"
+            )
+        return diffs
+
+    def write_diff(self, table, diff, batch_id):
+        """只把发生变化的订单写入数据库：新增和变化的订单合并为一次多行 upsert 或一次 LOAD DATA 导入"""
+        if table.unified and diff.reposted:
+            self._move_reposted(table, diff)
+
+        count = len(diff.inserted) + len(diff.changed)
+        if count:
+            started = time.perf_counter()
+            if self.bulk_threshold is not None and count >= self.bulk_threshold \
+                    and self._bulk_upsert(table, diff, batch_id):
+                self.ingest['bulk'].add(count, time.perf_counter() - started)
+            else:
+                started = time.perf_counter()
+                self._values_upsert(table, diff, batch_id)
+                self.ingest['values'].add(count, time.perf_counter() - started)
+
+        # 标记已下架的订单
+        for start in range(0, len(diff.removed), 1000):
+            chunk = diff.removed[start:start + 1000]
+            self.db.execute(f"""
+                UPDATE {table.name} 
+                SET is_valid = 0 
+                WHERE {table.where()} AND market_id IN ({','.join(['%s'] * len(chunk))})
+            """, chunk)
+
+    def _move_reposted(self, table, diff):
+        """统一表的主键包含发布时间：发布时间变化的订单先把旧行改到新的发布时间，随后的 upsert 才能命中该行"""
+        posted = {}
+        market_ids = diff.columns.market_id
+        for i, state, _ in diff.changed:
+            posted[market_ids[i]] = state[4]
+        self.db.executemany(f"""
+            UPDATE {table.name}
+            SET posted_time = %s
+            WHERE {table.where()} AND market_id = %s
+        """, [(posted[market_id], market_id) for market_id in diff.reposted])
+
+    def _values_upsert(self, table, diff, batch_id):
+        """基于 uk_market_id 的多行 INSERT ... ON DUPLICATE KEY UPDATE，版本号在服务端递增"""
+        # 行按需从列中组装，execute_values 只在内存中保留当前分块的 SQL
+        columns = diff.columns
+        rows = (
+            columns.row(entry[0], batch_id)
+            for entry in itertools.chain(diff.inserted, diff.changed)
+        )
+        self.db.execute_values(f"""
+            INSERT INTO {table.name} ({table.key_columns}{_MARKET_COLUMNS}, data_version, is_valid, data_source) VALUES""", rows,
+            f"({table.key_values}%s, %s, %s, %s, %s, %s, %s, %s, %s, 1, 1, 'api')",
+            _UPSERT_UPDATE)
+
+    def _bulk_upsert(self, table, diff, batch_id):
+        """写成临时 TSV 文件，LOAD DATA 导入临时表后合并进市场表；
+        服务端不允许 LOAD DATA LOCAL 时关闭该方式并返回 False，由调用方改用多行 upsert"""
+        path = self._write_tsv(diff, batch_id)
+        try:
+            # 临时表只对当前连接可见；用 DELETE 清空，TRUNCATE 会隐式提交当前事务
+            self.db.execute(f"""
+                CREATE TEMPORARY TABLE IF NOT EXISTS market_staging (
+                    market_id BIGINT NOT NULL PRIMARY KEY,
+                    kind TINYINT NOT NULL,
+                    quantity INT NOT NULL,
+                    quality TINYINT NOT NULL,
+                    price DECIMAL(10,3) NOT NULL,
+                    seller_id BIGINT NOT NULL,
+                    fees INT,
+                    posted_time DATETIME NOT NULL,
+                    batch_id BIGINT NOT NULL
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """)
+            self.db.execute("DELETE FROM market_staging")
+            self.db.execute(f"""
+                LOAD DATA LOCAL INFILE %s INTO TABLE market_staging
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                ({_MARKET_COLUMNS})
+            """, (path,))
+            self.db.execute(f"""
+                INSERT INTO {table.name} ({table.key_columns}{_MARKET_COLUMNS}, data_version, is_valid, data_source)
+                SELECT {table.key_values}{_MARKET_COLUMNS}, 1, 1, 'api' FROM market_staging
+                {_UPSERT_UPDATE}
+            """)
+            return True
+        except pymysql.err.MySQLError as e:
+            if e.args and e.args[0] in _LOCAL_INFILE_ERRORS:
+                logger.warning(f"数据库不允许 LOAD DATA LOCAL INFILE，改用多行 upsert: {str(e)}")
+                self.bulk_threshold = None
+                return False
+            raise
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def _write_tsv(diff, batch_id):
+        """新增和变化的订单写入临时 TSV 文件（LOAD DATA 默认格式：制表符分隔，各列均为数字和时间，不需要转义），返回文件路径"""
+        columns = diff.columns
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv', delete=False) as tsv:
+            for entry in itertools.chain(diff.inserted, diff.changed):
+                i = entry[0]
+                price = columns.price[i]
+                tsv.write(
+                    f"{columns.market_id[i]}\t{columns.kind[i]}\t{columns.quantity[i]}\t{columns.quality[i]}\t"
+                    f"{price // 1000}.{price % 1000:03d}\t{columns.seller_id[i]}\t"
+                    f"{columns.fees[i]}\t{columns.posted[i]}\t{batch_id}\n"
+                )
+            return tsv.name
@@ -0,0 +1,205 @@
+"""
+卖家信息迁移：从各市场表的内联卖家字段回填 sellers 表，再删除市场表中的这些字段
+市场表中的卖家字段在每个商品表中重复存储同一批公司的名称和统计，迁移后市场表只保留 seller_id。
+
+用法:
+    python -m collector.migrate_sellers                   # 回填 sellers 表（采集器可以继续运行）
+    python -m collector.migrate_sellers --drop-columns    # 回填后删除市场表的卖家字段并输出节省的空间
+    python -m collector.migrate_sellers --drop-columns --tables market_0_1 market_0_2
+
+切换步骤：
+    1. 回填（旧版采集器继续运行）。回填前先把市场表中 NOT NULL 的卖家字段改为可空（relax_seller_columns），
+       之后即可启动新版采集器，新写入的行这些字段为空
+    2. 停止采集器，执行 --drop-columns（再次回填补齐期间出现的新卖家，然后逐表删除字段）
+    3. 启动新版采集器和 Web 服务，新版写入器不再写入市场表的卖家字段
+回填只插入 sellers 表中还没有的卖家，采集器已写入的卖家信息更新，不会被旧数据覆盖。
+修改和删除字段使用 ALGORITHM=INPLACE 重建表，不阻塞读写，耗时与表大小成正比，因此只在这里执行，
+init_database 只检查并提示（strict_seller_columns）
+"""
+import sys
+import os
+import time
+import argparse
+import logging
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collector.catalog import catalog
+from collector.sellers import create_sellers_table, insert_missing_sellers, SELLERS_TABLE
+from models.database import Database
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+_LEGACY_COLUMNS = (
+    'seller_name', 'seller_realm_id', 'seller_certificates', 'seller_contest_wins', 'seller_is_npc'
+)
+
+
+def legacy_tables(db, names=None):
+    """仍带有内联卖家字段的市场表（单商品表和统一表）"""
+    return [
+        name for name, columns in sorted(catalog.tables(db).items())
+        if name.startswith('market_') and 'seller_name' in columns and (not names or name in names)
+    ]
+
+
+def collect_sellers(db, table_name, sellers):
+    """按 seller_id 索引汇总一张表中的卖家信息，合并进 sellers {seller_id: (最后出现时间, 信息)}；
+    证书数和获胜次数只增不减，取各表中的最大值；名称、服务器和是否 NPC 取该卖家最近写入的一行。
+    新版写入器写入的行卖家字段为空，不参与汇总。回填只是初始值，采集器写入下一个快照时会用接口返回的当前信息覆盖"""
+    rows = db.fetch_all(f"""
+        SELECT t.seller_id, t.seller_name, t.seller_realm_id, t.seller_is_npc,
+               s.seller_certificates, s.seller_contest_wins, s.seen
+        FROM (
+            SELECT seller_id,
+                   MAX(seller_certificates) AS seller_certificates,
+                   MAX(seller_contest_wins) AS seller_contest_wins,
+                   MAX(COALESCE(updated_at, created_at)) AS seen
+            FROM {table_name}
+            WHERE seller_name IS NOT NULL
+            GROUP BY seller_id
+        ) s
+        JOIN {table_name} t ON t.seller_id = s.seller_id AND COALESCE(t.updated_at, t.created_at) = s.seen
+        WHERE t.seller_name IS NOT NULL
+    """)
+    collected = set()
+    for row in rows:
+        # 同一时间写入的多行只取一行
+        if row['seller_id'] in collected:
+            continue
+        collected.add(row['seller_id'])
+        info = (
+            row['seller_name'], row['seller_realm_id'], row['seller_certificates'] or 0,
+            row['seller_contest_wins'] or 0, row['seller_is_npc'] or 0
+        )
+        known = sellers.get(row['seller_id'])
+        if known is None:
+            sellers[row['seller_id']] = (row['seen'], info)
+            continue
+        seen, old = known
+        latest = info if row['seen'] > seen else old
+        sellers[row['seller_id']] = (max(seen, row['seen']), (
+            latest[0], latest[1], max(old[2], info[2]), max(old[3], info[3]), latest[4]
+        ))
+    return len(collected)
+
+
+def strict_seller_columns(db):
+    """尚未删除卖家字段的表中 NOT NULL 且没有默认值的卖家字段 {表名: [(字段, 类型)]}，
+    新版写入器不写这些字段，严格模式下的插入会失败。表中没有卖家字段时只读表目录，不查询数据库"""
+    if not legacy_tables(db):
+        return {}
+    rows = db.fetch_all("""
+        SELECT table_name AS table_name, column_name AS column_name, column_type AS column_type
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name LIKE 'market\\_%%'
+        AND column_name IN ('seller_name', 'seller_realm_id')
+        AND is_nullable = 'NO'
+        AND column_default IS NULL
+        ORDER BY table_name, ordinal_position
+    """)
+    columns = {}
+    for row in rows:
+        columns.setdefault(row['table_name'], []).append((row['column_name'], row['column_type']))
+    return columns
+
+
+def relax_seller_columns(db, names=None):
+    """把 strict_seller_columns 中的字段改为可空，返回修改的表"""
+    columns = {
+        table_name: modify for table_name, modify in strict_seller_columns(db).items()
+        if not names or table_name in names
+    }
+    for table_name, modify in columns.items():
+        # 改为可空需要重建表，INPLACE 不阻塞读写
+        db.execute(f"""
+            ALTER TABLE {table_name}
+            {', '.join(f'MODIFY COLUMN {column} {column_type} NULL DEFAULT NULL' for column, column_type in modify)},
+            ALGORITHM=INPLACE, LOCK=NONE
+        """)
+        logger.info(f"表 {table_name} 的卖家字段 {', '.join(column for column, _ in modify)} 改为可空")
+    if columns:
+        catalog.invalidate()
+    return list(columns)
+
+
+def table_size(db, table_name):
+    """表的数据和索引占用字节数（先 ANALYZE 刷新统计信息）"""
+    db.fetch_all(f"ANALYZE TABLE {table_name}")
+    row = db.fetch_one("""
+        SELECT data_length + index_length AS size
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+    """, (table_name,))
+    return int(row['size'] or 0) if row else 0
+
+
+def drop_seller_columns(db, table_name):
+    """删除一张表的内联卖家字段，返回 (删除前字节数, 删除后字节数)"""
+    before = table_size(db, table_name)
+    # 只删除字段的 INSTANT 算法不会释放已有行占用的空间，这里显式重建
+    db.execute(f"""
+        ALTER TABLE {table_name}
+        {', '.join(f'DROP COLUMN {column}' for column in _LEGACY_COLUMNS)},
+        ALGORITHM=INPLACE, LOCK=NONE
+    """)
+    catalog.invalidate()
+    return before, table_size(db, table_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把市场表中的卖家信息迁移到 sellers 表')
+    parser.add_argument('--tables', nargs='*', help='只处理这些表')
+    parser.add_argument('--drop-columns', action='store_true', help='回填后删除市场表的卖家字段')
+    parser.add_argument('--sleep', type=float, default=0.0, help='每张表之间的等待时间（秒）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    db = Database()
+    try:
+        create_sellers_table(db)
+        tables = legacy_tables(db, args.tables)
+        print(f"共 {len(tables)} 张表带有卖家字段")
+        relaxed = relax_seller_columns(db, args.tables)
+        if relaxed:
+            print(f"{len(relaxed)} 张表的卖家字段已改为可空")
+
+        started = time.perf_counter()
+        sellers = {}
+        for table_name in tables:
+            count = collect_sellers(db, table_name, sellers)
+            print(f"{table_name}: {count} 个卖家")
+            if args.sleep:
+                time.sleep(args.sleep)
+        insert_missing_sellers(db, {seller_id: info for seller_id, (_, info) in sellers.items()})
+        print(f"回填完成：{len(sellers)} 个卖家，耗时 {time.perf_counter() - started:.1f} 秒")
+
+        if not args.drop_columns:
+            return
+
+        total_before = total_after = 0
+        for table_name in tables:
+            before, after = drop_seller_columns(db, table_name)
+            total_before += before
+            total_after += after
+            print(f"{table_name}: {before / 1024 / 1024:.1f}MB -> {after / 1024 / 1024:.1f}MB")
+            if args.sleep:
+                time.sleep(args.sleep)
+        sellers_size = table_size(db, SELLERS_TABLE)
+        saved = total_before - total_after - sellers_size
+        print(
+            f"市场表 {total_before / 1024 / 1024:.1f}MB -> {total_after / 1024 / 1024:.1f}MB，"
+            f"sellers 表 {sellers_size / 1024 / 1024:.1f}MB，"
+            f"共节省 {saved / 1024 / 1024:.1f}MB（{saved / total_before if total_before else 0:.0%}）"
+        )
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+存储布局迁移：把各商品的 market_{server_type}_{product_type} 表复制到统一的 market_orders 分区表
+按主键 id 分块复制，每块一个短事务（先删除统一表中这些订单的旧行再插入），可以重复执行，
+采集器在复制期间照常写入旧表。
+
+用法:
+    python -m collector.migrate_storage                        # 全量复制，结束时输出本次开始时间
+    python -m collector.migrate_storage --since "2024-01-01 12:00"   # 只复制该时间之后新增或更新的行
+    python -m collector.migrate_storage --tables market_0_1 market_0_2 --chunk 5000 --sleep 0.05
+
+切换步骤：
+    1. 全量复制（采集器继续运行）
+    2. 停止采集器，用第 1 步输出的开始时间执行 --since 补齐复制期间的变化
+    3. 设置 STORAGE_CONFIG["layout"] = "unified"（或环境变量 SC_STORAGE_LAYOUT=unified），重启采集器和 Web 服务
+旧表不会被删除，确认无误后手动清理
+"""
+import sys
+import os
+import time
+import argparse
+import logging
+from datetime import datetime
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collector.catalog import catalog
+from collector.storage import UNIFIED_TABLE, create_unified_table
+from models.database import Database
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+_COPY_COLUMNS = """
+    market_id, kind, quantity, quality, price,
+    seller_id, fees, posted_time, batch_id,
+    data_version, is_valid, data_source, created_at, updated_at
+"""
+
+
+def per_product_tables(db, names=None):
+    """列出待迁移的单商品市场表 [(表名, server_type, product_type)]"""
+    return [table for table in catalog.market_tables(db) if not names or table[0] in names]
+
+
+def copy_table(db, table_name, server_type, product_type, since=None, chunk_size=5000, pause=0.0):
+    """按 id 分块把一张单商品表复制到统一表，返回复制的行数"""
+    changed = ""
+    params = []
+    if since is not None:
+        # 更新时间为空的行是之后没有再更新过的新增行，按创建时间判断
+        changed = "AND (updated_at >= %s OR created_at >= %s)"
+        params = [since, since]
+
+    copied = 0
+    last_id = 0
+    while True:
+        rows = db.fetch_all(f"""
+            SELECT id, market_id
+            FROM {table_name}
+            WHERE id > %s {changed}
+            ORDER BY id
+            LIMIT %s
+        """, [last_id, *params, chunk_size])
+        if not rows:
+            break
+
+        market_ids = [row['market_id'] for row in rows]
+        first_id, last_id = rows[0]['id'], rows[-1]['id']
+        with db.transaction():
+            # 同一订单在统一表中只保留一行（发布时间可能已变化，按 market_id 删除）
+            db.execute(f"""
+                DELETE FROM {UNIFIED_TABLE}
+                WHERE server_type = %s AND product_type = %s
+                AND market_id IN ({','.join(['%s'] * len(market_ids))})
+            """, [server_type, product_type, *market_ids])
+            db.execute(f"""
+                INSERT INTO {UNIFIED_TABLE} (server_type, product_type, {_COPY_COLUMNS})
+                SELECT %s, %s, {_COPY_COLUMNS}
+                FROM {table_name}
+                WHERE id BETWEEN %s AND %s {changed}
+            """, [server_type, product_type, first_id, last_id, *params])
+        copied += len(rows)
+        if pause:
+            time.sleep(pause)
+    return copied
+
+
+def parse_time(value):
+    return datetime.strptime(value, '%Y-%m-%d %H:%M') if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把单商品市场表迁移到统一的 market_orders 表')
+    parser.add_argument('--since', help='只复制该时间之后新增或更新的行，格式 "YYYY-MM-DD HH:MM"（数据库时间）')
+    parser.add_argument('--tables', nargs='*', help='只迁移这些表')
+    parser.add_argument('--chunk', type=int, default=5000, help='每个事务复制的行数')
+    parser.add_argument('--sleep', type=float, default=0.0, help='每块之间的等待时间（秒），降低对线上写入的影响')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    db = Database()
+    try:
+        started_at = db.fetch_one("SELECT NOW() AS now")['now']
+        create_unified_table(db)
+        tables = per_product_tables(db, args.tables)
+        print(f"共 {len(tables)} 张表待迁移")
+
+        since = parse_time(args.since)
+        total = 0
+        started = time.perf_counter()
+        for table_name, server_type, product_type in tables:
+            copied = copy_table(db, table_name, server_type, product_type, since, args.chunk, args.sleep)
+            total += copied
+            print(f"{table_name}: {copied} 行")
+
+        elapsed = time.perf_counter() - started
+        print(f"迁移完成：{total} 行，耗时 {elapsed:.1f} 秒（{total / elapsed if elapsed else 0:.0f} 行/秒）")
+        print(f"本次开始时间 {started_at:%Y-%m-%d %H:%M}，停止采集器后用 --since \"{started_at:%Y-%m-%d %H:%M}\" 补齐之后的变化")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
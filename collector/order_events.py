@@ -0,0 +1,78 @@
+"""
+订单变化日志
+市场表只保存订单的当前状态；每次快照中真正发生变化的订单另外追加一行到 market_order_events：
+新增、价格变化、数量变化、其他字段（品质、费用、发布时间）变化和下架，用位标记组合在 event 列中。
+只追加不更新，写入量与市场的实际变化成正比，与采集频率无关；订单的历史价格和数量按 id 顺序读取即可还原。
+
+价格和数量为事件发生后的值，下架事件记录下架前最后的价格和数量；
+event_time 为快照的采集时间(UTC)，batch_id 对应 collector_batches 中的批次
+"""
+import logging
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+EVENTS_TABLE = 'market_order_events'
+
+# 事件位标记
+EVENT_NEW = 1
+EVENT_PRICE = 2
+EVENT_QUANTITY = 4
+EVENT_OTHER = 8
+EVENT_REMOVED = 16
+
+
+def create_events_table(db):
+    db.execute(f"""
+        CREATE TABLE IF NOT EXISTS {EVENTS_TABLE} (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            server_type TINYINT NOT NULL COMMENT '服务器类型',
+            product_type SMALLINT NOT NULL COMMENT '商品类型',
+            market_id BIGINT NOT NULL COMMENT '市场订单ID',
+            batch_id BIGINT NOT NULL COMMENT '采集批次号',
+            event_time DATETIME NOT NULL COMMENT '快照采集时间(UTC)',
+            event TINYINT NOT NULL COMMENT '变化类型位标记: 1新增 2价格 4数量 8其他 16下架',
+            price DECIMAL(10,3) NOT NULL COMMENT '价格',
+            quantity INT NOT NULL COMMENT '数量',
+            KEY idx_order (server_type, product_type, market_id, id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='订单变化日志（只追加）'
+    """)
+
+
+def _changes(old, new):
+    """两个订单状态 (价格, 数量, 品质, 费用, 发布时间) 之间的变化标记"""
+    event = 0
+    if old[0] != new[0]:
+        event |= EVENT_PRICE
+    if old[1] != new[1]:
+        event |= EVENT_QUANTITY
+    if old[2:] != new[2:]:
+        event |= EVENT_OTHER
+    return event
+
+
+def diff_events(server_type, product_type, index, diff, event_time):
+    """按比对结果生成事件行；index 为尚未合并该比对结果的 OrderIndex（提供变化前的状态）"""
+    orders = index.orders
+    market_ids = diff.columns.market_id
+    batch_id = diff.batch_id
+    for i, state in diff.inserted:
+        yield (server_type, product_type, market_ids[i], batch_id, event_time,
+               EVENT_NEW, state[0] / 1000, state[1])
+    for i, state, _ in diff.changed:
+        market_id = market_ids[i]
+        yield (server_type, product_type, market_id, batch_id, event_time,
+               _changes(orders[market_id][0], state), state[0] / 1000, state[1])
+    for market_id in diff.removed:
+        state = orders[market_id][0]
+        yield (server_type, product_type, market_id, batch_id, event_time,
+               EVENT_REMOVED, state[0] / 1000, state[1])
+
+
+def write_events(db, events):
+    """追加事件行（生成器按数据包大小分块写入）"""
+    db.execute_values(f"""
+        INSERT INTO {EVENTS_TABLE} (
+            server_type, product_type, market_id, batch_id, event_time, event, price, quantity
+        ) VALUES""", events,
+        "(%s, %s, %s, %s, %s, %s, %s, %s)")
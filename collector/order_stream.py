@@ -0,0 +1,69 @@
+"""
+市场订单流式解析
+接口返回的是订单对象组成的 JSON 数组。这里边接收响应块边解析，
+每个响应块解析出的订单对象按批转换为列（SnapshotColumns），原始字典
+（包括不需要的 logo、ip、courseId 等）随即释放，不会同时持有完整的响应文本和整个字典列表
+"""
+import re
+import json
+import codecs
+
+from collector.columns import SnapshotColumns
+
+_decoder = json.JSONDecoder()
+_SEPARATOR = re.compile(r'[\s,]*')
+
+
+def parse_orders(body):
+    """一次性解析完整的响应体（回放等离线场景使用）"""
+    return SnapshotColumns.from_items(json.loads(body))
+
+
+def parse_stream(chunks):
+    """从字节块迭代器中流式解析订单数组，返回 SnapshotColumns"""
+    columns = SnapshotColumns()
+    for items in iter_batches(chunks):
+        columns.extend(items)
+    return columns
+
+
+def iter_batches(chunks):
+    """从字节块迭代器中流式解析订单数组，每个响应块返回一批订单字典"""
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    opened = closed = False
+    error = None
+
+    for chunk in chunks:
+        buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        if not opened:
+            pos = _SEPARATOR.match(buffer, pos).end()
+            if pos == len(buffer):
+                continue
+            if buffer[pos] != '[':
+                raise ValueError("市场数据格式错误：应为订单数组")
+            pos += 1
+            opened = True
+
+        items = []
+        while not closed:
+            pos = _SEPARATOR.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if buffer[pos] == ']':
+                closed = True
+                break
+            try:
+                item, pos = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                error = e  # 订单对象还不完整，等待下一个响应块
+                break
+            error = None
+            items.append(item)
+        if items:
+            yield items
+
+    if not closed:
+        raise error or ValueError("市场数据不完整：订单数组未结束")
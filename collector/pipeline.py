@@ -0,0 +1,229 @@
+"""
+采集流水线
+采集线程把解析好的快照放入有界队列，独立的写入线程从队列中取出，
+把多个快照合并到一个事务中写入 MySQL；队列写满时采集线程阻塞，形成反压
+"""
+import time
+import queue
+import threading
+import logging
+
+from collector.collector_config import PIPELINE_CONFIG, INGEST_CONFIG
+from collector.market_writer import MarketWriter
+from models.database import Database
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+_STOP = object()
+
+
+class StageStats:
+    """单个流水线阶段的耗时统计（毫秒）"""
+
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.count = 0
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            self.count += 1
+            self.last_ms = ms
+            self.max_ms = max(self.max_ms, ms)
+            self.avg_ms = ms if self.count == 1 else self.avg_ms + self.smoothing * (ms - self.avg_ms)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'last_ms': round(self.last_ms, 1),
+            'avg_ms': round(self.avg_ms, 1),
+            'max_ms': round(self.max_ms, 1)
+        }
+
+
+class Snapshot:
+    """在流水线中传递的一次采集结果"""
+
+    __slots__ = ('result', 'queued_at', 'diff', 'error')
+
+    def __init__(self, result):
+        self.result = result
+        self.queued_at = time.monotonic()
+        self.diff = None
+        self.error = None
+
+
+class SnapshotWriter(threading.Thread):
+    """写入阶段：从快照队列批量取出数据，一个事务写入多个快照"""
+
+    def __init__(self, snapshots, completed, state, config=None, warm_keys=()):
+        super().__init__(name='collector-writer', daemon=True)
+        config = dict(PIPELINE_CONFIG, **(config or {}))
+        self.snapshots = snapshots      # 待写入快照队列（有界）
+        self.completed = completed      # 写入完成的快照，交回调度线程
+        self.state = state              # 采集器内存状态
+        self.batch_size = config['write_batch_size']
+        self.linger = config['write_linger']
+        self.queue_wait = StageStats()
+        self.write = StageStats()
+        self.batches = 0
+        self.batched_snapshots = 0
+        self.ingest = {}                # 各写入方式（多行 upsert / LOAD DATA）的行数和速度
+        self.warm_keys = list(warm_keys)  # 启动时预加载订单索引的任务
+
+    def run(self):
+        bulk_load = INGEST_CONFIG['bulk_load']
+        db = Database(local_infile=bulk_load)
+        writer = MarketWriter(db, INGEST_CONFIG['bulk_threshold'] if bulk_load else None)
+        self.ingest = writer.ingest
+        try:
+            # 写入第一个批次之前预加载订单索引，首批快照不必在事务中等待全表读取
+            started = time.monotonic()
+            try:
+                writer.warm(self.warm_keys, skip_missing=True)
+                logger.info(f"预加载 {len(self.warm_keys)} 个任务的订单索引，耗时 {time.monotonic() - started:.1f} 秒")
+            except Exception as e:
+                logger.error(f"预加载订单索引失败，改为写入时加载: {str(e)}")
+            while True:
+                item = self.snapshots.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                stopping = self._fill_batch(batch)
+                try:
+                    self._write_batch(db, writer, batch)
+                except Exception as e:
+                    logger.error(f"写入批次失败: {str(e)}", exc_info=True)
+                    for snapshot in batch:
+                        if snapshot.diff is None and snapshot.error is None:
+                            snapshot.error = e
+                finally:
+                    # 数据未变化的采集已由调度线程处理，不再交回
+                    for snapshot in batch:
+                        if not snapshot.result.unchanged:
+                            self.completed.put(snapshot)
+                if stopping:
+                    break
+        finally:
+            db.close()
+            logger.info("写入线程已退出")
+
+    def _fill_batch(self, batch):
+        """在 linger 时间内继续收集快照，凑成一个批次；返回是否收到停止信号"""
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                item = self.snapshots.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _write_batch(self, db, writer, batch):
+        now = time.monotonic()
+        for snapshot in batch:
+            self.queue_wait.add(now - snapshot.queued_at)
+
+        started = time.monotonic()
+        try:
+            diffs = writer.save_many([self._args(s) for s in batch])
+            for snapshot, diff in zip(batch, diffs):
+                snapshot.diff = diff
+            self._update_batch_id(batch)
+        except Exception:
+            # 整批回滚后逐个重试，避免一个失败的快照拖累同批的其他快照
+            for snapshot in batch:
+                try:
+                    snapshot.diff = writer.save(*self._args(snapshot))
+                except Exception as e:
+                    snapshot.error = e
+            self._update_batch_id([s for s in batch if s.error is None])
+        self.write.add(time.monotonic() - started)
+        self.batches += 1
+        self.batched_snapshots += len(batch)
+
+    @staticmethod
+    def _args(snapshot):
+        server_type, product_type = snapshot.result.key
+        return server_type, product_type, snapshot.result.data, snapshot.result
+
+    def _update_batch_id(self, batch):
+        """更新采集器状态的批次号（数据未变化的采集没有比对结果）"""
+        written = [s.diff.batch_id for s in batch if s.diff and (s.diff.inserted or s.diff.changed or s.diff.removed)]
+        if written:
+            self.state.update(batch_id=max(written))
+
+
+class Pipeline:
+    """采集 -> 写入 两级流水线"""
+
+    def __init__(self, state, config=None, warm_keys=()):
+        config = dict(PIPELINE_CONFIG, **(config or {}))
+        self.snapshots = queue.Queue(maxsize=config['queue_size'])
+        self.completed = queue.Queue()
+        self.writer = SnapshotWriter(self.snapshots, self.completed, state, config, warm_keys)
+        self.fetch = StageStats()
+        self.enqueue_wait = StageStats()
+
+    def start(self):
+        self.writer.start()
+
+    def put(self, result, stop_event):
+        """采集线程调用：把快照放入队列，队列满时阻塞（反压），收到停止信号返回 False"""
+        self.fetch.add(result.fetch_seconds)
+        snapshot = Snapshot(result)
+        started = time.monotonic()
+        while True:
+            try:
+                self.snapshots.put(snapshot, timeout=0.5)
+                break
+            except queue.Full:
+                if stop_event.is_set():
+                    return False
+        self.enqueue_wait.add(time.monotonic() - started)
+        return True
+
+    def put_unchanged(self, result):
+        """调度线程调用：数据未变化的采集交给写入线程记入价格汇总；队列已满时丢弃，不阻塞调度"""
+        try:
+            self.snapshots.put_nowait(Snapshot(result))
+        except queue.Full:
+            pass
+
+    def drain_completed(self):
+        """取出所有已写入完成的快照"""
+        done = []
+        while True:
+            try:
+                done.append(self.completed.get_nowait())
+            except queue.Empty:
+                return done
+
+    def stop(self, timeout):
+        """停止写入线程，等待队列中已有的快照写完"""
+        try:
+            self.snapshots.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.writer.join(timeout)
+        if self.writer.is_alive():
+            logger.warning(f"写入线程在 {timeout} 秒内未能写完队列，剩余 {self.snapshots.qsize()} 个快照")
+
+    def stats(self):
+        return {
+            'queue_depth': self.snapshots.qsize(),
+            'queue_capacity': self.snapshots.maxsize,
+            'fetch': self.fetch.to_dict(),
+            'enqueue_wait': self.enqueue_wait.to_dict(),
+            'queue_wait': self.writer.queue_wait.to_dict(),
+            'write': self.writer.write.to_dict(),
+            'ingest': {name: stats.to_dict() for name, stats in self.writer.ingest.items()},
+            'avg_batch_size': round(self.writer.batched_snapshots / self.writer.batches, 1) if self.writer.batches else 0
+        }
@@ -0,0 +1,334 @@
+"""
+数据保留与清理
+市场表中已下架的订单（is_valid = 0）、分钟/小时K线、订单变化日志和采集批次台账超过保留天数后，
+先写入压缩归档文件，再按主键顺序分小块删除：每块一个短事务，块之间暂停，
+不会像一次性的 DELETE ... WHERE 那样长时间锁住正在写入的表。仍在挂单的订单不会被清理。
+
+保留天数见 RETENTION_CONFIG["keep_days"]，单个市场表可在 RETENTION_CONFIG["policies"] 中单独设置。
+采集进程在后台按 RETENTION_CONFIG["interval"] 定期执行（多个进程通过 GET_LOCK 保证只有一个在执行），
+也可以手动执行:
+
+    python -m collector.retention                          # 按配置清理全部表
+    python -m collector.retention --dry-run                # 只统计将被清理的行数
+    python -m collector.retention --tables market_0_1 market_rollup_1m --chunk 500 --sleep 0.5
+
+归档目录: {path}/{表名}/{YYYYMMDD-HHMMSS}.jsonl.gz，每行一条被删除的记录（JSON）。
+InnoDB 删除后释放的页会被表内后续写入复用，数据文件本身不会缩小
+"""
+import sys
+import os
+import gzip
+import json
+import time
+import threading
+import argparse
+import logging
+from datetime import datetime
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collector.collector_config import ARCHIVE_CONFIG, RETENTION_CONFIG
+from models.database import Database
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+class RetentionTarget:
+    """一组按同一条件清理的行：表内范围、主键（分块顺序）和过期条件（含一个保留天数参数）"""
+
+    __slots__ = ('label', 'name', 'scope', 'keys', 'expired', 'keep_days')
+
+    def __init__(self, label, name, keys, expired, keep_days, scope="1 = 1"):
+        self.label = label          # 策略、日志和归档目录使用的逻辑表名
+        self.name = name            # 物理表名
+        self.scope = scope
+        self.keys = keys
+        self.expired = expired
+        self.keep_days = keep_days
+
+
+def retention_targets(db, tables=None):
+    """按当前存储布局和保留配置列出需要清理的目标"""
+    from collector.migrate_storage import per_product_tables
+    from collector.order_events import EVENTS_TABLE
+    from collector.rollup import RESOLUTIONS, rollup_table
+    from collector.storage import UNIFIED_TABLE, MarketTable, unified_layout
+
+    keep_days = RETENTION_CONFIG['keep_days']
+    policies = RETENTION_CONFIG['policies']
+    # 更新时间为空的行在下架前没有更新过，下架时会写入更新时间；按创建时间兜底
+    market_expired = "is_valid = 0 AND COALESCE(updated_at, created_at) < NOW() - INTERVAL %s DAY"
+
+    targets = []
+    if unified_layout():
+        keys = db.fetch_all(f"SELECT DISTINCT server_type, product_type FROM {UNIFIED_TABLE}")
+        for row in keys:
+            table = MarketTable(row['server_type'], row['product_type'])
+            targets.append(RetentionTarget(
+                table.label, table.name, ['market_id'], market_expired,
+                policies.get(table.label, keep_days['market']), table.where()
+            ))
+    else:
+        for name, _, _ in per_product_tables(db):
+            targets.append(RetentionTarget(
+                name, name, ['id'], market_expired, policies.get(name, keep_days['market'])
+            ))
+
+    for resolution in RESOLUTIONS:
+        name = rollup_table(resolution)
+        targets.append(RetentionTarget(
+            name, name, ['server_type', 'product_type', 'quality', 'bucket'],
+            "bucket < UTC_TIMESTAMP() - INTERVAL %s DAY", keep_days.get(name)
+        ))
+    targets.append(RetentionTarget(
+        EVENTS_TABLE, EVENTS_TABLE, ['id'],
+        "event_time < UTC_TIMESTAMP() - INTERVAL %s DAY", keep_days.get(EVENTS_TABLE)
+    ))
+    targets.append(RetentionTarget(
+        'collector_batches', 'collector_batches', ['id'],
+        "created_at < NOW() - INTERVAL %s DAY", keep_days.get('collector_batches')
+    ))
+
+    return [
+        target for target in targets
+        if target.keep_days is not None and (not tables or target.label in tables)
+    ]
+
+
+class _ArchiveFile:
+    """一个目标本次清理的归档文件，写入第一块时创建"""
+
+    def __init__(self, root, label, stamp):
+        self.path = os.path.join(root, label, f"{stamp}.jsonl.gz")
+        self._file = None
+
+    def write(self, rows):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = gzip.open(self.path, 'at', encoding='utf-8',
+                                   compresslevel=ARCHIVE_CONFIG['compress_level'])
+        for row in rows:
+            self._file.write(json.dumps(row, ensure_ascii=False, default=str))
+            self._file.write('\n')
+        self._file.flush()
+
+    def close(self):
+        """关闭文件，返回归档字节数（没有写入时为 0）"""
+        if self._file is None:
+            return 0
+        self._file.close()
+        self._file = None
+        return os.path.getsize(self.path)
+
+
+def _after(keys, last):
+    """主键游标条件：从上一块的最后一个主键之后继续"""
+    if last is None:
+        return "", []
+    if len(keys) == 1:
+        return f"AND {keys[0]} > %s", list(last)
+    return f"AND ({', '.join(keys)}) > ({', '.join(['%s'] * len(keys))})", list(last)
+
+
+def _key_in(keys, count):
+    if len(keys) == 1:
+        return f"{keys[0]} IN ({','.join(['%s'] * count)})"
+    row = f"({', '.join(['%s'] * len(keys))})"
+    return f"({', '.join(keys)}) IN ({','.join([row] * count)})"
+
+
+def _row_length(db, name):
+    """表的平均行长度（字节，information_schema 估计值，含主键）"""
+    row = db.fetch_one("""
+        SELECT avg_row_length AS length
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+    """, (name,))
+    return int(row['length'] or 0) if row else 0
+
+
+def purge_target(db, target, archive=None, chunk_size=None, pause=None, stop=None):
+    """按主键顺序分块归档并删除一个目标的过期行，返回删除的行数"""
+    chunk_size = chunk_size or RETENTION_CONFIG['chunk_size']
+    pause = RETENTION_CONFIG['pause'] if pause is None else pause
+    order = ', '.join(target.keys)
+
+    deleted = 0
+    last = None
+    while True:
+        after, after_params = _after(target.keys, last)
+        rows = db.fetch_all(f"""
+            SELECT * FROM {target.name}
+            WHERE {target.scope} AND {target.expired} {after}
+            ORDER BY {order}
+            LIMIT %s
+        """, [target.keep_days, *after_params, chunk_size])
+        if not rows:
+            break
+
+        if archive is not None:
+            archive.write(rows)
+        keys = [tuple(row[key] for key in target.keys) for row in rows]
+        # 删除时再次检查过期条件：选出之后重新上架的订单不会被删除
+        deleted += db.execute(f"""
+            DELETE FROM {target.name}
+            WHERE {target.scope} AND {target.expired}
+            AND {_key_in(target.keys, len(keys))}
+        """, [target.keep_days, *(value for key in keys for value in key)])
+        last = keys[-1]
+
+        if len(rows) < chunk_size or (stop is not None and stop.is_set()):
+            break
+        if pause:
+            if stop is not None:
+                stop.wait(pause)
+            else:
+                time.sleep(pause)
+    return deleted
+
+
+def count_expired(db, target):
+    """统计一个目标当前的过期行数（--dry-run）"""
+    row = db.fetch_one(f"""
+        SELECT COUNT(*) AS count FROM {target.name}
+        WHERE {target.scope} AND {target.expired}
+    """, (target.keep_days,))
+    return row['count'] if row else 0
+
+
+def run_retention(db, tables=None, dry_run=False, archive=None, chunk_size=None, pause=None, stop=None):
+    """执行一轮清理，返回各表的清理结果 [{table, keep_days, rows, bytes, archived_bytes, seconds}]
+
+    bytes 为按平均行长度估计的回收空间，archived_bytes 为归档文件大小
+    """
+    from collector.archive import archive_root
+
+    archive = RETENTION_CONFIG['archive'] if archive is None else archive
+    root = archive_root(RETENTION_CONFIG['path'])
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    row_lengths = {}
+
+    reports = {}
+    for target in retention_targets(db, tables):
+        if stop is not None and stop.is_set():
+            break
+        report = reports.setdefault(target.label, {
+            'table': target.label, 'keep_days': target.keep_days,
+            'rows': 0, 'bytes': 0, 'archived_bytes': 0, 'seconds': 0.0
+        })
+        started = time.perf_counter()
+        try:
+            if dry_run:
+                rows = count_expired(db, target)
+            else:
+                archive_file = _ArchiveFile(root, target.label, stamp) if archive else None
+                try:
+                    rows = purge_target(db, target, archive_file, chunk_size, pause, stop)
+                finally:
+                    if archive_file is not None:
+                        report['archived_bytes'] += archive_file.close()
+        except Exception as e:
+            logger.error(f"清理表 {target.label} 失败: {str(e)}")
+            raise
+
+        if target.name not in row_lengths:
+            row_lengths[target.name] = _row_length(db, target.name)
+        report['rows'] += rows
+        report['bytes'] += rows * row_lengths[target.name]
+        report['seconds'] += time.perf_counter() - started
+        if rows and not dry_run:
+            logger.info(
+                f"清理 {target.label}: 删除 {rows} 行（保留 {target.keep_days} 天），"
+                f"约回收 {report['bytes'] / 1024 / 1024:.1f}MB，归档 {report['archived_bytes'] / 1024:.0f}KB"
+            )
+    return list(reports.values())
+
+
+class RetentionJob:
+    """采集进程中的后台清理线程；GET_LOCK 保证多个采集进程中同一时间只有一个在清理"""
+
+    def __init__(self, shutdown=None):
+        self.name = f"{os.getenv('DB_NAME')}.{RETENTION_CONFIG['lock_name']}"
+        self._shutdown = shutdown or threading.Event()
+        self.last_report = None
+
+    def start(self):
+        thread = threading.Thread(target=self._loop, name='collector-retention', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._shutdown.set()
+
+    def _loop(self):
+        # 启动后先等待一个间隔，避免与采集进程启动时的写入高峰重叠
+        while not self._shutdown.wait(RETENTION_CONFIG['interval']):
+            self.run_once()
+            self.prune_archive()
+
+    def prune_archive(self):
+        """清理本机的原始快照归档（文件在各采集进程所在的主机上，不需要数据库锁）"""
+        from collector.archive import prune_archive
+        try:
+            return prune_archive()
+        except OSError as e:
+            logger.error(f"清理归档失败: {str(e)}")
+            return None
+
+    def run_once(self):
+        """获取清理锁并执行一轮清理，未获取到锁时返回 None"""
+        db = None
+        try:
+            db = Database(pooled=False)  # 清理锁绑定在连接上，不使用连接池
+            row = db.fetch_one("SELECT GET_LOCK(%s, 0) AS acquired", (self.name,))
+            if not row or row['acquired'] != 1:
+                return None
+            try:
+                self.last_report = run_retention(db, stop=self._shutdown)
+            finally:
+                db.fetch_one("SELECT RELEASE_LOCK(%s) AS released", (self.name,))
+            return self.last_report
+        except Exception as e:
+            logger.error(f"数据清理失败: {str(e)}")
+            return None
+        finally:
+            if db is not None:
+                db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按保留策略归档并删除过期的市场数据')
+    parser.add_argument('--tables', nargs='*', help='只清理这些表（逻辑表名，如 market_0_1、market_rollup_1m）')
+    parser.add_argument('--dry-run', action='store_true', help='只统计将被清理的行数，不删除')
+    parser.add_argument('--no-archive', action='store_true', help='删除前不写归档文件')
+    parser.add_argument('--chunk', type=int, default=None, help='每块删除的行数')
+    parser.add_argument('--sleep', type=float, default=None, help='每块之间的等待时间（秒）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    db = Database()
+    try:
+        reports = run_retention(
+            db, args.tables, args.dry_run,
+            archive=False if args.no_archive else None,
+            chunk_size=args.chunk, pause=args.sleep
+        )
+    finally:
+        db.close()
+
+    action = '待清理' if args.dry_run else '已删除'
+    for report in reports:
+        print(f"{report['table']}: {action} {report['rows']} 行（保留 {report['keep_days']} 天），"
+              f"约 {report['bytes'] / 1024 / 1024:.1f}MB，归档 {report['archived_bytes'] / 1024:.0f}KB，"
+              f"耗时 {report['seconds']:.1f} 秒")
+    total_rows = sum(report['rows'] for report in reports)
+    total_bytes = sum(report['bytes'] for report in reports)
+    print(f"合计{action} {total_rows} 行，约 {total_bytes / 1024 / 1024:.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
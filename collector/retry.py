@@ -0,0 +1,137 @@
+"""
+采集失败重试策略
+每个任务独立计算带抖动的指数退避，遵守服务器返回的 Retry-After；
+连续失败达到阈值时打开熔断器，任务暂停一个冷却期，冷却结束后试探一次，
+成功则关闭熔断器，失败则加倍冷却期。其他任务的调度不受影响
+"""
+import time
+import random
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from collector.collector_config import RETRY_CONFIG
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+# 表示服务器限流或暂时不可用的状态码
+THROTTLE_STATUS = (429, 503)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或 HTTP 日期），返回秒数，无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def describe_error(error):
+    """返回 (HTTP 状态码, Retry-After 秒数)，非 HTTP 错误时均为 None"""
+    response = getattr(error, 'response', None) if isinstance(error, requests.RequestException) else None
+    if response is None:
+        return None, None
+    return response.status_code, parse_retry_after(response.headers.get('Retry-After'))
+
+
+class TaskRetry:
+    """单个任务的失败计数和熔断状态"""
+
+    __slots__ = ('failures', 'state', 'cooldown', 'retry_at', 'last_error', 'last_status')
+
+    def __init__(self):
+        self.failures = 0
+        self.state = CLOSED
+        self.cooldown = 0.0
+        self.retry_at = None
+        self.last_error = None
+        self.last_status = None
+
+
+class RetryPolicy:
+    """按任务记录失败次数，计算下次重试的延迟"""
+
+    def __init__(self, config=None):
+        config = dict(RETRY_CONFIG, **(config or {}))
+        self.base_delay = config['base_delay']
+        self.max_delay = config['max_delay']
+        self.failure_threshold = config['failure_threshold']
+        self.cooldown = config['cooldown']
+        self.max_cooldown = config['max_cooldown']
+        self.throttled = 0   # 收到 429/503 的次数
+        self._tasks = {}
+
+    def failure(self, key, error, now=None):
+        """记录一次失败，返回 (延迟秒数, Retry-After 秒数)"""
+        now = time.time() if now is None else now
+        status, retry_after = describe_error(error)
+        if status in THROTTLE_STATUS:
+            self.throttled += 1
+
+        task = self._tasks.setdefault(key, TaskRetry())
+        task.failures += 1
+        task.last_error = str(error)
+        task.last_status = status
+
+        if task.state == HALF_OPEN or task.failures >= self.failure_threshold:
+            # 打开熔断器：试探失败时冷却期加倍
+            task.cooldown = min(task.cooldown * 2, self.max_cooldown) if task.state == HALF_OPEN else self.cooldown
+            task.state = OPEN
+            delay = task.cooldown
+            logger.warning(f"任务 服务器{key[0]}/商品{key[1]} 连续失败 {task.failures} 次，暂停 {delay:.0f} 秒")
+        else:
+            # 带抖动的指数退避，避免多个失败任务同时重试
+            cap = min(self.base_delay * 2 ** (task.failures - 1), self.max_delay)
+            delay = random.uniform(self.base_delay, max(cap, self.base_delay))
+
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        task.retry_at = now + delay
+        return delay, retry_after
+
+    def attempt(self, key):
+        """任务即将再次采集：冷却结束的熔断器进入试探状态"""
+        task = self._tasks.get(key)
+        if task is not None and task.state == OPEN:
+            task.state = HALF_OPEN
+
+    def success(self, key):
+        """采集成功，清除失败记录并关闭熔断器"""
+        task = self._tasks.pop(key, None)
+        if task is not None and task.state != CLOSED:
+            logger.info(f"任务 服务器{key[0]}/商品{key[1]} 已恢复，关闭熔断器")
+
+    def snapshot(self):
+        """状态接口展示用：正在重试和已熔断的任务"""
+        tasks = []
+        for (server_type, product_type), task in sorted(self._tasks.items()):
+            tasks.append({
+                'server_type': server_type,
+                'product_type': product_type,
+                'state': task.state,
+                'failures': task.failures,
+                'retry_at': datetime.fromtimestamp(task.retry_at).strftime('%Y-%m-%d %H:%M:%S') if task.retry_at else None,
+                'last_status': task.last_status,
+                'last_error': task.last_error
+            })
+        return {
+            'throttled': self.throttled,
+            'open': sum(1 for t in self._tasks.values() if t.state != CLOSED),
+            'retrying': sum(1 for t in self._tasks.values() if t.state == CLOSED),
+            'tasks': tasks
+        }
@@ -0,0 +1,305 @@
+"""
+价格汇总（K线）
+按 (服务器, 商品, 品质, 时间桶) 维护 1 分钟、1 小时、1 天三种粒度的汇总表 market_rollup_{1m,1h,1d}。
+采集器每写入一个快照，就把该快照各品质的统计合并进对应的时间桶（与市场数据在同一个事务中）：
+
+    open/high/low/close  各快照的挂单加权均价（价格按数量加权）的开、高、低、收
+    min_price            时间桶内出现过的最低挂单价
+    avg_price            时间桶内全部快照的挂单加权均价
+    quantity/order_count 最后一个快照的挂单总量和订单数
+    samples              合并的快照数（数据未变化的采集同样计为一个样本，沿用上一个快照的统计）
+
+时间桶按采集时间划分，存储为 UTC；日桶按 ROLLUP_CONFIG["day_offset_hours"] 对齐到本地零点。
+
+重建:
+    python -m collector.rollup --start "2024-01-01 00:00" --end "2024-01-08 00:00" [--server 0] [--product 1]
+    默认从原始快照归档重建：有变化的快照和未变化的采集（归档索引中长度为 0 的记录，沿用该商品上一个快照的统计）
+    按采集时间重放，与在线汇总一致；在线写入队列已满时丢弃的未变化样本除外（见 Pipeline.put_unchanged），
+    以及重建范围内某商品第一个快照之前的未变化采集（范围内没有可沿用的统计）。
+    --source tables 从市场表按订单发布时间近似重建
+"""
+import sys
+import os
+import time
+import argparse
+import logging
+from decimal import Decimal
+from datetime import datetime, timezone, timedelta
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collector.collector_config import ROLLUP_CONFIG
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+# 粒度 -> 桶长度(秒)
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+_COLUMNS = (
+    "server_type, product_type, quality, bucket, open_price, high_price, low_price, close_price, "
+    "min_price, avg_price, pq_sum, quantity_sum, quantity, order_count, samples, first_at, last_at"
+)
+
+# 赋值按顺序执行，依赖旧值的字段（开盘、收盘等）必须写在 first_at/last_at 之前
+_MERGE = """ON DUPLICATE KEY UPDATE
+    open_price = IF(VALUES(first_at) < first_at, VALUES(open_price), open_price),
+    close_price = IF(VALUES(last_at) >= last_at, VALUES(close_price), close_price),
+    quantity = IF(VALUES(last_at) >= last_at, VALUES(quantity), quantity),
+    order_count = IF(VALUES(last_at) >= last_at, VALUES(order_count), order_count),
+    high_price = GREATEST(high_price, VALUES(high_price)),
+    low_price = LEAST(low_price, VALUES(low_price)),
+    min_price = LEAST(min_price, VALUES(min_price)),
+    pq_sum = pq_sum + VALUES(pq_sum),
+    quantity_sum = quantity_sum + VALUES(quantity_sum),
+    avg_price = IF(quantity_sum > 0, pq_sum / quantity_sum, avg_price),
+    samples = samples + VALUES(samples),
+    first_at = LEAST(first_at, VALUES(first_at)),
+    last_at = GREATEST(last_at, VALUES(last_at))
+"""
+
+
+def rollup_table(resolution):
+    return f"market_rollup_{resolution}"
+
+
+def bucket_start(epoch, seconds):
+    """采集时间所在时间桶的起点(epoch秒)"""
+    offset = ROLLUP_CONFIG['day_offset_hours'] * 3600
+    return (int(epoch) + offset) // seconds * seconds - offset
+
+
+def _utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+def _price(thousandths):
+    return Decimal(int(thousandths)).scaleb(-3)
+
+
+class RollupAccumulator:
+    """在内存中合并汇总：key=(粒度, 服务器, 商品, 品质, 桶起点)，合并规则与 _MERGE 相同"""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def add(self, server_type, product_type, quality, at, price, pq_sum, quantity, orders, min_price=None):
+        """合并一个样本：price 为该样本的价格（千分之一），pq_sum 为价格×数量之和"""
+        min_price = price if min_price is None else min_price
+        for resolution, seconds in RESOLUTIONS.items():
+            key = (resolution, server_type, product_type, quality, bucket_start(at, seconds))
+            entry = self.buckets.get(key)
+            if entry is None:
+                self.buckets[key] = [price, price, price, price, min_price, pq_sum, quantity, quantity, orders, 1, at, at]
+                continue
+            if at < entry[10]:
+                entry[0] = price
+                entry[10] = at
+            if at >= entry[11]:
+                entry[3] = price
+                entry[7] = quantity
+                entry[8] = orders
+                entry[11] = at
+            entry[1] = max(entry[1], price)
+            entry[2] = min(entry[2], price)
+            entry[4] = min(entry[4], min_price)
+            entry[5] += pq_sum
+            entry[6] += quantity
+            entry[9] += 1
+
+    def add_snapshot(self, server_type, product_type, columns, at):
+        """合并一个快照的各品质统计"""
+        self.add_stats(server_type, product_type, columns.by_quality(), at)
+
+    def add_stats(self, server_type, product_type, stats, at):
+        """合并按品质的统计 {品质: [最低价, 价格×数量之和, 总数量, 订单数]}（SnapshotColumns.by_quality 的结果）；
+        数据未变化的采集用上一个快照的统计作为该时刻的样本，收盘价和挂单量延续到新的时间桶"""
+        for quality, (lowest, pq_sum, quantity, orders) in stats.items():
+            if quantity:
+                self.add(server_type, product_type, quality, at, round(pq_sum / quantity),
+                         pq_sum, quantity, orders, lowest)
+
+    def flush(self, db):
+        """合并进汇总表：每个粒度一条多行 upsert，然后清空"""
+        rows = {resolution: [] for resolution in RESOLUTIONS}
+        for (resolution, server_type, product_type, quality, start), entry in self.buckets.items():
+            open_price, high, low, close, lowest, pq_sum, quantity_sum, quantity, orders, samples, first, last = entry
+            rows[resolution].append((
+                server_type, product_type, quality, _utc(start),
+                _price(open_price), _price(high), _price(low), _price(close), _price(lowest),
+                _price(round(pq_sum / quantity_sum)) if quantity_sum else _price(close),
+                Decimal(pq_sum).scaleb(-3), quantity_sum, quantity, orders, samples,
+                _utc(first), _utc(last)
+            ))
+        self.buckets = {}
+        for resolution, values in rows.items():
+            if values:
+                db.execute_values(
+                    f"INSERT INTO {rollup_table(resolution)} ({_COLUMNS}) VALUES", values,
+                    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    _MERGE
+                )
+
+
+def create_rollup_tables(db):
+    """创建三种粒度的汇总表"""
+    for resolution in RESOLUTIONS:
+        db.execute(f"""
+            CREATE TABLE IF NOT EXISTS {rollup_table(resolution)} (
+                server_type TINYINT NOT NULL COMMENT '服务器类型',
+                product_type SMALLINT NOT NULL COMMENT '商品类型',
+                quality TINYINT NOT NULL COMMENT '品质',
+                bucket DATETIME NOT NULL COMMENT '时间桶起点(UTC)',
+                open_price DECIMAL(10,3) NOT NULL COMMENT '开盘(挂单加权均价)',
+                high_price DECIMAL(10,3) NOT NULL COMMENT '最高',
+                low_price DECIMAL(10,3) NOT NULL COMMENT '最低',
+                close_price DECIMAL(10,3) NOT NULL COMMENT '收盘',
+                min_price DECIMAL(10,3) NOT NULL COMMENT '最低挂单价',
+                avg_price DECIMAL(10,3) NOT NULL COMMENT '挂单加权均价',
+                pq_sum DECIMAL(30,3) NOT NULL COMMENT '价格×数量之和',
+                quantity_sum BIGINT NOT NULL COMMENT '数量之和',
+                quantity BIGINT NOT NULL COMMENT '最后一个快照的挂单总量',
+                order_count INT NOT NULL COMMENT '最后一个快照的订单数',
+                samples INT NOT NULL COMMENT '合并的快照数',
+                first_at DATETIME(3) NOT NULL COMMENT '第一个快照的采集时间',
+                last_at DATETIME(3) NOT NULL COMMENT '最后一个快照的采集时间',
+                PRIMARY KEY (server_type, product_type, quality, bucket)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='价格汇总({resolution})'
+        """)
+
+
+def _day_range(start, end):
+    """重建范围扩展到完整的日桶，保证三种粒度的桶都被完整重算"""
+    day = RESOLUTIONS['1d']
+    start = bucket_start(start, day)
+    end = bucket_start(end - 1, day) + day
+    return start, end
+
+
+def _delete_range(db, start, end, server_type, product_type):
+    conditions = ["bucket >= %s", "bucket < %s"]
+    params = [_utc(start), _utc(end)]
+    if server_type is not None:
+        conditions.append("server_type = %s")
+        params.append(server_type)
+    if product_type is not None:
+        conditions.append("product_type = %s")
+        params.append(product_type)
+    for resolution in RESOLUTIONS:
+        db.execute(f"DELETE FROM {rollup_table(resolution)} WHERE {' AND '.join(conditions)}", params)
+
+
+def rebuild_from_archive(db, start, end, server_type=None, product_type=None, path=None):
+    """按归档中的原始快照和未变化的采集重放汇总，返回处理的记录数"""
+    from collector.archive import ArchiveReader, iter_index
+    from collector.order_stream import parse_orders
+
+    start, end = _day_range(start, end)
+    records = iter_index(start, end, server_type, product_type, path)
+    reader = ArchiveReader()
+    accumulator = RollupAccumulator()
+    last_stats = {}  # (服务器, 商品) -> 上一个快照的按品质统计
+    try:
+        with db.transaction():
+            _delete_range(db, start, end, server_type, product_type)
+            for record in records:
+                key = (record.server_type, record.product_type)
+                if record.unchanged:
+                    stats = last_stats.get(key)
+                else:
+                    stats = last_stats[key] = parse_orders(reader.read(record)).by_quality()
+                if stats is not None:
+                    accumulator.add_stats(record.server_type, record.product_type, stats, record.fetched_at)
+                if len(accumulator) >= 10000:
+                    accumulator.flush(db)
+            accumulator.flush(db)
+    finally:
+        reader.close()
+    return len(records)
+
+
+def rebuild_from_tables(db, start, end, server_type=None, product_type=None):
+    """从市场表近似重建：每个订单作为其发布时间上的一个样本，返回处理的订单数"""
+    from collector.catalog import catalog
+    from collector.storage import MarketTable
+
+    start, end = _day_range(start, end)
+    tasks = db.fetch_all("SELECT server_type, product_type FROM collector_tasks ORDER BY id")
+    keys = [
+        (task['server_type'], task['product_type']) for task in tasks
+        if (server_type is None or task['server_type'] == server_type)
+        and (product_type is None or task['product_type'] == product_type)
+    ]
+
+    total = 0
+    with db.transaction():
+        _delete_range(db, start, end, server_type, product_type)
+        for key in keys:
+            table = MarketTable(*key)
+            if not catalog.exists(db, table.name):
+                continue
+            rows = db.fetch_all(f"""
+                SELECT quality, price, quantity, posted_time
+                FROM {table.name}
+                WHERE {table.where()} AND posted_time >= %s AND posted_time < %s
+                ORDER BY posted_time
+            """, (_utc(start), _utc(end)))
+            accumulator = RollupAccumulator()
+            for row in rows:
+                price = int(row['price'] * 1000)
+                at = row['posted_time'].replace(tzinfo=timezone.utc).timestamp()
+                accumulator.add(key[0], key[1], row['quality'], at, price,
+                                price * row['quantity'], row['quantity'], 1)
+            accumulator.flush(db)
+            total += len(rows)
+    return total
+
+
+def parse_time(value):
+    return datetime.strptime(value, '%Y-%m-%d %H:%M').timestamp() if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重建价格汇总表')
+    parser.add_argument('--start', required=True, help='开始时间（本地时间），格式 "YYYY-MM-DD HH:MM"')
+    parser.add_argument('--end', help='结束时间（不含），默认当前时间')
+    parser.add_argument('--server', type=int, help='只重建该服务器')
+    parser.add_argument('--product', type=int, help='只重建该商品')
+    parser.add_argument('--source', choices=('archive', 'tables'), default='archive',
+                        help='archive: 从原始快照归档重建；tables: 从市场表按发布时间近似重建')
+    parser.add_argument('--path', help='归档目录，默认使用 ARCHIVE_CONFIG["path"]')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from models.database import Database
+    from collector.init_db import init_database
+
+    start = parse_time(args.start)
+    end = parse_time(args.end) or time.time()
+    init_database()
+    db = Database()
+    try:
+        started = time.perf_counter()
+        if args.source == 'archive':
+            count = rebuild_from_archive(db, start, end, args.server, args.product, args.path)
+            unit = '个快照'
+        else:
+            count = rebuild_from_tables(db, start, end, args.server, args.product)
+            unit = '条订单'
+    finally:
+        db.close()
+    first, last = _day_range(start, end)
+    print(
+        f"已重建 {_utc(first) + timedelta(hours=ROLLUP_CONFIG['day_offset_hours']):%Y-%m-%d} 至 "
+        f"{_utc(last - 1) + timedelta(hours=ROLLUP_CONFIG['day_offset_hours']):%Y-%m-%d} 的汇总，"
+        f"处理 {count} {unit}，耗时 {time.perf_counter() - started:.1f} 秒"
+    )
+
+
+if __name__ == '__main__':
+    main()
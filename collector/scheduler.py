@@ -0,0 +1,190 @@
+"""
+自适应采集调度器
+根据相邻两次快照的变化率估计每个任务的变化速度，
+变化快的市场缩短采集周期，变化慢的市场延长采集周期，
+同时满足全局请求预算和单个任务的最大数据陈旧时间
+"""
+import heapq
+import time
+import logging
+from datetime import datetime
+
+from collector.collector_config import SCHEDULER_CONFIG
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+class TaskSchedule:
+    """单个采集任务的调度状态"""
+
+    __slots__ = ('key', 'task_id', 'interval', 'change_rate', 'last_poll', 'next_due', 'dirty')
+
+    def __init__(self, key, task_id=None, interval=None, change_rate=None,
+                 last_poll=None, next_due=None):
+        self.key = key
+        self.task_id = task_id
+        self.interval = interval
+        self.change_rate = change_rate  # 估计的每秒订单变化比例
+        self.last_poll = last_poll      # 上次采集时间(epoch秒)
+        self.next_due = next_due        # 下次到期时间(epoch秒)
+        self.dirty = False
+
+
+class AdaptiveScheduler:
+    """基于优先队列的自适应调度器，按到期时间从早到晚出队"""
+
+    def __init__(self, min_interval, config=None):
+        config = dict(SCHEDULER_CONFIG, **(config or {}))
+        self.min_interval = float(min_interval)
+        self.max_staleness = max(float(config['max_staleness']), self.min_interval)
+        self.target_change = config['target_change']
+        self.smoothing = config['smoothing']
+        self.request_budget = config['request_budget']
+        self._tasks = {}
+        self._heap = []
+        self._in_flight = set()
+
+    # ---- 任务集合 ----
+
+    def load(self, rows):
+        """从 collector_tasks 的查询结果恢复调度状态"""
+        for row in rows:
+            key = (row['server_type'], row['product_type'])
+            task = self._tasks.get(key)
+            if task is None:
+                task = TaskSchedule(
+                    key,
+                    task_id=row['id'],
+                    interval=row.get('poll_interval'),
+                    change_rate=row.get('change_rate'),
+                    last_poll=_to_epoch(row.get('last_poll_time')),
+                    next_due=_to_epoch(row.get('next_due_time'))
+                )
+                self._tasks[key] = task
+                if key not in self._in_flight:
+                    self._push(task, task.next_due or time.time())
+            else:
+                task.task_id = row['id']
+
+    def retain(self, keys):
+        """只保留仍在方案中的任务，返回被移除的任务数"""
+        removed = [key for key in self._tasks if key not in keys]
+        for key in removed:
+            del self._tasks[key]
+        return len(removed)
+
+    def task_id(self, key):
+        task = self._tasks.get(key)
+        return task.task_id if task else None
+
+    def __len__(self):
+        return len(self._tasks)
+
+    # ---- 出队与回填 ----
+
+    def pop_due(self, now=None):
+        """取出一个已到期的任务，没有到期任务时返回 None"""
+        now = time.time() if now is None else now
+        while self._heap:
+            due, key = self._heap[0]
+            task = self._tasks.get(key)
+            if task is None or task.next_due != due or key in self._in_flight:
+                heapq.heappop(self._heap)  # 过期条目
+                continue
+            if due > now:
+                return None
+            heapq.heappop(self._heap)
+            self._in_flight.add(key)
+            return key
+        return None
+
+    def seconds_until_next(self, now=None):
+        """距离下一个任务到期的秒数"""
+        now = time.time() if now is None else now
+        while self._heap:
+            due, key = self._heap[0]
+            task = self._tasks.get(key)
+            if task is None or task.next_due != due or key in self._in_flight:
+                heapq.heappop(self._heap)
+                continue
+            return max(0.0, due - now)
+        return self.min_interval
+
+    def record(self, key, change_ratio, now=None):
+        """记录一次成功采集的变化比例(0~1，None 表示无法比较)，并安排下一次采集"""
+        now = time.time() if now is None else now
+        self._in_flight.discard(key)
+        task = self._tasks.get(key)
+        if task is None:
+            return None
+
+        if change_ratio is not None and task.last_poll and now > task.last_poll:
+            sample = change_ratio / (now - task.last_poll)
+            if task.change_rate is None:
+                task.change_rate = sample
+            else:
+                task.change_rate += self.smoothing * (sample - task.change_rate)
+
+        task.interval = self._interval_for(task)
+        task.last_poll = now
+        self._push(task, now + self._budgeted(task.interval))
+        return task.next_due
+
+    def defer(self, key, delay, now=None):
+        """采集失败或被取消时，延后重新安排任务"""
+        now = time.time() if now is None else now
+        self._in_flight.discard(key)
+        task = self._tasks.get(key)
+        if task is not None:
+            self._push(task, now + max(delay, 0))
+
+    def _push(self, task, due):
+        task.next_due = due
+        task.dirty = True
+        heapq.heappush(self._heap, (due, task.key))
+
+    # ---- 周期计算 ----
+
+    def _interval_for(self, task):
+        """按变化率计算期望周期：预计有 target_change 比例的订单变化时再采集"""
+        if task.change_rate is None:
+            interval = task.interval or self.min_interval
+        elif task.change_rate == 0:
+            interval = task.interval * 2 if task.interval else self.min_interval
+        else:
+            interval = self.target_change / task.change_rate
+        return min(max(interval, self.min_interval), self.max_staleness)
+
+    def _budgeted(self, interval):
+        """所有任务的请求需求超过全局预算时，按比例放大周期（不超过最大陈旧时间）"""
+        demand = sum(1.0 / (t.interval or self.min_interval) for t in self._tasks.values())
+        if demand <= self.request_budget:
+            return interval
+        return min(interval * demand / self.request_budget, self.max_staleness)
+
+    # ---- 持久化 ----
+
+    def take_dirty(self):
+        """返回自上次持久化以来有变化的任务状态，用于写回 collector_tasks"""
+        rows = []
+        for task in self._tasks.values():
+            if not task.dirty or task.task_id is None:
+                continue
+            task.dirty = False
+            rows.append((
+                task.interval,
+                task.change_rate,
+                _to_datetime(task.last_poll),
+                _to_datetime(task.next_due),
+                task.task_id
+            ))
+        return rows
+
+
+def _to_epoch(value):
+    return value.timestamp() if value else None
+
+
+def _to_datetime(value):
+    return datetime.fromtimestamp(value) if value else None
@@ -0,0 +1,98 @@
+"""
+卖家维度表
+卖家名称、服务器、证书数、比赛获胜次数和是否 NPC 统一保存在 sellers 表中，市场表只保存 seller_id。
+写入器在进程内缓存每个卖家最后写入的信息，每批快照只把新出现或信息有变化的卖家合并为一次 upsert
+"""
+import logging
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+SELLERS_TABLE = 'sellers'
+
+SELLER_COLUMNS = (
+    "seller_id, seller_name, seller_realm_id, seller_certificates, seller_contest_wins, seller_is_npc"
+)
+
+_UPSERT_UPDATE = """ON DUPLICATE KEY UPDATE
+    seller_name = VALUES(seller_name),
+    seller_realm_id = VALUES(seller_realm_id),
+    seller_certificates = VALUES(seller_certificates),
+    seller_contest_wins = VALUES(seller_contest_wins),
+    seller_is_npc = VALUES(seller_is_npc)
+"""
+
+
+def create_sellers_table(db):
+    db.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SELLERS_TABLE} (
+            seller_id BIGINT NOT NULL PRIMARY KEY COMMENT '卖家ID',
+            seller_name VARCHAR(100) NOT NULL COMMENT '卖家名称',
+            seller_realm_id TINYINT NOT NULL COMMENT '卖家服务器ID',
+            seller_certificates INT NOT NULL DEFAULT 0 COMMENT '卖家证书数',
+            seller_contest_wins INT NOT NULL DEFAULT 0 COMMENT '卖家比赛获胜次数',
+            seller_is_npc TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否NPC',
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '首次出现时间',
+            updated_at DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='卖家信息'
+    """)
+
+
+def write_sellers(db, sellers):
+    """upsert 卖家信息 {seller_id: (名称, 服务器, 证书数, 比赛获胜次数, 是否NPC)}"""
+    if not sellers:
+        return
+    db.execute_values(
+        f"INSERT INTO {SELLERS_TABLE} ({SELLER_COLUMNS}) VALUES",
+        ((seller_id, *info) for seller_id, info in sellers.items()),
+        "(%s, %s, %s, %s, %s, %s)",
+        _UPSERT_UPDATE
+    )
+
+
+def insert_missing_sellers(db, sellers):
+    """只插入 sellers 表中尚不存在的卖家（迁移回填使用），已有的行由采集器写入，不覆盖"""
+    if not sellers:
+        return
+    db.execute_values(
+        f"INSERT IGNORE INTO {SELLERS_TABLE} ({SELLER_COLUMNS}) VALUES",
+        ((seller_id, *info) for seller_id, info in sellers.items()),
+        "(%s, %s, %s, %s, %s, %s)"
+    )
+
+
+class SellerCache:
+    """进程内的卖家缓存：seller_id -> 最后写入数据库的卖家信息"""
+
+    __slots__ = ('sellers',)
+
+    def __init__(self):
+        self.sellers = None
+
+    def warm(self, db):
+        """首次使用时从 sellers 表加载全部卖家（数量为数千级）"""
+        rows = db.fetch_all(f"SELECT {SELLER_COLUMNS} FROM {SELLERS_TABLE}")
+        self.sellers = {
+            row['seller_id']: (
+                row['seller_name'], row['seller_realm_id'], row['seller_certificates'],
+                row['seller_contest_wins'], row['seller_is_npc']
+            )
+            for row in rows
+        }
+        logger.info(f"加载卖家缓存 {len(self.sellers)} 条")
+
+    def collect(self, columns, pending):
+        """把快照中新出现或信息有变化的卖家加入 pending，同一卖家只保留最后一次出现的信息"""
+        known = self.sellers
+        for seller_id, *info in zip(
+            columns.seller_id, columns.seller_name, columns.seller_realm_id,
+            columns.seller_certificates, columns.seller_contest_wins, columns.seller_is_npc
+        ):
+            info = tuple(info)
+            if known.get(seller_id) != info:
+                pending[seller_id] = info
+        return pending
+
+    def apply(self, pending):
+        """事务提交后合并进缓存"""
+        self.sellers.update(pending)
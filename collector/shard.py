@@ -0,0 +1,174 @@
+"""
+分片采集
+多个采集进程（可以在不同主机上）通过 collector_workers 表互相发现，
+用最高随机权重（rendezvous）哈希把 collector_tasks 分成互不相交的分片；
+进程加入或退出时只有少量任务换主，认领通过 collector_tasks.owner_id 的条件更新完成，
+同一时间一个任务只会被一个进程认领
+"""
+import os
+import json
+import time
+import socket
+import hashlib
+import threading
+import logging
+
+from collector.collector_config import SHARD_CONFIG
+from models.database import Database
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+def shard_weight(worker_id, task_id):
+    """任务在某个进程上的权重，权重最高的进程负责该任务"""
+    digest = hashlib.blake2b(f"{worker_id}/{task_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def assign_tasks(worker_ids, task_ids):
+    """按 rendezvous 哈希分配任务，返回 {worker_id: set(task_id)}"""
+    assignment = {worker_id: set() for worker_id in worker_ids}
+    if not worker_ids:
+        return assignment
+    for task_id in task_ids:
+        owner = max(worker_ids, key=lambda w: shard_weight(w, task_id))
+        assignment[owner].add(task_id)
+    return assignment
+
+
+class ShardCoordinator:
+    """分片协调：心跳、重新分配并认领本进程负责的任务"""
+
+    def __init__(self, worker_id=None, config=None):
+        config = dict(SHARD_CONFIG, **(config or {}))
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.worker_timeout = config['worker_timeout']
+        self.claim_ttl = config['claim_ttl']
+        self.owned = frozenset()   # 本进程认领的 (server_type, product_type)
+        self.version = 0           # owned 每次变化加一，采集线程据此重新同步调度
+        self._db = None
+        self._last_report = None   # (monotonic, fetch_count)
+        self._lock = threading.Lock()
+
+    def heartbeat(self, stats=None):
+        """写入心跳和吞吐统计，重新分配并认领任务；数据库不可用时放弃所有任务并返回 False"""
+        try:
+            if self._db is None:
+                self._db = Database()
+            self._report(stats or {})
+            self._set_owned(self._rebalance())
+            return True
+        except Exception as e:
+            logger.error(f"采集进程 {self.worker_id} 分片心跳失败: {str(e)}")
+            self._set_owned(frozenset())  # 认领可能已过期，停止采集避免与其他进程重复
+            self._close()
+            return False
+
+    def release(self):
+        """退出时释放认领的任务并注销，其他进程下一次心跳即可接管"""
+        self._set_owned(frozenset())
+        try:
+            if self._db is None:
+                self._db = Database()
+            self._db.execute("""
+                UPDATE collector_tasks
+                SET owner_id = NULL,
+                    lease_until = NULL
+                WHERE owner_id = %s
+            """, (self.worker_id,))
+            self._db.execute("DELETE FROM collector_workers WHERE worker_id = %s", (self.worker_id,))
+            logger.info(f"采集进程 {self.worker_id} 已释放分片")
+        except Exception as e:
+            logger.error(f"释放分片失败: {str(e)}")
+        finally:
+            self._close()
+
+    def _report(self, stats):
+        """写入心跳，附带本进程的任务数和每分钟采集次数"""
+        now = time.monotonic()
+        fetch_count = stats.get('fetch_count', 0)
+        if self._last_report and now > self._last_report[0] and fetch_count >= self._last_report[1]:
+            fetch_rate = (fetch_count - self._last_report[1]) * 60 / (now - self._last_report[0])
+        else:
+            fetch_rate = 0.0
+        self._last_report = (now, fetch_count)
+
+        report = {
+            'fetch_count': fetch_count,
+            'skip_count': stats.get('skip_count', 0),
+            'fetch_per_minute': round(fetch_rate, 1)
+        }
+        pipeline = stats.get('pipeline')
+        if pipeline:
+            report['write_ms'] = pipeline['write']['avg_ms']
+            report['queue_depth'] = pipeline['queue_depth']
+
+        self._db.execute("""
+            INSERT INTO collector_workers (worker_id, started_at, heartbeat_at, task_count, stats)
+            VALUES (%s, NOW(), NOW(), %s, %s)
+            ON DUPLICATE KEY UPDATE
+                heartbeat_at = NOW(),
+                task_count = VALUES(task_count),
+                stats = VALUES(stats)
+        """, (self.worker_id, len(self.owned), json.dumps(report)))
+
+    def _rebalance(self):
+        """按当前存活的进程计算本进程的分片，释放不再负责的任务并认领新任务"""
+        db = self._db
+        workers = db.fetch_all("""
+            SELECT worker_id FROM collector_workers
+            WHERE heartbeat_at >= NOW() - INTERVAL %s SECOND
+        """, (self.worker_timeout,))
+        worker_ids = sorted({w['worker_id'] for w in workers} | {self.worker_id})
+        db.execute("""
+            DELETE FROM collector_workers
+            WHERE heartbeat_at < NOW() - INTERVAL %s SECOND
+        """, (self.worker_timeout,))
+        tasks = db.fetch_all("SELECT id FROM collector_tasks")
+        mine = assign_tasks(worker_ids, [t['id'] for t in tasks])[self.worker_id]
+
+        if mine:
+            placeholders = ','.join(['%s'] * len(mine))
+            db.execute(f"""
+                UPDATE collector_tasks
+                SET owner_id = NULL,
+                    lease_until = NULL
+                WHERE owner_id = %s AND id NOT IN ({placeholders})
+            """, [self.worker_id, *mine])
+            # 只认领空闲、已属于本进程或认领已过期的任务，原负责进程释放后下一次心跳再接管
+            db.execute(f"""
+                UPDATE collector_tasks
+                SET owner_id = %s,
+                    lease_until = NOW() + INTERVAL %s SECOND
+                WHERE id IN ({placeholders})
+                AND (owner_id IS NULL OR owner_id = %s OR lease_until < NOW())
+            """, [self.worker_id, self.claim_ttl, *mine, self.worker_id])
+        else:
+            db.execute("""
+                UPDATE collector_tasks
+                SET owner_id = NULL,
+                    lease_until = NULL
+                WHERE owner_id = %s
+            """, (self.worker_id,))
+
+        owned = db.fetch_all("""
+            SELECT server_type, product_type FROM collector_tasks
+            WHERE owner_id = %s
+        """, (self.worker_id,))
+        return frozenset((t['server_type'], t['product_type']) for t in owned)
+
+    def _set_owned(self, owned):
+        with self._lock:
+            if owned == self.owned:
+                return
+            logger.info(
+                f"采集进程 {self.worker_id} 分片变化: {len(self.owned)} -> {len(owned)} 个任务"
+            )
+            self.owned = owned
+            self.version += 1
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,94 @@
+"""
+市场快照增量比对
+为每张市场表在内存中保存订单的最新状态，
+新快照（SnapshotColumns）到达时直接在列上计算新增/变化/未变化/下架的订单
+"""
+import logging
+
+from collector.columns import datetime_key
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+
+class SnapshotDiff:
+    """一次快照相对内存索引的比对结果"""
+
+    __slots__ = ('columns', 'inserted', 'changed', 'unchanged', 'removed', 'reposted', 'batch_id')
+
+    def __init__(self, columns):
+        self.columns = columns   # 比对的快照
+        self.inserted = []       # 新订单 (行号, state)
+        self.changed = []        # 已变化的订单 (行号, state, 新版本号)
+        self.unchanged = 0       # 未变化的订单数
+        self.removed = []        # 已下架的 market_id
+        self.reposted = []       # 发布时间发生变化的 market_id（统一表中发布时间是主键的一部分）
+        self.batch_id = None     # 写入时登记的批次号
+
+    @property
+    def change_ratio(self):
+        """发生变化的订单占新旧快照订单总数的比例"""
+        touched = len(self.inserted) + len(self.changed) + len(self.removed)
+        total = touched + self.unchanged
+        return touched / total if total else 0.0
+
+
+class OrderIndex:
+    """单张市场表的订单状态索引：market_id -> (state, 版本号)"""
+
+    __slots__ = ('table_name', 'orders')
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.orders = {}
+
+    @classmethod
+    def warm(cls, db, table):
+        """从数据库加载当前有效订单的状态，table 为 MarketTable"""
+        index = cls(table.label)
+        rows = db.fetch_all(f"""
+            SELECT market_id, price, quantity, quality, fees, posted_time, data_version
+            FROM {table.name}
+            WHERE {table.where()} AND is_valid = 1
+        """)
+        for row in rows:
+            state = (
+                int(row['price'] * 1000),
+                row['quantity'],
+                row['quality'],
+                row['fees'],
+                datetime_key(row['posted_time'])
+            )
+            index.orders[row['market_id']] = (state, row['data_version'])
+        logger.info(f"表 {table.label} 加载订单索引 {len(index.orders)} 条")
+        return index
+
+    def diff(self, columns):
+        """计算快照与索引之间的差异，不修改索引"""
+        result = SnapshotDiff(columns)
+        orders = self.orders
+        for i, (market_id, state) in enumerate(zip(columns.market_id, columns.states())):
+            known = orders.get(market_id)
+            if known is None:
+                result.inserted.append((i, state))
+            elif known[0] != state:
+                result.changed.append((i, state, known[1] + 1))
+                if known[0][4] != state[4]:
+                    result.reposted.append(market_id)
+            else:
+                result.unchanged += 1
+
+        present = set(columns.market_id)
+        result.removed = [market_id for market_id in orders if market_id not in present]
+        return result
+
+    def apply(self, diff):
+        """数据写入成功后，将比对结果合并进索引"""
+        orders = self.orders
+        market_ids = diff.columns.market_id
+        for i, state in diff.inserted:
+            orders[market_ids[i]] = (state, 1)
+        for i, state, version in diff.changed:
+            orders[market_ids[i]] = (state, version)
+        for market_id in diff.removed:
+            del orders[market_id]
@@ -0,0 +1,154 @@
+"""
+采集器运行状态
+采集线程只修改内存中的状态，由后台线程按固定频率合并写回 collector_status；
+分片模式下多个采集进程同时运行，各自的状态写入 collector_workers 中本进程一行的 status 字段（JSON），
+由状态接口汇总，避免互相覆盖 collector_status。
+同一个后台线程检查 control_version，发现管理后台修改了控制参数时通知采集线程
+"""
+import json
+import threading
+import logging
+from datetime import datetime
+
+from collector.collector_config import STATUS_CONFIG
+from models.database import Database
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+# 写回 collector_status 的状态字段
+STATUS_FIELDS = (
+    'current_task_id',
+    'current_server_type',
+    'current_product_type',
+    'last_request_time',
+    'next_request_time',
+    'error_message',
+    'batch_id',
+    'runtime_stats'
+)
+
+
+def _format_time(value):
+    """状态中的时间字段按 collector_status 的格式序列化"""
+    return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else str(value)
+
+
+def read_control(db):
+    """读取管理后台可修改的控制参数"""
+    return db.fetch_one("""
+        SELECT is_running, current_plan, request_interval, control_version
+        FROM collector_status
+        WHERE id = 1
+    """)
+
+
+def notify_control_changed(db):
+    """管理后台修改控制参数后调用，通知采集器重新读取"""
+    db.execute("""
+        UPDATE collector_status
+        SET control_version = control_version + 1
+        WHERE id = 1
+    """)
+
+
+class CollectorState:
+    """采集器状态的内存副本，线程安全"""
+
+    def __init__(self):
+        self._values = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            self._values.update(fields)
+            self._dirty = True
+
+    def get(self, field, default=None):
+        with self._lock:
+            return self._values.get(field, default)
+
+    def take_dirty(self):
+        """取出自上次写回以来的状态快照，没有变化时返回 None"""
+        with self._lock:
+            if not self._dirty:
+                return None
+            self._dirty = False
+            return dict(self._values)
+
+
+class StatusCheckpointer(threading.Thread):
+    """后台线程：按固定频率写回状态，并监听控制参数变化"""
+
+    def __init__(self, state, control, on_control_change, config=None, worker_id=None):
+        super().__init__(name='collector-status', daemon=True)
+        config = dict(STATUS_CONFIG, **(config or {}))
+        self.state = state
+        self.worker_id = worker_id                  # 分片模式下本进程的标识，状态写入 collector_workers
+        self.control = control                      # 最近一次读取的控制参数
+        self.on_control_change = on_control_change  # 回调(control)，在本线程中执行
+        self.interval = config['checkpoint_interval']
+        self._stopped = threading.Event()
+
+    def run(self):
+        db = Database()
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    self.flush(db)
+                    self._poll_control(db)
+                except Exception as e:
+                    logger.error(f"写回采集器状态失败: {str(e)}")
+            self.flush(db)
+        except Exception as e:
+            logger.error(f"写回采集器状态失败: {str(e)}")
+        finally:
+            db.close()
+
+    def stop(self, timeout=None):
+        """停止线程，退出前写回最后一次状态"""
+        self._stopped.set()
+        self.join(timeout)
+
+    def flush(self, db):
+        values = self.state.take_dirty()
+        if values is None:
+            return
+        fields = [f for f in STATUS_FIELDS if f in values]
+        try:
+            if self.worker_id is not None:
+                self._flush_worker(db, {f: values[f] for f in fields})
+                return
+            params = [
+                json.dumps(values[f]) if f == 'runtime_stats' else values[f]
+                for f in fields
+            ]
+            db.execute(f"""
+                UPDATE collector_status
+                SET {', '.join(f'{f} = %s' for f in fields)}
+                WHERE id = 1
+            """, params)
+        except Exception:
+            self.state.update()  # 写回失败，保留脏标记等待下次重试
+            raise
+
+    def _flush_worker(self, db, values):
+        """分片模式：状态整体写入本进程在 collector_workers 中的一行（心跳尚未登记时一并登记）"""
+        status = json.dumps(values, default=_format_time)
+        db.execute("""
+            INSERT INTO collector_workers (worker_id, started_at, heartbeat_at, status)
+            VALUES (%s, NOW(), NOW(), %s)
+            ON DUPLICATE KEY UPDATE status = VALUES(status)
+        """, (self.worker_id, status))
+
+    def _poll_control(self, db):
+        """只读取 control_version，有变化时才读取完整的控制参数"""
+        row = db.fetch_one("""
+            SELECT control_version FROM collector_status
+            WHERE id = 1
+        """)
+        if row and row['control_version'] != self.control['control_version']:
+            self.control = read_control(db)
+            logger.info(f"检测到控制参数变化，版本 {self.control['control_version']}")
+            self.on_control_change(self.control)
@@ -0,0 +1,207 @@
+"""
+市场数据存储布局
+per_table: 每个 (服务器, 商品) 一张 market_{server_type}_{product_type} 表（原有布局）
+unified:   所有订单存放在一张 market_orders 表，主键 (server_type, product_type, market_id, posted_time)，
+           按发布时间 RANGE 分区（每月一个分区，pmax 兜底），查询按服务器和商品过滤
+
+由 STORAGE_CONFIG["layout"] 选择，采集器、后台和市场接口都通过 MarketTable 访问市场数据。
+MySQL 要求分区表的唯一键包含分区列，(server_type, product_type, market_id) 的唯一性由写入端保证：
+发布时间变化的订单先把旧行改到新的发布时间再 upsert（见 MarketWriter）
+"""
+import time
+import logging
+from datetime import date
+
+from collector.collector_config import STORAGE_CONFIG
+from collector.catalog import catalog
+
+# 配置日志
+logger = logging.getLogger('collector')
+
+UNIFIED_TABLE = 'market_orders'
+
+
+def unified_layout():
+    return STORAGE_CONFIG['layout'] == 'unified'
+
+
+class MarketTable:
+    """一个 (服务器, 商品) 的市场数据在当前存储布局下的位置"""
+
+    __slots__ = ('server_type', 'product_type', 'unified', 'name', 'label')
+
+    def __init__(self, server_type, product_type, layout=None):
+        self.server_type = int(server_type)
+        self.product_type = int(product_type)
+        self.unified = (layout or STORAGE_CONFIG['layout']) == 'unified'
+        self.label = f"market_{self.server_type}_{self.product_type}"   # 日志和索引使用的逻辑表名
+        self.name = UNIFIED_TABLE if self.unified else self.label       # SQL 中使用的物理表名
+
+    def where(self, alias=None):
+        """限定到该商品的查询条件，单表布局下恒为真"""
+        if not self.unified:
+            return "1 = 1"
+        prefix = f"{alias}." if alias else ""
+        return f"{prefix}server_type = {self.server_type} AND {prefix}product_type = {self.product_type}"
+
+    @property
+    def key_columns(self):
+        """INSERT 时附加在列清单前的分区键列"""
+        return "server_type, product_type, " if self.unified else ""
+
+    @property
+    def key_values(self):
+        """与 key_columns 对应的值"""
+        return f"{self.server_type}, {self.product_type}, " if self.unified else ""
+
+
+def _month_start(day, offset=0):
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _partition_clause(day, months_ahead):
+    """从当月开始的月分区定义，另加一个 pmax 兜底分区"""
+    partitions = []
+    for offset in range(months_ahead + 1):
+        start = _month_start(day, offset)
+        partitions.append(
+            f"PARTITION p{start:%Y%m} VALUES LESS THAN ('{_month_start(start, 1):%Y-%m-%d}')"
+        )
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return ",\n                ".join(partitions)
+
+
+def create_unified_table(db):
+    """创建 market_orders 表；已存在时只补充分区"""
+    if catalog.exists(db, UNIFIED_TABLE):
+        ensure_partitions(db)
+        return True
+
+    # 历史订单的发布时间可能早于当月，全部落在第一个分区之前的 pold 分区
+    first = _month_start(date.today())
+    db.execute(f"""
+        CREATE TABLE IF NOT EXISTS {UNIFIED_TABLE} (
+            server_type TINYINT NOT NULL COMMENT '服务器类型',
+            product_type SMALLINT NOT NULL COMMENT '商品类型',
+            market_id BIGINT NOT NULL COMMENT '市场订单ID',
+            kind TINYINT NOT NULL COMMENT '商品类型标识',
+            quantity INT NOT NULL COMMENT '数量',
+            quality TINYINT NOT NULL COMMENT '品质',
+            price DECIMAL(10,3) NOT NULL COMMENT '价格',
+            seller_id BIGINT NOT NULL COMMENT '卖家ID(卖家信息见 sellers 表)',
+            fees INT DEFAULT 0 COMMENT '交易费用',
+            posted_time DATETIME NOT NULL COMMENT '发布时间',
+            batch_id BIGINT NOT NULL COMMENT '采集批次号',
+            data_version INT NOT NULL DEFAULT 1 COMMENT '数据版本号',
+            is_valid TINYINT(1) NOT NULL DEFAULT 1 COMMENT '数据是否有效',
+            data_source VARCHAR(50) NOT NULL DEFAULT 'api' COMMENT '数据来源',
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+            updated_at DATETIME NULL DEFAULT NULL ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+            PRIMARY KEY (server_type, product_type, market_id, posted_time),
+            KEY idx_quality_time (server_type, product_type, quality, posted_time),
+            KEY idx_valid (server_type, product_type, is_valid),
+            KEY idx_seller_id (seller_id),
+            KEY idx_batch_id (batch_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        COMMENT='市场数据表（全部服务器和商品）'
+        PARTITION BY RANGE COLUMNS(posted_time) (
+            PARTITION pold VALUES LESS THAN ('{first:%Y-%m-%d}'),
+            {_partition_clause(first, STORAGE_CONFIG['partition_months_ahead'])}
+        )
+    """)
+    catalog.invalidate()
+    logger.info(f"成功创建表 {UNIFIED_TABLE}")
+    return True
+
+
+def ensure_partitions(db, today=None):
+    """保证未来 partition_months_ahead 个月都有独立分区：从 pmax 中拆出缺少的月分区"""
+    rows = db.fetch_all("""
+        SELECT partition_name AS name
+        FROM information_schema.partitions
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+        AND partition_name IS NOT NULL
+    """, (UNIFIED_TABLE,))
+    existing = {row['name'] for row in rows}
+    if 'pmax' not in existing:
+        return
+
+    current = _month_start(today or date.today())
+    missing = []
+    for offset in range(STORAGE_CONFIG['partition_months_ahead'] + 1):
+        start = _month_start(current, offset)
+        if f"p{start:%Y%m}" not in existing:
+            missing.append(start)
+    # 只能从 pmax 的下界开始往后拆分，早于已有最新分区的月份不再补建
+    latest = max((name for name in existing if name[1:].isdigit()), default=None)
+    if latest:
+        missing = [start for start in missing if f"p{start:%Y%m}" > latest]
+    if not missing:
+        return
+
+    definitions = [
+        f"PARTITION p{start:%Y%m} VALUES LESS THAN ('{_month_start(start, 1):%Y-%m-%d}')"
+        for start in missing
+    ]
+    definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    db.execute(f"""
+        ALTER TABLE {UNIFIED_TABLE} REORGANIZE PARTITION pmax INTO (
+            {', '.join(definitions)}
+        )
+    """)
+    logger.info(f"表 {UNIFIED_TABLE} 新增分区 {', '.join(f'p{start:%Y%m}' for start in missing)}")
+
+
+_unified_counts = (0.0, {})  # (查询时间, {(server_type, product_type): 行数})
+
+
+def order_counts(db, keys):
+    """各商品的订单行数（估计值，供后台展示）{(server_type, product_type): count}，表不存在的商品为 0。
+    单表布局一次读取 information_schema.tables 的 TABLE_ROWS（InnoDB 的统计估计值），不扫描市场表；
+    统一表布局按 (server_type, product_type) 索引分组计数，结果在进程内缓存 STORAGE_CONFIG["count_ttl"] 秒"""
+    global _unified_counts
+    counts = {key: 0 for key in keys}
+    if not counts:
+        return counts
+    if unified_layout():
+        loaded_at, cached = _unified_counts
+        if time.monotonic() - loaded_at > STORAGE_CONFIG['count_ttl']:
+            rows = db.fetch_all(f"""
+                SELECT server_type, product_type, COUNT(*) AS count
+                FROM {UNIFIED_TABLE}
+                GROUP BY server_type, product_type
+            """)
+            cached = {(row['server_type'], row['product_type']): row['count'] for row in rows}
+            _unified_counts = (time.monotonic(), cached)
+        for key in counts:
+            counts[key] = cached.get(key, 0)
+        return counts
+
+    names = {f"market_{s}_{p}": (s, p) for s, p in counts}
+    rows = db.fetch_all("""
+        SELECT table_name AS name, table_rows AS count
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE()
+        AND table_name LIKE 'market\\_%%'
+    """)
+    for row in rows:
+        key = names.get(row['name'])
+        if key is not None:
+            counts[key] = int(row['count'] or 0)
+    return counts
+
+
+def drop_market_data(db, server_type, product_type):
+    """删除一个商品的全部市场数据和订单变化日志（单表布局删除整张表）"""
+    from collector.order_events import EVENTS_TABLE
+
+    db.execute(f"DELETE FROM {EVENTS_TABLE} WHERE server_type = %s AND product_type = %s",
+               (server_type, product_type))
+    table = MarketTable(server_type, product_type)
+    if table.unified:
+        db.execute(f"DELETE FROM {table.name} WHERE {table.where()}")
+    else:
+        db.execute(f"DROP TABLE IF EXISTS {table.name}")
+        catalog.invalidate()
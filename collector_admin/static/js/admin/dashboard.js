@@ -229,6 +229,55 @@ async function refreshStatus() {
         if (lastTimeElement) lastTimeElement.textContent = data.last_request_time;
         if (nextTimeElement) nextTimeElement.textContent = data.next_request_time;
 
+        // 更新运行统计
+        const stats = data.runtime_stats || {};
+        const fetchCountElement = document.getElementById('fetchCount');
+        const skipCountElement = document.getElementById('skipCount');
+        if (fetchCountElement) fetchCountElement.textContent = stats.fetch_count ?? '-';
+        if (skipCountElement) skipCountElement.textContent = stats.skip_count ?? '-';
+
+        // 更新重试和熔断状态，鼠标悬停显示熔断的任务
+        const retry = stats.retry;
+        const errorCountElement = document.getElementById('errorCount');
+        if (errorCountElement) errorCountElement.textContent = stats.error_count ?? '-';
+        if (retry) {
+            const openElement = document.getElementById('breakerOpenCount');
+            document.getElementById('retryingCount').textContent = retry.retrying;
+            document.getElementById('throttledCount').textContent = retry.throttled;
+            openElement.textContent = retry.open;
+            openElement.className = retry.open ? 'text-danger' : '';
+            openElement.title = retry.tasks
+                .filter(t => t.state !== 'closed')
+                .map(t => `服务器${t.server_type}/商品${t.product_type}: 失败${t.failures}次，${t.retry_at} 重试`)
+                .join('\n');
+        }
+
+        // 更新流水线各阶段状态
+        const pipeline = stats.pipeline;
+        if (pipeline) {
+            const formatStage = stage => stage && stage.count ? `${stage.avg_ms} ms` : '-';
+            document.getElementById('queueDepth').textContent = `${pipeline.queue_depth}/${pipeline.queue_capacity}`;
+            document.getElementById('fetchLatency').textContent = formatStage(pipeline.fetch);
+            document.getElementById('queueLatency').textContent = formatStage(pipeline.queue_wait);
+            document.getElementById('writeLatency').textContent = formatStage(pipeline.write);
+        }
+
+        // 更新采集进程状态
+        const leaseElement = document.getElementById('leaseOwner');
+        if (leaseElement) {
+            const workers = data.workers || [];
+            const alive = data.lease_alive || workers.length > 0;
+            if (workers.length) {
+                // 分片模式：显示每个进程认领的任务数和每分钟采集次数
+                leaseElement.textContent = workers.map(w =>
+                    `${w.worker_id}（${w.task_count} 个任务，${w.stats.fetch_per_minute ?? 0} 次/分钟）`
+                ).join('；');
+            } else {
+                leaseElement.textContent = data.lease_alive ? data.lease_owner : '未运行';
+            }
+            leaseElement.className = alive ? 'text-success' : 'text-danger';
+        }
+
         // 更新按钮状态
         state.isRunning = data.is_running;
         updateButtonsState();
@@ -621,6 +670,13 @@ function updateTableRows(tasks, table_stats) {
                 lastTimeCell.textContent = stats.last_update_time || '-';
             }
             
+            // 更新下次采集时间
+            const nextDueCell = existingRow.querySelector('.next-due');
+            if (nextDueCell) {
+                nextDueCell.textContent = task.next_due_time || '-';
+                nextDueCell.title = `采集周期: ${task.poll_interval ? Math.round(task.poll_interval) : '-'} 秒`;
+            }
+            
             // 更新最新批次数据量
             const countCell = existingRow.querySelector('.collection-count');
             if (countCell) {
@@ -1,8 +1,17 @@
-from flask import Blueprint, render_template, jsonify, current_app, request
+from flask import Blueprint, render_template, jsonify, current_app, request, Response, stream_with_context
 from flask_cors import CORS
 from models.database import Database
+from collector.storage import MarketTable
+from collector.catalog import catalog
+from collector.rollup import RESOLUTIONS, rollup_table
+from collector.collector_config import ROLLUP_CONFIG
+import json
 import traceback
-from datetime import datetime, timedelta
+from itertools import chain
+from datetime import datetime, timedelta, timezone
+
+# 历史数据接口每次从数据库读取、向客户端输出的行数
+HISTORY_CHUNK_SIZE = 1000
 
 # 创建市场蓝图
 market_bp = Blueprint('market', __name__, url_prefix='/market')
@@ -25,7 +34,10 @@ def get_quality_data(server_type, product_type):
     """获取商品品质数据"""
     try:
         db = Database()
-        table_name = f"market_{server_type}_{product_type}"
+        table = MarketTable(server_type, product_type)
+        # 没有采集过的商品没有市场表，直接返回空数据
+        if not catalog.exists(db, table.name):
+            return jsonify({'code': 0, 'msg': 'success', 'data': []})
         
         # 获取最近24小时的数据
         current_time = datetime.now()
@@ -40,15 +52,15 @@ def get_quality_data(server_type, product_type):
                 MAX(CASE 
                     WHEN posted_time = (
                         SELECT MAX(posted_time) 
-                        FROM {table_name} t2 
-                        WHERE t2.quality = t1.quality
+                        FROM {table.name} t2 
+                        WHERE {table.where('t2')} AND t2.quality = t1.quality
                     ) 
                     THEN price 
                     ELSE NULL 
                 END) as latest_price,
                 MAX(posted_time) as update_time
-            FROM {table_name} t1
-            WHERE posted_time >= %s
+            FROM {table.name} t1
+            WHERE {table.where('t1')} AND posted_time >= %s
             GROUP BY quality
             ORDER BY quality
         """
@@ -74,6 +86,9 @@ def get_quality_data(server_type, product_type):
         })
         
     except Exception as e:
+        # 表已被其他进程删除（表目录缓存尚未过期）：刷新缓存，按没有数据返回
+        if catalog.missing_table(e):
+            return jsonify({'code': 0, 'msg': 'success', 'data': []})
         return jsonify({
             'code': 500,
             'msg': f'Error: {str(e)}',
@@ -85,7 +100,8 @@ def get_quality_data(server_type, product_type):
 
 @market_bp.route('/api/v1/market/history/<int:server_type>/<int:product_id>/<int:quality>')
 def get_history_data(server_type, product_id, quality):
-    """获取指定品质等级的历史价格和成交量数据"""
+    """获取指定品质等级的历史价格和成交量数据
+    结果用非缓冲游标逐行读取，JSON 边读边输出，内存占用与时间范围无关"""
     try:
         current_app.logger.info(f"接收历史数据请求 - server_type: {server_type}, product_id: {product_id}, quality: {quality}")
         
@@ -99,47 +115,33 @@ def get_history_data(server_type, product_id, quality):
         else:  # 1m
             time_range = "INTERVAL 30 DAY"
             
+        table = MarketTable(server_type, product_id)
+        # 构建查询SQL，使用 CONVERT_TZ 函数进行时区转换（时间条件在常量一侧换算，posted_time 可以使用索引和分区裁剪）
+        sql = """
+        SELECT 
+            UNIX_TIMESTAMP(CONVERT_TZ(posted_time, '+00:00', '+08:00')) * 1000 as time,
+            price,
+            quantity
+        FROM {0}
+        WHERE {1} AND quality = %s
+        AND posted_time >= CONVERT_TZ(DATE_SUB(NOW(), {2}), '+08:00', '+00:00')
+        ORDER BY posted_time
+        """.format(table.name, table.where(), time_range)
+
+        current_app.logger.info(f"执行SQL查询: {sql}")
         db = Database()
-        with db.conn.cursor() as cursor:
-            # 构建查询SQL，使用 CONVERT_TZ 函数进行时区转换
-            sql = """
-            SELECT 
-                UNIX_TIMESTAMP(CONVERT_TZ(posted_time, '+00:00', '+08:00')) * 1000 as time,
-                price,
-                quantity
-            FROM market_{0}_{1}
-            WHERE quality = %s
-            AND CONVERT_TZ(posted_time, '+00:00', '+08:00') >= DATE_SUB(NOW(), {2})
-            ORDER BY posted_time
-            """.format(server_type, product_id, time_range)
-
-            current_app.logger.info(f"执行SQL查询: {sql}")
-            cursor.execute(sql, (quality,))
-            results = cursor.fetchall()
-
-            # 添加日志输出
-            current_app.logger.info(f"查询结果数量: {len(results)}")
-            if len(results) > 0:
-                current_app.logger.info(f"第一条记录: {results[0]}")
-
-            # 处理查询结果
-            history_data = []
-            for row in results:
-                history_data.append({
-                    'time': row['time'],
-                    'price': float(row['price']),
-                    'volume': int(row['quantity'])
-                })
-
-            response = jsonify({
-                'code': 0,
-                'message': 'success',
-                'data': history_data
-            })
-            response.headers['Content-Type'] = 'application/json'
-            return response
+        if not catalog.exists(db, table.name):
+            db.close()
+            return jsonify({'code': 0, 'message': 'success', 'data': []})
+        rows = db.fetch_iter(sql, (quality,), chunk_size=HISTORY_CHUNK_SIZE)
+        # 先取第一行：查询出错时还能返回 500，开始输出后状态码就不能再改变
+        first = next(rows, None)
 
     except Exception as e:
+        if 'db' in locals():
+            db.close()
+        if catalog.missing_table(e):
+            return jsonify({'code': 0, 'message': 'success', 'data': []})
         current_app.logger.error(f"处理历史数据请求出错: {str(e)}")
         current_app.logger.error(traceback.format_exc())
         response = jsonify({
@@ -148,4 +150,100 @@ def get_history_data(server_type, product_id, quality):
             'data': None
         })
         response.headers['Content-Type'] = 'application/json'
-        return response, 500 
\ No newline at end of file
+        return response, 500
+
+    def generate():
+        count = 0
+        try:
+            yield '{"code": 0, "message": "success", "data": ['
+            if first is not None:
+                parts = []
+                for row in chain((first,), rows):
+                    parts.append(json.dumps({
+                        'time': int(row['time']),
+                        'price': float(row['price']),
+                        'volume': int(row['quantity'])
+                    }))
+                    if len(parts) >= HISTORY_CHUNK_SIZE:
+                        yield ('' if count == 0 else ',') + ','.join(parts)
+                        count += len(parts)
+                        parts = []
+                if parts:
+                    yield ('' if count == 0 else ',') + ','.join(parts)
+                    count += len(parts)
+            yield ']}'
+            current_app.logger.info(f"查询结果数量: {count}")
+        except Exception as e:
+            # 响应已经开始输出，只能记录错误，客户端会收到不完整的 JSON
+            current_app.logger.error(f"输出历史数据出错: {str(e)}")
+            raise
+        finally:
+            release()
+
+    def release():
+        # 提前退出时读完剩余的行再归还连接；两处调用都可能发生，重复调用没有影响
+        rows.close()
+        db.close()
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.call_on_close(release)  # 响应未被迭代（HEAD 请求、客户端提前断开）时同样归还连接
+    return response
+
+@market_bp.route('/api/v1/market/candles/<int:server_type>/<int:product_id>/<int:quality>')
+def get_candles(server_type, product_id, quality):
+    """获取K线数据（只读取价格汇总表）
+    参数: interval=1m/1h/1d，start/end 为毫秒时间戳（可选），limit 最多返回的数量"""
+    interval = request.args.get('interval', '1h')
+    if interval not in RESOLUTIONS:
+        return jsonify({'code': 400, 'message': f'不支持的K线周期: {interval}', 'data': None}), 400
+    limit = min(request.args.get('limit', ROLLUP_CONFIG['max_candles'], type=int), ROLLUP_CONFIG['max_candles'])
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+
+    conditions = ["server_type = %s", "product_type = %s", "quality = %s"]
+    params = [server_type, product_id, quality]
+    if start is not None:
+        conditions.append("bucket >= %s")
+        params.append(datetime.fromtimestamp(start / 1000, timezone.utc).replace(tzinfo=None))
+    if end is not None:
+        conditions.append("bucket < %s")
+        params.append(datetime.fromtimestamp(end / 1000, timezone.utc).replace(tzinfo=None))
+    params.append(limit)
+
+    db = Database()
+    try:
+        # 取最近的 limit 根，再按时间正序返回
+        rows = db.fetch_all(f"""
+            SELECT bucket, open_price, high_price, low_price, close_price,
+                   min_price, avg_price, quantity, order_count, samples
+            FROM {rollup_table(interval)}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bucket DESC
+            LIMIT %s
+        """, params)
+
+        candles = []
+        for row in reversed(rows):
+            candles.append({
+                'time': int(row['bucket'].replace(tzinfo=timezone.utc).timestamp() * 1000),
+                'open': float(row['open_price']),
+                'high': float(row['high_price']),
+                'low': float(row['low_price']),
+                'close': float(row['close_price']),
+                'minPrice': float(row['min_price']),
+                'avgPrice': float(row['avg_price']),
+                'volume': int(row['quantity']),
+                'orders': row['order_count'],
+                'samples': row['samples']
+            })
+
+        return jsonify({
+            'code': 0,
+            'message': 'success',
+            'data': candles
+        })
+    except Exception as e:
+        current_app.logger.error(f"处理K线数据请求出错: {str(e)}")
+        return jsonify({'code': 500, 'message': str(e), 'data': None}), 500
+    finally:
+        db.close()
@@ -1,8 +1,14 @@
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.cursors import DictCursor, SSDictCursor
+from pymysql.constants.SERVER_STATUS import SERVER_STATUS_IN_TRANS
 import os
+import time
+import threading
 from dotenv import load_dotenv
 import logging
+from contextlib import contextmanager
+
+from models import query_stats
 
 # 加载环境变量
 load_dotenv(encoding='utf-8')
@@ -10,73 +16,411 @@ load_dotenv(encoding='utf-8')
 # 配置日志
 logger = logging.getLogger('collector')
 
+# 连接池配置（每个进程独立计算）
+POOL_CONFIG = {
+    "size": int(os.getenv('DB_POOL_SIZE', 10)),                  # 每个进程最多同时打开的池化连接数
+    "timeout": float(os.getenv('DB_POOL_TIMEOUT', 10)),          # 连接全部借出时的最长等待时间（秒）
+    "ping_interval": float(os.getenv('DB_POOL_PING_INTERVAL', 30))  # 空闲超过该时间的连接借出前先 ping（秒）
+}
+
+
+def _connect(local_infile=False):
+    """建立一个新的数据库连接"""
+    try:
+        return pymysql.connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            port=int(os.getenv('DB_PORT', 3306)),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME'),
+            charset='utf8mb4',
+            cursorclass=DictCursor,
+            use_unicode=True,
+            local_infile=local_infile
+        )
+    except Exception as e:
+        logger.error(f"数据库连接失败: {str(e)}")
+        raise
+
+
+class ConnectionPool:
+    """线程安全的连接池：借出时复用空闲连接（空闲较久的先 ping，断开的重新连接），
+    连接数达到上限时等待归还，并统计等待时间和使用率"""
+
+    def __init__(self, local_infile=False, size=None, timeout=None, ping_interval=None):
+        self.local_infile = local_infile
+        self.pid = os.getpid()
+        self.size = size or POOL_CONFIG['size']
+        self.timeout = POOL_CONFIG['timeout'] if timeout is None else timeout
+        self.ping_interval = POOL_CONFIG['ping_interval'] if ping_interval is None else ping_interval
+        self._idle = []          # [(连接, 归还时间)]，后进先出，尽量复用刚用过的连接
+        self._opened = 0         # 已打开的连接数（空闲 + 借出）
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0, 'max_wait': 0.0,
+            'timeouts': 0, 'connects': 0, 'reconnects': 0
+        }
+
+    def checkout(self):
+        """借出一个连接，等待超时时抛出 TimeoutError"""
+        started = time.monotonic()
+        with self._cond:
+            waited = False
+            while not self._idle and self._opened >= self.size:
+                waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise TimeoutError(f"等待数据库连接超时（{self.size} 个连接均已借出）")
+                self._cond.wait(remaining)
+            self._stats['checkouts'] += 1
+            if waited:
+                elapsed = time.monotonic() - started
+                self._stats['waits'] += 1
+                self._stats['wait_seconds'] += elapsed
+                self._stats['max_wait'] = max(self._stats['max_wait'], elapsed)
+            if self._idle:
+                conn, returned_at = self._idle.pop()
+            else:
+                conn, returned_at = None, None
+                self._opened += 1
+
+        # 建立连接和 ping 都在锁外进行
+        try:
+            if conn is None:
+                conn = _connect(self.local_infile)
+                self._count('connects')
+            elif time.monotonic() - returned_at > self.ping_interval:
+                conn = self._revive(conn)
+            return conn
+        except Exception:
+            self._discard()
+            raise
+
+    def checkin(self, conn):
+        """归还连接：结束未提交的事务，保证下一个使用者看到最新数据；已断开的连接直接丢弃"""
+        try:
+            if conn.open and conn.server_status & SERVER_STATUS_IN_TRANS:
+                conn.rollback()
+            usable = conn.open
+        except Exception:
+            usable = False
+        if not usable:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._discard()
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        """连接池计数：借出次数、等待次数和时间、当前使用率"""
+        with self._cond:
+            in_use = self._opened - len(self._idle)
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'opened': self._opened,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'utilization': round(in_use / self.size, 3),
+                'wait_seconds': round(stats['wait_seconds'], 3),
+                'max_wait': round(stats['max_wait'], 3)
+            })
+            return stats
+
+    def _revive(self, conn):
+        """空闲较久的连接先 ping，服务端已断开（wait_timeout、重启）时重新连接"""
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._count('reconnects')
+            logger.warning("数据库连接已失效，重新连接")
+            return _connect(self.local_infile)
+
+    def _discard(self):
+        with self._cond:
+            self._opened -= 1
+            self._cond.notify()
+
+    def _count(self, name):
+        with self._cond:
+            self._stats[name] += 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(local_infile=False):
+    """按是否开启 local_infile 区分的进程级连接池；
+    Gunicorn preload 后 fork 出的工作进程不能沿用父进程的连接（套接字共享），重新创建连接池"""
+    pool = _pools.get(local_infile)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(local_infile)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[local_infile] = ConnectionPool(local_infile)
+    return pool
+
+
+def pool_stats():
+    """各连接池的计数 {'default'|'local_infile': stats}"""
+    return {
+        'local_infile' if local_infile else 'default': pool.stats()
+        for local_infile, pool in list(_pools.items())
+    }
+
+
+_local = threading.local()
+
+
+def thread_database():
+    """当前线程专用的池化连接：同一线程内多次调用返回同一个 Database，线程结束后连接归还连接池；
+    供长期存在、可能被多个线程调用的对象使用（如 DataCollector），避免多个线程共用一个连接"""
+    db = getattr(_local, 'db', None)
+    if db is None or db.conn is None or db._pool.pid != os.getpid():
+        db = Database()
+        _local.db = db
+    return db
+
+
 class Database:
-    def __init__(self):
+    def __init__(self, local_infile=False, pooled=True):
         self.conn = None
+        self.local_infile = local_infile  # 是否允许 LOAD DATA LOCAL INFILE（需要服务端同时开启 local_infile）
+        # 池化连接在 close() 时归还连接池；持有 GET_LOCK 等连接级状态的使用者需要 pooled=False 的独立连接
+        self._pool = get_pool(local_infile) if pooled else None
+        self._packet_limit = None
+        self._in_transaction = False
+        self.lastrowid = None   # 最近一次 execute 插入的自增主键
+        self._slow = []         # 等待 EXPLAIN 的慢查询，提交后再执行
         self.connect()
 
     def connect(self):
-        """建立数据库连接"""
-        try:
-            self.conn = pymysql.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                port=int(os.getenv('DB_PORT', 3306)),
-                user=os.getenv('DB_USER'),
-                password=os.getenv('DB_PASSWORD'),
-                database=os.getenv('DB_NAME'),
-                charset='utf8mb4',
-                cursorclass=DictCursor,
-                use_unicode=True
-            )
-        except Exception as e:
-            logger.error(f"数据库连接失败: {str(e)}")
-            raise
+        """建立数据库连接（池化时从连接池借出）"""
+        if self._pool is not None:
+            self.conn = self._pool.checkout()
+        else:
+            self.conn = _connect(self.local_infile)
 
     def execute(self, sql, params=None):
-        """执行SQL语句"""
+        """执行SQL语句，返回影响的行数；自增主键见 self.lastrowid。
+        行数取自本次执行的结果，不受之后在同一连接上执行的语句（如慢查询的 EXPLAIN）影响"""
+        started = time.perf_counter() if query_stats.enabled() else None
         try:
             with self.conn.cursor() as cursor:
                 cursor.execute(sql, params or ())
-                self.conn.commit()
-                return cursor.lastrowid
+                self.lastrowid = cursor.lastrowid
+                if started is not None:
+                    self._observe(sql, params or (), started, cursor.rowcount)
+                self._commit()
+                rowcount = cursor.rowcount
+            self._flush_slow()
+            return rowcount
         except Exception as e:
-            self.conn.rollback()
+            self._observe_error(sql, started)
+            self._rollback()
             logger.error(f"SQL执行失败: {str(e)}")
             raise
 
     def executemany(self, sql, params_list):
-        """批量执行SQL语句"""
+        """批量执行SQL语句，返回影响的行数"""
+        started = time.perf_counter() if query_stats.enabled() else None
         try:
             with self.conn.cursor() as cursor:
                 cursor.executemany(sql, params_list)
-                self.conn.commit()
-                return cursor.lastrowid
+                self.lastrowid = cursor.lastrowid
+                if started is not None:
+                    self._observe(sql, None, started, cursor.rowcount)
+                self._commit()
+                rowcount = cursor.rowcount
+            self._flush_slow()
+            return rowcount
         except Exception as e:
-            self.conn.rollback()
+            self._observe_error(sql, started)
+            self._rollback()
             logger.error(f"批量SQL执行失败: {str(e)}")
             raise
 
+    def execute_values(self, sql, rows, template, suffix=''):
+        """多行VALUES批量执行：sql 以 VALUES 结尾，按 max_allowed_packet 分块，每块一次往返；
+        rows 可以是生成器，只在内存中保留当前分块"""
+        shape = f"{sql} {template} {suffix}"  # 统计按模板归一化，不使用展开后的语句
+        started = time.perf_counter() if query_stats.enabled() else None
+        try:
+            affected = 0
+            with self.conn.cursor() as cursor:
+                limit = self.packet_limit()
+                fixed = len(sql.encode('utf-8')) + len(suffix.encode('utf-8')) + 1
+                chunk, size = [], fixed
+                for row in rows:
+                    value = cursor.mogrify(template, row)
+                    value_size = len(value.encode('utf-8')) + 1
+                    if chunk and size + value_size > limit:
+                        affected += self._execute_chunk(cursor, shape, f"{sql} {','.join(chunk)} {suffix}")
+                        chunk, size = [], fixed
+                    chunk.append(value)
+                    size += value_size
+                if chunk:
+                    affected += self._execute_chunk(cursor, shape, f"{sql} {','.join(chunk)} {suffix}")
+            self._commit()
+            self._flush_slow()
+            return affected
+        except Exception as e:
+            self._observe_error(shape, started)
+            self._rollback()
+            logger.error(f"批量SQL执行失败: {str(e)}")
+            raise
+
+    def _execute_chunk(self, cursor, shape, statement):
+        """执行 execute_values 的一个分块，开启统计时按模板记录耗时和影响行数"""
+        if not query_stats.enabled():
+            return cursor.execute(statement)
+        started = time.perf_counter()
+        affected = cursor.execute(statement)
+        self._observe(shape, None, started, affected)
+        return affected
+
+    def _observe(self, sql, params, started, rows):
+        """记录一次执行；超过慢查询阈值时写入慢查询日志。需要 EXPLAIN 的语句先暂存，
+        由 _flush_slow 在提交之后执行，EXPLAIN 不在调用方的事务中运行"""
+        elapsed = (time.perf_counter() - started) * 1000
+        if query_stats.record(sql, elapsed, rows):
+            if params is not None and query_stats.should_explain(sql):
+                self._slow.append((sql, params, elapsed, rows))
+            else:
+                query_stats.log_slow(sql, params, elapsed, rows)
+
+    def _flush_slow(self):
+        """事务之外对暂存的慢查询执行 EXPLAIN 并写入慢查询日志"""
+        if self._in_transaction or not self._slow:
+            return
+        slow, self._slow = self._slow, []
+        for sql, params, elapsed, rows in slow:
+            query_stats.log_slow(sql, params, elapsed, rows, self._explain(sql, params))
+
+    def _observe_error(self, sql, started):
+        if started is not None:
+            query_stats.record(sql, (time.perf_counter() - started) * 1000, error=True)
+
+    def _explain(self, sql, params):
+        """在同一连接上执行 EXPLAIN（不计入统计）"""
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"EXPLAIN {sql}", params or ())
+                return cursor.fetchall()
+        except Exception as e:
+            return [{'error': str(e)}]
+
+    def packet_limit(self):
+        """单条语句允许的最大字节数（max_allowed_packet 留出余量，且不超过 16MB）"""
+        if self._packet_limit is None:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT @@max_allowed_packet AS max_allowed_packet")
+                row = cursor.fetchone()
+            self._packet_limit = min(int(row['max_allowed_packet']) * 3 // 4, 16 * 1024 * 1024)
+        return self._packet_limit
+
+    @contextmanager
+    def transaction(self):
+        """事务上下文：期间的 execute 系列方法不再单独提交，退出时统一提交或回滚"""
+        if self._in_transaction:
+            yield self
+            return
+        self._in_transaction = True
+        try:
+            self.conn.begin()
+            yield self
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+            self._flush_slow()
+
+    def _commit(self):
+        if not self._in_transaction:
+            self.conn.commit()
+
+    def _rollback(self):
+        if not self._in_transaction:
+            self.conn.rollback()
+
     def fetch_all(self, sql, params=None):
         """查询多条数据"""
+        started = time.perf_counter() if query_stats.enabled() else None
         with self.conn.cursor() as cursor:
-            cursor.execute(sql, params or ())
-            return cursor.fetchall()
+            try:
+                cursor.execute(sql, params or ())
+                rows = cursor.fetchall()
+            except Exception:
+                self._observe_error(sql, started)
+                raise
+            if started is not None:
+                self._observe(sql, params or (), started, len(rows))
+        self._flush_slow()
+        return rows
 
     def fetch_one(self, sql, params=None):
         """查询单条数据"""
+        started = time.perf_counter() if query_stats.enabled() else None
         with self.conn.cursor() as cursor:
-            cursor.execute(sql, params or ())
-            return cursor.fetchone()
+            try:
+                cursor.execute(sql, params or ())
+                row = cursor.fetchone()
+            except Exception:
+                self._observe_error(sql, started)
+                raise
+            if started is not None:
+                self._observe(sql, params or (), started, 1 if row else 0)
+        self._flush_slow()
+        return row
+
+    def fetch_iter(self, sql, params=None, chunk_size=1000):
+        """逐行返回查询结果（生成器）：使用非缓冲的 SSDictCursor，每次从服务端读取 chunk_size 行，
+        内存占用与结果集大小无关。迭代结束前该连接不能执行其他语句；
+        提前退出（break、异常或调用生成器的 close()）时会读完并丢弃剩余的行，连接可以继续使用"""
+        started = time.perf_counter() if query_stats.enabled() else None
+        count = 0
+        cursor = self.conn.cursor(SSDictCursor)
+        try:
+            try:
+                cursor.execute(sql, params or ())
+            except Exception:
+                self._observe_error(sql, started)
+                raise
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                count += len(rows)
+                yield from rows
+            if started is not None:
+                self._observe(sql, None, started, count)  # 耗时包含调用方处理各行的时间，不执行 EXPLAIN
+        finally:
+            cursor.close()
 
     def close(self):
-        """关闭数据库连接"""
-        if hasattr(self, 'conn') and self.conn:
+        """关闭数据库连接（池化连接归还连接池）"""
+        if getattr(self, 'conn', None):
+            conn, self.conn = self.conn, None
+            if getattr(self, '_pool', None) is not None:
+                self._pool.checkin(conn)
+                return
             try:
-                self.conn.close()
+                conn.close()
             except Exception:
                 pass  # 忽略关闭时的错误
-            finally:
-                self.conn = None
 
     def __del__(self):
         """析构函数，确保关闭数据库连接"""
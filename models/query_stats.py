@@ -0,0 +1,180 @@
+"""
+SQL 执行统计（可选）
+设置环境变量 DB_QUERY_STATS=1 后，Database 的 execute/executemany/execute_values/fetch_all/fetch_one
+按语句形态汇总调用次数、耗时分布、返回或影响的行数和失败次数。
+语句形态由 SQL 模板归一化得到：市场表名 market_0_1/market_1_7 统一为 market_N_N，
+数字和字符串常量、%s 占位符替换为 ?，IN (...) 和多行 VALUES 折叠，使同一段代码生成的语句汇总在一起。
+
+耗时超过 DB_SLOW_QUERY_MS（默认 500 毫秒）的语句记入慢查询日志（logger 'collector.slow_query'），
+SELECT/UPDATE/DELETE 同时附带 EXPLAIN 结果（同一形态每分钟最多一次）；最近的慢查询保存在内存中。
+统计是进程级的，管理后台 /admin/collector/query_stats 返回 Web 进程的统计，采集进程的统计摘要在 runtime_stats 中
+"""
+import os
+import re
+import time
+import json
+import bisect
+import threading
+import logging
+from collections import deque
+
+# 配置日志
+logger = logging.getLogger('collector.slow_query')
+
+QUERY_STATS_CONFIG = {
+    "enabled": os.getenv('DB_QUERY_STATS', '0') == '1',
+    "slow_ms": float(os.getenv('DB_SLOW_QUERY_MS', 500)),       # 慢查询阈值（毫秒）
+    "explain": os.getenv('DB_EXPLAIN_SLOW', '1') == '1',        # 慢查询是否执行 EXPLAIN
+    "explain_interval": 60,    # 同一形态两次 EXPLAIN 的最小间隔（秒）
+    "slow_log_size": 100,      # 内存中保留的慢查询条数
+    "max_shapes": 2000         # 最多统计的语句形态数，超出后归入 <other>
+}
+
+# 耗时分布的桶上界（毫秒），最后一个桶为 +inf
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_NORMALIZE = (
+    (re.compile(r'\bmarket_\d+_\d+\b'), 'market_N_N'),
+    (re.compile(r"'(?:[^'\\]|\\.)*'"), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+_shape_cache = {}
+
+
+def enabled():
+    return QUERY_STATS_CONFIG['enabled']
+
+
+def normalize(sql):
+    """SQL 模板归一化为语句形态（结果按模板缓存，f-string 生成的同一模板只计算一次）"""
+    shape = _shape_cache.get(sql)
+    if shape is None:
+        shape = sql
+        for pattern, replacement in _NORMALIZE:
+            shape = pattern.sub(replacement, shape)
+        shape = shape.strip()[:1000]
+        if len(_shape_cache) < 10000:
+            _shape_cache[sql] = shape
+    return shape
+
+
+class _Shape:
+    __slots__ = ('count', 'errors', 'total_ms', 'max_ms', 'rows', 'buckets', 'explained_at')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.explained_at = 0.0
+
+    def to_dict(self, shape):
+        return {
+            'statement': shape,
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total_ms, 1),
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else 0,
+            'max_ms': round(self.max_ms, 1),
+            'rows': self.rows,
+            'histogram': {
+                (f"<={bound}ms" if i < len(BUCKETS_MS) else f">{BUCKETS_MS[-1]}ms"): count
+                for i, (bound, count) in enumerate(zip(BUCKETS_MS + (None,), self.buckets))
+                if count
+            }
+        }
+
+
+_lock = threading.Lock()
+_shapes = {}
+_slow = deque(maxlen=QUERY_STATS_CONFIG['slow_log_size'])
+_started_at = time.time()
+
+
+def record(sql, elapsed_ms, rows=0, error=False):
+    """记录一次执行，返回是否为慢查询（调用方据此决定是否 EXPLAIN）"""
+    shape = normalize(sql)
+    with _lock:
+        stats = _shapes.get(shape)
+        if stats is None:
+            if len(_shapes) >= QUERY_STATS_CONFIG['max_shapes']:
+                shape = '<other>'
+                stats = _shapes.get(shape)
+            if stats is None:
+                stats = _shapes[shape] = _Shape()
+        stats.count += 1
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.buckets[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+        if error:
+            stats.errors += 1
+        else:
+            stats.rows += rows or 0
+    return not error and elapsed_ms >= QUERY_STATS_CONFIG['slow_ms']
+
+
+def should_explain(sql):
+    """慢查询是否需要 EXPLAIN：只解释 SELECT/UPDATE/DELETE，同一形态按间隔限流"""
+    if not QUERY_STATS_CONFIG['explain'] or sql.lstrip()[:6].upper() not in ('SELECT', 'UPDATE', 'DELETE'):
+        return False
+    shape = normalize(sql)
+    now = time.monotonic()
+    with _lock:
+        stats = _shapes.get(shape)
+        if stats is None or now - stats.explained_at < QUERY_STATS_CONFIG['explain_interval']:
+            return False
+        stats.explained_at = now
+    return True
+
+
+def log_slow(sql, params, elapsed_ms, rows, plan=None):
+    """写入慢查询日志并保存在内存中"""
+    entry = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'statement': normalize(sql),
+        'sql': ' '.join(sql.split())[:2000],
+        'params': repr(params)[:500] if params else None,
+        'ms': round(elapsed_ms, 1),
+        'rows': rows,
+        'explain': plan
+    }
+    with _lock:
+        _slow.append(entry)
+    logger.warning(f"慢查询 {entry['ms']}ms rows={rows}: {entry['sql']} params={entry['params']}"
+                   + (f" explain={json.dumps(plan, ensure_ascii=False, default=str)}" if plan else ""))
+
+
+def top_statements(limit=10):
+    """按总耗时排序的语句形态"""
+    with _lock:
+        items = sorted(_shapes.items(), key=lambda item: item[1].total_ms, reverse=True)[:limit]
+        return [stats.to_dict(shape) for shape, stats in items]
+
+
+def snapshot(limit=100):
+    """完整统计（供管理后台 JSON 接口）"""
+    with _lock:
+        slow = list(_slow)
+    return {
+        'enabled': enabled(),
+        'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_started_at)),
+        'pid': os.getpid(),
+        'slow_ms': QUERY_STATS_CONFIG['slow_ms'],
+        'statements': top_statements(limit),
+        'slow_queries': slow
+    }
+
+
+def reset():
+    global _started_at
+    with _lock:
+        _shapes.clear()
+        _slow.clear()
+        _started_at = time.time()
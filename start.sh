@@ -3,5 +3,9 @@
 # 激活虚拟环境（如果使用）
 source .venv/bin/activate
 
+# 启动采集进程（独立于 Web 进程，通过数据库锁保证单实例）
+nohup python -m collector > /dev/null 2>&1 &
+echo $! > collector.pid
+
 # 启动Gunicorn
-gunicorn -c gunicorn.conf.py app:app 
\ No newline at end of file
+gunicorn -c gunicorn.conf.py app:app 
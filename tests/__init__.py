@@ -0,0 +1 @@
+# 单元测试，只覆盖不依赖数据库和网络的纯逻辑模块
@@ -0,0 +1,5 @@
+import sys
+import os
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
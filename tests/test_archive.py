@@ -0,0 +1,181 @@
+"""
+原始快照归档测试：追加 → 索引 → 读取的往返、段文件切换、未变化采集的索引记录和过期归档清理
+"""
+import os
+import gzip
+from datetime import datetime, timedelta
+
+import pytest
+
+from collector.archive import ArchiveReader, SnapshotArchive, iter_index, prune_archive
+
+# 本地时间 2024-05-01 12:00:00
+NOON = datetime(2024, 5, 1, 12).timestamp()
+
+
+def make_archive(tmp_path, **config):
+    return SnapshotArchive(str(tmp_path), dict({'segment_size': 1024 * 1024, 'compress_level': 1}, **config))
+
+
+def read_all(records):
+    reader = ArchiveReader()
+    try:
+        return [reader.read(record) for record in records]
+    finally:
+        reader.close()
+
+
+def test_round_trip(tmp_path):
+    archive = make_archive(tmp_path)
+    archive.append(0, 1, b'[{"id": 1}]', NOON)
+    archive.append(1, 2, b'[{"id": 2}]', NOON + 1)
+    compressor = archive.compressor()
+    member = compressor.compress(b'[{"id": ') + compressor.compress(b'3}]') + compressor.flush()
+    archive.append_compressed(0, 1, member, NOON + 2)
+    archive.close()
+
+    records = iter_index(path=str(tmp_path))
+    assert [(r.fetched_at, r.server_type, r.product_type) for r in records] == [
+        (NOON, 0, 1), (NOON + 1, 1, 2), (NOON + 2, 0, 1)
+    ]
+    assert read_all(records) == [b'[{"id": 1}]', b'[{"id": 2}]', b'[{"id": 3}]']
+    # 段文件本身是合法的 gzip 文件
+    with gzip.open(records[0].segment) as segment:
+        assert segment.read() == b'[{"id": 1}][{"id": 2}][{"id": 3}]'
+
+
+def test_iter_index_filters(tmp_path):
+    archive = make_archive(tmp_path)
+    archive.append(0, 1, b'a', NOON - 86400)
+    archive.append(0, 1, b'b', NOON)
+    archive.append(0, 2, b'c', NOON + 10)
+    archive.append(1, 1, b'd', NOON + 20)
+    archive.close()
+    path = str(tmp_path)
+
+    assert len(iter_index(path=path)) == 4
+    assert read_all(iter_index(NOON, NOON + 20, path=path)) == [b'b', b'c']
+    assert read_all(iter_index(server_type=0, product_type=1, path=path)) == [b'a', b'b']
+    assert read_all(iter_index(product_type=1, start=NOON, path=path)) == [b'b', b'd']
+    assert iter_index(path=str(tmp_path / 'missing')) == []
+
+
+def test_unchanged_records_index_only(tmp_path):
+    archive = make_archive(tmp_path)
+    archive.append(0, 1, b'[]', NOON)
+    archive.append_unchanged(0, 1, NOON + 30)
+    archive.append(0, 1, b'[{}]', NOON + 60)
+    archive.close()
+
+    records = iter_index(path=str(tmp_path))
+    assert [r.unchanged for r in records] == [False, True, False]
+    assert records[1].length == 0
+    with pytest.raises(ValueError):
+        ArchiveReader().read(records[1])
+    assert read_all([records[0], records[2]]) == [b'[]', b'[{}]']
+
+
+def test_segment_rollover(tmp_path):
+    archive = make_archive(tmp_path, segment_size=100, compress_level=0)
+    bodies = [bytes([65 + i]) * 150 for i in range(4)]
+    for i, body in enumerate(bodies):
+        # 段文件名精确到秒，按秒错开使每次切换得到新文件
+        archive.append(0, 1, body, NOON + i)
+    archive.close()
+
+    records = iter_index(path=str(tmp_path))
+    assert len({r.segment for r in records}) == 4
+    assert all(r.offset == 0 for r in records)
+    assert read_all(records) == bodies
+
+
+def test_rollover_within_same_second_appends(tmp_path):
+    archive = make_archive(tmp_path, segment_size=100, compress_level=0)
+    bodies = [bytes([65 + i]) * 150 for i in range(3)]
+    for body in bodies:
+        archive.append(0, 1, body, NOON)
+    archive.close()
+
+    # 同一秒内切换时重新打开同名段文件继续追加，偏移仍然正确
+    records = iter_index(path=str(tmp_path))
+    assert len({r.segment for r in records}) == 1
+    assert read_all(records) == bodies
+
+
+def test_day_rollover(tmp_path):
+    archive = make_archive(tmp_path)
+    archive.append(0, 1, b'a', NOON)
+    archive.append(0, 1, b'b', NOON + 86400)
+    archive.close()
+
+    assert sorted(os.listdir(tmp_path)) == ['2024-05-01', '2024-05-02']
+    assert read_all(iter_index(path=str(tmp_path))) == [b'a', b'b']
+
+
+def test_interrupted_index_line_skipped(tmp_path):
+    archive = make_archive(tmp_path)
+    archive.append(0, 1, b'a', NOON)
+    archive.close()
+    [record] = iter_index(path=str(tmp_path))
+    with open(f"{record.segment}.idx", 'a', encoding='utf-8') as index_file:
+        index_file.write(f"{NOON + 1:.3f}\t0\t1")
+
+    assert len(iter_index(path=str(tmp_path))) == 1
+
+
+def write_segment(root, day, name, size):
+    directory = os.path.join(root, day)
+    os.makedirs(directory, exist_ok=True)
+    segment = os.path.join(directory, f"{name}.seg.gz")
+    with open(segment, 'wb') as data_file:
+        data_file.write(b'x' * size)
+    with open(f"{segment}.idx", 'w', encoding='utf-8') as index_file:
+        index_file.write('')
+    return segment
+
+
+def days_ago(days):
+    return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def test_prune_by_age(tmp_path):
+    root = str(tmp_path)
+    old = write_segment(root, days_ago(20), '000000-a', 100)
+    kept = write_segment(root, days_ago(3), '000000-a', 100)
+    today = write_segment(root, days_ago(0), '000000-a', 100)
+
+    assert prune_archive(keep_days=14, max_bytes=None, path=root) == (1, 100)
+    assert not os.path.exists(old) and not os.path.exists(f"{old}.idx")
+    assert os.path.exists(kept) and os.path.exists(today)
+    # 清空的日期目录一并删除
+    assert days_ago(20) not in os.listdir(root)
+
+
+def test_prune_by_size_oldest_first(tmp_path):
+    root = str(tmp_path)
+    first = write_segment(root, days_ago(3), '000000-a', 100)
+    second = write_segment(root, days_ago(3), '120000-a', 100)
+    third = write_segment(root, days_ago(2), '000000-a', 100)
+
+    assert prune_archive(keep_days=None, max_bytes=250, path=root) == (1, 100)
+    assert not os.path.exists(first)
+    assert os.path.exists(second) and os.path.exists(third)
+
+
+def test_prune_never_deletes_today(tmp_path):
+    root = str(tmp_path)
+    yesterday = write_segment(root, days_ago(1), '000000-a', 100)
+    today = [write_segment(root, days_ago(0), f"0{i}0000-a", 100) for i in range(3)]
+
+    # 超出大小上限，但当天的段文件可能正在写入，不按大小删除
+    assert prune_archive(keep_days=None, max_bytes=50, path=root) == (1, 100)
+    assert not os.path.exists(yesterday)
+    assert all(os.path.exists(segment) for segment in today)
+    assert days_ago(0) in os.listdir(root)
+
+    # keep_days=0 表示不按天数清理，当天的目录同样保留
+    assert prune_archive(keep_days=0, max_bytes=None, path=root) == (0, 0)
+
+
+def test_prune_missing_root(tmp_path):
+    assert prune_archive(keep_days=1, max_bytes=1, path=str(tmp_path / 'missing')) == (0, 0)
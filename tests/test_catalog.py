@@ -0,0 +1,146 @@
+"""
+表目录缓存测试：用记录查询次数的假数据库验证 TTL 过期、查询不存在的表时的限流重新加载、
+建表/删表后的失效，以及 1146（表不存在）错误时的失效
+"""
+import pymysql
+import pytest
+
+from collector import catalog as catalog_module
+from collector import init_db, storage
+from collector.catalog import TableCatalog, catalog
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeDb:
+    """information_schema.columns 的内容来自 tables，记录加载次数和执行的语句"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.loads = 0
+        self.statements = []
+
+    def fetch_all(self, sql, params=None):
+        assert 'information_schema.columns' in sql
+        self.loads += 1
+        return [
+            {'table_name': name, 'column_name': column}
+            for name, columns in sorted(self.tables.items()) for column in columns
+        ]
+
+    def execute(self, sql, params=None):
+        self.statements.append(' '.join(sql.split()))
+        return 0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(catalog_module, 'time', clock)
+    monkeypatch.setitem(catalog_module.CATALOG_CONFIG, 'ttl', 300)
+    monkeypatch.setitem(catalog_module.CATALOG_CONFIG, 'miss_refresh', 30)
+    catalog.invalidate()
+    yield clock
+    catalog.invalidate()
+
+
+def test_loads_once_within_ttl(clock):
+    db = FakeDb({'market_0_1': ['id', 'price'], 'market_1_12': ['id'], 'sellers': ['seller_id']})
+    tables = TableCatalog()
+
+    assert tables.columns(db, 'market_0_1') == ('id', 'price')
+    assert tables.exists(db, 'sellers')
+    assert tables.market_tables(db) == [('market_0_1', 0, 1), ('market_1_12', 1, 12)]
+    assert db.loads == 1
+
+    # 超过 TTL 后重新加载，发现其他进程的建表和删表
+    db.tables = {'market_0_2': ['id']}
+    clock.now += 301
+    assert tables.market_tables(db) == [('market_0_2', 0, 2)]
+    assert db.loads == 2
+
+
+def test_missing_table_refresh_is_rate_limited(clock):
+    db = FakeDb({'market_0_1': ['id']})
+    tables = TableCatalog()
+    tables.tables(db)
+
+    # 刚加载过，不存在的表不触发重新加载
+    assert tables.columns(db, 'market_0_2') is None
+    assert db.loads == 1
+
+    db.tables['market_0_2'] = ['id']
+    clock.now += 31
+    assert tables.exists(db, 'market_0_2')
+    assert db.loads == 2
+
+    # 重新加载后的间隔内再次查询不存在的表仍使用缓存
+    clock.now += 10
+    assert not tables.exists(db, 'market_0_3')
+    assert not tables.exists(db, 'market_0_3')
+    assert db.loads == 2
+
+
+def test_invalidate_forces_reload(clock):
+    db = FakeDb({'market_0_1': ['id']})
+    tables = TableCatalog()
+    tables.tables(db)
+    db.tables['market_0_1'] = ['id', 'seller_id']
+
+    assert tables.columns(db, 'market_0_1') == ('id',)
+    tables.invalidate()
+    assert tables.columns(db, 'market_0_1') == ('id', 'seller_id')
+    assert db.loads == 2
+
+
+def test_missing_table_error_invalidates(clock):
+    db = FakeDb({'market_0_1': ['id']})
+    tables = TableCatalog()
+    tables.tables(db)
+
+    assert tables.missing_table(pymysql.err.ProgrammingError(1146, "Table 'sc.market_0_1' doesn't exist")) is True
+    db.tables = {}
+    assert not tables.exists(db, 'market_0_1')
+    assert db.loads == 2
+
+    # 其他错误不影响缓存
+    assert tables.missing_table(pymysql.err.OperationalError(2006, "MySQL server has gone away")) is False
+    assert tables.missing_table(ValueError("1146")) is False
+    assert tables.missing_table(pymysql.err.ProgrammingError()) is False
+    tables.tables(db)
+    assert db.loads == 2
+
+
+def test_create_market_table_invalidates_new_table(clock, monkeypatch):
+    monkeypatch.setitem(storage.STORAGE_CONFIG, 'layout', 'per_table')
+    db = FakeDb({})
+    catalog.tables(db)
+
+    assert init_db.create_market_table(db, 0, 5) is True
+    assert db.statements[-1].startswith('CREATE TABLE IF NOT EXISTS market_0_5')
+    db.tables['market_0_5'] = ['id']
+    assert catalog.exists(db, 'market_0_5')
+    assert db.loads == 2
+
+    # 缓存中已有的表仍执行 CREATE TABLE IF NOT EXISTS（可能已被其他进程删除），但不使缓存失效
+    assert init_db.create_market_table(db, 0, 5) is True
+    assert len(db.statements) == 2
+    assert db.loads == 2
+
+
+def test_drop_market_data_invalidates(clock, monkeypatch):
+    monkeypatch.setitem(storage.STORAGE_CONFIG, 'layout', 'per_table')
+    db = FakeDb({'market_0_5': ['id']})
+    assert catalog.exists(db, 'market_0_5')
+
+    storage.drop_market_data(db, 0, 5)
+    assert db.statements[-1] == 'DROP TABLE IF EXISTS market_0_5'
+    db.tables = {}
+    assert not catalog.exists(db, 'market_0_5')
+    assert db.loads == 2
@@ -0,0 +1,92 @@
+"""
+列式快照测试：发布时间转换和按秒四舍五入、价格取整、行组装和统计
+"""
+from datetime import datetime
+
+from collector.columns import SnapshotColumns, datetime_key, posted_column, posted_key
+
+
+def order(market_id, price, quantity, quality=0, posted='2024-05-01T08:00:00Z'):
+    return {
+        'id': market_id,
+        'kind': 7,
+        'quantity': quantity,
+        'quality': quality,
+        'price': price,
+        'fees': 4,
+        'posted': posted,
+        'seller': {
+            'id': 500 + market_id,
+            'company': f'公司{market_id}',
+            'realmId': 1,
+            'certificates': 2,
+            'contest_wins': 3,
+            'npc': 0
+        }
+    }
+
+
+def test_posted_key_utc_rounding():
+    assert posted_key('2024-05-01T08:00:00Z') == '2024-05-01T08:00:00'
+    assert posted_key('2024-05-01T08:00:00.499999Z') == '2024-05-01T08:00:00'
+    assert posted_key('2024-05-01T08:00:00.5+00:00') == '2024-05-01T08:00:01'
+    # 进位跨分钟、跨天
+    assert posted_key('2024-05-01T23:59:59.900Z') == '2024-05-02T00:00:00'
+
+
+def test_posted_key_converts_offsets():
+    assert posted_key('2024-05-01T16:00:00.25+08:00') == '2024-05-01T08:00:00'
+    assert posted_key('2024-05-01T16:00:00.75+08:00') == '2024-05-01T08:00:01'
+    # 不带时区的时间视为 UTC
+    assert posted_key('2024-05-01T08:00:00.5') == '2024-05-01T08:00:01'
+
+
+def test_posted_column_mixed_offsets():
+    values = ['2024-05-01T08:00:00.6Z', '2024-05-01T10:00:00+02:00']
+    assert posted_column(values) == ['2024-05-01T08:00:01', '2024-05-01T08:00:00']
+    assert posted_column(values[:1]) == ['2024-05-01T08:00:01']
+
+
+def test_datetime_key_matches_posted_key():
+    assert datetime_key(datetime(2024, 5, 1, 8, 0, 1)) == posted_key('2024-05-01T08:00:00.6Z')
+
+
+def test_extend_converts_columns():
+    columns = SnapshotColumns.from_items([order(1, 1.005, 3), order(2, 0.1, 7, quality=2)])
+    columns.extend([])
+
+    assert len(columns) == 2
+    assert list(columns.price) == [1005, 100]
+    assert list(columns.seller_is_npc) == [0, 0]
+    assert columns.seller_name == ['公司1', '公司2']
+    assert list(columns.states()) == [
+        (1005, 3, 0, 4, '2024-05-01T08:00:00'),
+        (100, 7, 2, 4, '2024-05-01T08:00:00')
+    ]
+    assert columns.row(1, 42) == (2, 7, 7, 2, 0.1, 502, 4, '2024-05-01T08:00:00', 42)
+
+
+def test_summary_and_by_quality():
+    columns = SnapshotColumns.from_items([
+        order(1, 2.0, 10),
+        order(2, 1.5, 30),
+        order(3, 4.0, 5, quality=1)
+    ])
+
+    assert columns.summary() == {
+        'orders': 3,
+        'min_price': 1.5,
+        'avg_price': round((20 + 45 + 20) / 45, 3),
+        'quantity': 45
+    }
+    assert columns.by_quality() == {
+        0: [1500, 2000 * 10 + 1500 * 30, 40, 2],
+        1: [4000, 20000, 5, 1]
+    }
+
+
+def test_empty_snapshot():
+    columns = SnapshotColumns()
+    assert columns.summary() == {'orders': 0, 'min_price': None, 'avg_price': None, 'quantity': 0}
+    assert columns.by_quality() == {}
+    assert SnapshotColumns.from_items([order(1, 1.0, 0)]).summary()['avg_price'] is None
@@ -0,0 +1,185 @@
+"""
+连接池测试：用假连接代替 _connect，验证借出等待超时、空闲连接 ping 失败后重连、
+归还时回滚未结束的事务、fork 后重新创建连接池，以及每个线程一个连接
+"""
+import gc
+import threading
+import time
+
+import pytest
+from pymysql.constants.SERVER_STATUS import SERVER_STATUS_IN_TRANS
+
+from models import database
+from models.database import ConnectionPool, get_pool, thread_database
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.open = True
+        self.server_status = 0
+        self.alive = True
+        self.rollbacks = 0
+        self.pings = 0
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+        if not self.alive:
+            raise ConnectionError("服务端已断开")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status &= ~SERVER_STATUS_IN_TRANS
+
+    def close(self):
+        self.open = False
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    created = []
+
+    def connect(local_infile=False):
+        conn = FakeConnection(len(created))
+        created.append(conn)
+        return conn
+
+    monkeypatch.setattr(database, '_connect', connect)
+    monkeypatch.setattr(database, '_pools', {})
+    return created
+
+
+def test_checkout_reuses_idle_connection(connections):
+    pool = ConnectionPool(size=2, timeout=1, ping_interval=60)
+    conn = pool.checkout()
+    pool.checkin(conn)
+
+    assert pool.checkout() is conn
+    assert len(connections) == 1
+    stats = pool.stats()
+    assert (stats['checkouts'], stats['connects'], stats['in_use'], stats['utilization']) == (2, 1, 1, 0.5)
+
+
+def test_checkout_times_out_when_exhausted(connections):
+    pool = ConnectionPool(size=2, timeout=0.05)
+    pool.checkout()
+    pool.checkout()
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.checkout()
+    assert time.monotonic() - started >= 0.05
+    assert pool.stats()['timeouts'] == 1
+    assert len(connections) == 2
+
+
+def test_waiting_checkout_gets_returned_connection(connections):
+    pool = ConnectionPool(size=1, timeout=2)
+    conn = pool.checkout()
+    timer = threading.Timer(0.05, pool.checkin, (conn,))
+    timer.start()
+
+    assert pool.checkout() is conn
+    timer.join()
+    stats = pool.stats()
+    assert stats['waits'] == 1 and stats['max_wait'] > 0
+
+
+def test_dead_idle_connection_is_revived(connections):
+    pool = ConnectionPool(size=1, timeout=1, ping_interval=0)
+    conn = pool.checkout()
+    pool.checkin(conn)
+    conn.alive = False
+
+    revived = pool.checkout()
+    assert revived is not conn
+    assert conn.pings == 1 and not conn.open
+    assert pool.stats()['reconnects'] == 1
+    # 重连不改变已打开的连接数
+    assert pool.stats()['opened'] == 1
+
+
+def test_recently_used_connection_not_pinged(connections):
+    pool = ConnectionPool(size=1, ping_interval=60)
+    conn = pool.checkout()
+    pool.checkin(conn)
+    pool.checkout()
+    assert conn.pings == 0
+
+
+def test_checkin_rolls_back_open_transaction(connections):
+    pool = ConnectionPool(size=1)
+    conn = pool.checkout()
+    conn.server_status |= SERVER_STATUS_IN_TRANS
+    pool.checkin(conn)
+
+    assert conn.rollbacks == 1
+    assert pool.checkout() is conn
+
+
+def test_checkin_discards_closed_connection(connections):
+    pool = ConnectionPool(size=1, timeout=0.05)
+    conn = pool.checkout()
+    conn.open = False
+    pool.checkin(conn)
+
+    # 丢弃的连接释放名额，下一次借出新建连接而不是超时
+    assert pool.checkout() is not conn
+    assert len(connections) == 2
+
+
+def test_failed_connect_releases_slot(connections, monkeypatch):
+    pool = ConnectionPool(size=1, timeout=0.05)
+
+    def refuse(local_infile=False):
+        raise ConnectionError("拒绝连接")
+
+    monkeypatch.setattr(database, '_connect', refuse)
+    with pytest.raises(ConnectionError):
+        pool.checkout()
+    assert pool.stats()['opened'] == 0
+
+
+def test_get_pool_recreated_after_fork(connections, monkeypatch):
+    pool = get_pool()
+    assert get_pool() is pool
+    assert get_pool(local_infile=True) is not pool
+
+    # fork 出的子进程 pid 不同，不能沿用父进程的连接
+    monkeypatch.setattr(database.os, 'getpid', lambda: pool.pid + 1)
+    child = get_pool()
+    assert child is not pool
+    assert child.pid == pool.pid + 1
+    assert get_pool() is child
+
+
+def test_thread_database_one_connection_per_thread(connections):
+    main_db = thread_database()
+    assert thread_database() is main_db
+
+    barrier = threading.Barrier(2)
+    seen = []
+
+    def worker():
+        db = thread_database()
+        barrier.wait()  # 两个线程同时持有连接
+        seen.append((db.conn.number, thread_database() is db, db is main_db))
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+
+    assert sorted(number for number, _, _ in seen) == [1, 2]
+    assert all(same and not is_main for _, same, is_main in seen)
+    # 线程结束后连接归还连接池，只有主线程的连接仍在使用
+    assert get_pool().stats()['in_use'] == 1
+    assert thread_database().conn.number == 0
+
+    # 关闭后再次调用重新借出
+    main_db.close()
+    replacement = thread_database()
+    assert replacement is not main_db
+    replacement.close()
@@ -0,0 +1,116 @@
+"""
+采集租约测试：用记录 SQL 的假连接代替 MySQL，验证获取、心跳、失锁和释放时的状态变化
+"""
+import pytest
+
+from collector import lease as lease_module
+from collector.lease import CollectorLease
+
+
+class FakeConnection:
+    """按 SQL 关键字返回预设结果的假连接"""
+
+    def __init__(self, acquired=1, held=1, error=None):
+        self.acquired = acquired
+        self.held = held
+        self.error = error
+        self.statements = []
+        self.closed = False
+
+    def fetch_one(self, sql, params=None):
+        self.statements.append(sql)
+        if self.error is not None:
+            raise self.error
+        if 'GET_LOCK' in sql:
+            return {'acquired': self.acquired}
+        if 'IS_USED_LOCK' in sql:
+            return {'held': self.held}
+        return {'released': 1}
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        return 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionFactory:
+    """代替 Database 类，记录创建过的连接，options 作为下一个连接的参数"""
+
+    def __init__(self):
+        self.created = []
+        self.options = {}
+
+    def __call__(self, pooled=True):
+        assert pooled is False  # 锁绑定在连接上，必须使用独立连接
+        connection = FakeConnection(**self.options)
+        self.created.append(connection)
+        return connection
+
+    def __getitem__(self, i):
+        return self.created[i]
+
+    def __len__(self):
+        return len(self.created)
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    factory = ConnectionFactory()
+    monkeypatch.setattr(lease_module, 'Database', factory)
+    return factory
+
+
+def test_acquire_writes_heartbeat(connections):
+    lease = CollectorLease('test.lock')
+
+    assert lease.acquire() is True
+    assert lease.held
+    statements = connections[0].statements
+    assert 'GET_LOCK' in statements[0]
+    assert any('lease_heartbeat = NOW()' in sql for sql in statements)
+
+
+def test_acquire_busy_lock_keeps_connection(connections):
+    connections.options = {'acquired': 0}
+    lease = CollectorLease('test.lock')
+
+    # 锁被其他进程持有时保留连接，下一次重试复用
+    assert lease.acquire() is False
+    assert not lease.held
+    assert not connections[0].closed
+
+
+def test_heartbeat_detects_lost_lock(connections):
+    lease = CollectorLease('test.lock')
+    lease.acquire()
+
+    connections[0].held = 0
+    assert lease.heartbeat() is False
+    assert not lease.held
+    assert connections[0].closed
+    # 失锁后重新获取使用新的连接
+    assert lease.acquire() is True
+    assert len(connections) == 2
+
+
+def test_connection_error_resets_lease(connections):
+    lease = CollectorLease('test.lock')
+    lease.acquire()
+
+    connections[0].error = RuntimeError("连接已断开")
+    assert lease.heartbeat() is False
+    assert not lease.held and connections[0].closed
+
+
+def test_release_clears_owner(connections):
+    lease = CollectorLease('test.lock')
+    lease.acquire()
+    lease.release()
+
+    statements = connections[0].statements
+    assert any('lease_owner = NULL' in sql for sql in statements)
+    assert 'RELEASE_LOCK' in statements[-1]
+    assert not lease.held and connections[0].closed
+    assert lease.heartbeat() is False
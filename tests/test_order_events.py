@@ -0,0 +1,91 @@
+"""
+订单变化日志测试：比对结果转换为新增/价格/数量/其他/下架事件，变化事件记录变化后的值，下架事件记录下架前的值
+"""
+from datetime import datetime
+
+from collector.columns import SnapshotColumns
+from collector.order_events import (
+    EVENT_NEW, EVENT_OTHER, EVENT_PRICE, EVENT_QUANTITY, EVENT_REMOVED, diff_events
+)
+from collector.snapshot_index import OrderIndex
+
+EVENT_TIME = datetime(2024, 5, 1, 8, 30)
+
+
+def order(market_id, price=1.5, quantity=10, quality=0, fees=3, posted='2024-05-01T08:00:00Z'):
+    return {
+        'id': market_id,
+        'kind': 1,
+        'quantity': quantity,
+        'quality': quality,
+        'price': price,
+        'fees': fees,
+        'posted': posted,
+        'seller': {
+            'id': 100 + market_id,
+            'company': f'公司{market_id}',
+            'realmId': 0,
+            'certificates': 1,
+            'contest_wins': 0,
+            'npc': False
+        }
+    }
+
+
+def events_for(index, items, batch_id=7):
+    diff = index.diff(SnapshotColumns.from_items(items))
+    diff.batch_id = batch_id
+    events = list(diff_events(0, 5, index, diff, EVENT_TIME))
+    index.apply(diff)
+    return {event[2]: event for event in events}
+
+
+def test_first_snapshot_emits_new_events():
+    index = OrderIndex('market_0_5')
+    events = events_for(index, [order(1), order(2, price=2.25, quantity=4)])
+
+    assert events == {
+        1: (0, 5, 1, 7, EVENT_TIME, EVENT_NEW, 1.5, 10),
+        2: (0, 5, 2, 7, EVENT_TIME, EVENT_NEW, 2.25, 4)
+    }
+
+
+def test_change_flags_and_new_values():
+    index = OrderIndex('market_0_5')
+    events_for(index, [order(i) for i in range(1, 7)], batch_id=1)
+
+    events = events_for(index, [
+        order(1),                                          # 未变化，不产生事件
+        order(2, price=1.75),                              # 价格
+        order(3, quantity=8),                              # 数量
+        order(4, price=1.2, quantity=2),                   # 价格和数量
+        order(5, posted='2024-05-01T09:00:00Z'),           # 重新发布（发布时间）
+        order(6, quality=1, fees=4, price=1.6),            # 品质、费用和价格
+    ], batch_id=2)
+
+    assert set(events) == {2, 3, 4, 5, 6}
+    assert events[2][5:] == (EVENT_PRICE, 1.75, 10)
+    assert events[3][5:] == (EVENT_QUANTITY, 1.5, 8)
+    assert events[4][5:] == (EVENT_PRICE | EVENT_QUANTITY, 1.2, 2)
+    assert events[5][5:] == (EVENT_OTHER, 1.5, 10)
+    assert events[6][5:] == (EVENT_PRICE | EVENT_OTHER, 1.6, 10)
+    assert all(event[3] == 2 for event in events.values())
+
+
+def test_removed_records_last_values():
+    index = OrderIndex('market_0_5')
+    events_for(index, [order(1), order(2)], batch_id=1)
+    events_for(index, [order(1), order(2, price=3.0, quantity=1)], batch_id=2)
+
+    events = events_for(index, [order(1)], batch_id=3)
+    assert events == {2: (0, 5, 2, 3, EVENT_TIME, EVENT_REMOVED, 3.0, 1)}
+
+    # 下架后再次出现按新增处理
+    events = events_for(index, [order(1), order(2, price=2.0)], batch_id=4)
+    assert events[2][5:] == (EVENT_NEW, 2.0, 10)
+
+
+def test_unchanged_snapshot_emits_nothing():
+    index = OrderIndex('market_0_5')
+    events_for(index, [order(1), order(2)])
+    assert events_for(index, [order(2), order(1)]) == {}
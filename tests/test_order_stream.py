@@ -0,0 +1,90 @@
+"""
+流式解析测试：任意位置切分响应块（包括多字节 UTF-8 字符中间）得到与一次性解析相同的结果，
+格式错误和不完整的响应抛出 ValueError
+"""
+import json
+
+import pytest
+
+from collector.order_stream import iter_batches, parse_orders, parse_stream
+
+COLUMNS = ('market_id', 'quantity', 'quality', 'price', 'seller_name', 'fees', 'posted')
+
+
+def order(market_id, company):
+    return {
+        'id': market_id,
+        'kind': 1,
+        'quantity': 10 + market_id,
+        'quality': market_id % 3,
+        'price': 1.25 * market_id,
+        'fees': 2,
+        'posted': '2024-05-01T08:00:00.750000+00:00',
+        'seller': {
+            'id': 100 + market_id,
+            'company': company,
+            'realmId': 0,
+            'certificates': 1,
+            'contest_wins': 0,
+            'npc': False,
+            'logo': 'https://example.com/logo.png'
+        }
+    }
+
+
+BODY = json.dumps(
+    [order(1, '东方商行'), order(2, 'Ünïcode 株式会社 🚀'), order(3, 'plain')],
+    ensure_ascii=False, indent=1
+).encode('utf-8')
+
+
+def split(body, *offsets):
+    bounds = [0, *offsets, len(body)]
+    return [body[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def as_lists(columns):
+    return [list(getattr(columns, name)) for name in COLUMNS]
+
+
+def test_single_chunk_matches_parse_orders():
+    expected = as_lists(parse_orders(BODY))
+    assert as_lists(parse_stream([BODY])) == expected
+    assert expected[0] == [1, 2, 3]
+    assert expected[4][1] == 'Ünïcode 株式会社 🚀'
+    assert expected[6][0] == '2024-05-01T08:00:01'
+
+
+def test_every_split_point():
+    expected = as_lists(parse_orders(BODY))
+    for offset in range(1, len(BODY)):
+        assert as_lists(parse_stream(split(BODY, offset))) == expected, offset
+
+
+def test_byte_by_byte():
+    chunks = [BODY[i:i + 1] for i in range(len(BODY))]
+    assert as_lists(parse_stream(chunks)) == as_lists(parse_orders(BODY))
+
+
+def test_batches_follow_chunks():
+    first_end = BODY.index(b'},\n {') + 1
+    batches = list(iter_batches(split(BODY, first_end)))
+    assert [[item['id'] for item in batch] for batch in batches] == [[1], [2, 3]]
+
+
+def test_empty_and_whitespace():
+    assert len(parse_stream([b'  ', b'[', b' ]'])) == 0
+    assert len(parse_stream([b'[]'])) == 0
+
+
+@pytest.mark.parametrize('chunks', [
+    [b'{"id": 1}'],                  # 不是数组
+    [b''],                           # 空响应
+    [b'[{"id": 1}, '],               # 数组未结束
+    [b'[{"id": 1'],                  # 订单对象不完整
+    [b'[{"id": 1}, {bad}]'],         # 订单对象格式错误
+    [b'[{"name": "\xe4\xb8'],        # 在多字节字符中间结束
+])
+def test_malformed_raises_value_error(chunks):
+    with pytest.raises(ValueError):
+        list(iter_batches(chunks))
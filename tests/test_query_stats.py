@@ -0,0 +1,86 @@
+"""
+SQL 执行统计测试：语句形态归一化、耗时分布、形态数上限和 EXPLAIN 限流
+"""
+import pytest
+
+from models import query_stats
+from models.query_stats import normalize
+
+
+@pytest.fixture(autouse=True)
+def clean_stats(monkeypatch):
+    monkeypatch.setitem(query_stats.QUERY_STATS_CONFIG, 'slow_ms', 500)
+    monkeypatch.setitem(query_stats.QUERY_STATS_CONFIG, 'explain', True)
+    query_stats.reset()
+    yield
+    query_stats.reset()
+
+
+@pytest.mark.parametrize('sql, shape', [
+    ("SELECT * FROM market_0_12 WHERE id IN (%s, %s, %s) AND name = 'O\\'Brien'",
+     "SELECT * FROM market_N_N WHERE id IN (...) AND name = ?"),
+    ("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s),\n    (%s, %s) ON DUPLICATE KEY UPDATE a = VALUES(a)",
+     "INSERT INTO t (a, b) VALUES (...) ON DUPLICATE KEY UPDATE a = VALUES(a)"),
+    ("UPDATE collector_tasks SET poll_interval = 3.5 WHERE id = 7",
+     "UPDATE collector_tasks SET poll_interval = ? WHERE id = ?"),
+    # 标识符中的数字不替换
+    ("SELECT col1, t2.x FROM market_unified WHERE server_type = 0 LIMIT 100",
+     "SELECT col1, t2.x FROM market_unified WHERE server_type = ? LIMIT ?"),
+])
+def test_normalize(sql, shape):
+    assert normalize(sql) == shape
+
+
+def test_same_template_shares_shape():
+    assert normalize("SELECT * FROM market_0_1 WHERE id = 1") == \
+        normalize("SELECT *\n  FROM market_1_7\n  WHERE id = 25")
+    assert normalize("DELETE FROM t WHERE id IN (1, 2)") == normalize("DELETE FROM t WHERE id IN (%s)")
+
+
+def test_record_histogram_and_rows():
+    sql = "SELECT * FROM t WHERE id = %s"
+    assert query_stats.record(sql, 0.5, rows=2) is False
+    assert query_stats.record(sql, 30, rows=3) is False
+    assert query_stats.record(sql, 900, rows=1) is True
+    assert query_stats.record(sql, 6000, error=True) is False  # 失败的语句不算慢查询
+
+    [stats] = query_stats.top_statements()
+    assert stats['statement'] == "SELECT * FROM t WHERE id = ?"
+    assert (stats['count'], stats['errors'], stats['rows']) == (4, 1, 6)
+    assert stats['max_ms'] == 6000
+    assert stats['histogram'] == {'<=1ms': 1, '<=50ms': 1, '<=1000ms': 1, '>5000ms': 1}
+
+
+def test_shapes_capped(monkeypatch):
+    monkeypatch.setitem(query_stats.QUERY_STATS_CONFIG, 'max_shapes', 2)
+    query_stats.record("SELECT a FROM t", 1)
+    query_stats.record("SELECT b FROM t", 2)
+    query_stats.record("SELECT c FROM t", 3)
+    query_stats.record("SELECT d FROM t", 4)
+
+    statements = {s['statement']: s['count'] for s in query_stats.top_statements()}
+    assert statements == {'SELECT a FROM t': 1, 'SELECT b FROM t': 1, '<other>': 2}
+
+
+def test_should_explain_throttled():
+    select = "SELECT * FROM t WHERE id = 1"
+    # 未记录过的形态和非 SELECT/UPDATE/DELETE 语句不解释
+    assert query_stats.should_explain(select) is False
+    query_stats.record(select, 900)
+    query_stats.record("INSERT INTO t VALUES (1)", 900)
+    assert query_stats.should_explain("INSERT INTO t VALUES (1)") is False
+
+    assert query_stats.should_explain(select) is True
+    # 同一形态在间隔内只解释一次
+    assert query_stats.should_explain("SELECT * FROM t WHERE id = 2") is False
+
+
+def test_slow_log_snapshot():
+    query_stats.log_slow("SELECT *\n FROM t WHERE id = %s", (1,), 812.34, 1, plan=[{'type': 'ALL'}])
+    snapshot = query_stats.snapshot()
+
+    [entry] = snapshot['slow_queries']
+    assert entry['statement'] == "SELECT * FROM t WHERE id = ?"
+    assert entry['sql'] == "SELECT * FROM t WHERE id = %s"
+    assert (entry['ms'], entry['params'], entry['explain']) == (812.3, '(1,)', [{'type': 'ALL'}])
+    assert snapshot['slow_ms'] == 500
@@ -0,0 +1,109 @@
+"""
+重试策略测试：指数退避上限、Retry-After 解析和熔断器的打开/试探/关闭
+"""
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import requests
+
+from collector.retry import (
+    CLOSED, HALF_OPEN, OPEN, RetryPolicy, describe_error, parse_retry_after
+)
+
+CONFIG = {
+    "base_delay": 5,
+    "max_delay": 40,
+    "failure_threshold": 3,
+    "cooldown": 600,
+    "max_cooldown": 1000
+}
+KEY = (0, 1)
+
+
+def http_error(status, retry_after=None):
+    response = requests.Response()
+    response.status_code = status
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return requests.HTTPError(f"{status} Error", response=response)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after(' 120 ') == 120.0
+    assert parse_retry_after('soon') is None
+
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=90), usegmt=True)
+    assert 80 <= parse_retry_after(later) <= 90
+    # 已经过去的时间不返回负数
+    earlier = format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)
+    assert parse_retry_after(earlier) == 0.0
+
+
+def test_describe_error():
+    assert describe_error(http_error(429, '30')) == (429, 30.0)
+    assert describe_error(http_error(500)) == (500, None)
+    assert describe_error(requests.ConnectionError("连接被重置")) == (None, None)
+    assert describe_error(ValueError("JSON 格式错误")) == (None, None)
+
+
+def test_backoff_grows_within_cap():
+    policy = RetryPolicy(dict(CONFIG, failure_threshold=100))
+    caps = [5, 10, 20, 40, 40, 40]
+    for failures, cap in enumerate(caps, 1):
+        delay, retry_after = policy.failure(KEY, ValueError("失败"), now=1000)
+        assert 5 <= delay <= cap, failures
+        assert retry_after is None
+    assert policy._tasks[KEY].state == CLOSED
+    assert policy._tasks[KEY].retry_at == 1000 + delay
+
+
+def test_retry_after_extends_delay():
+    policy = RetryPolicy(CONFIG)
+    delay, retry_after = policy.failure(KEY, http_error(503, '120'), now=1000)
+
+    assert delay == retry_after == 120.0
+    assert policy.throttled == 1
+    assert policy.snapshot()['tasks'][0]['last_status'] == 503
+
+
+def test_breaker_transitions():
+    policy = RetryPolicy(CONFIG)
+    for _ in range(2):
+        policy.failure(KEY, ValueError("失败"), now=1000)
+    assert policy._tasks[KEY].state == CLOSED
+
+    # 达到阈值打开熔断器，延迟为冷却期
+    delay, _ = policy.failure(KEY, ValueError("失败"), now=1000)
+    assert (policy._tasks[KEY].state, delay) == (OPEN, 600)
+
+    # 冷却结束后试探，失败则冷却期加倍（不超过上限）
+    policy.attempt(KEY)
+    assert policy._tasks[KEY].state == HALF_OPEN
+    delay, _ = policy.failure(KEY, ValueError("失败"), now=2000)
+    assert (policy._tasks[KEY].state, delay) == (OPEN, 1000)
+
+    snapshot = policy.snapshot()
+    assert snapshot['open'] == 1 and snapshot['retrying'] == 0
+
+    # 试探成功后关闭熔断器并清除记录
+    policy.attempt(KEY)
+    policy.success(KEY)
+    assert KEY not in policy._tasks
+    assert policy.snapshot()['open'] == 0
+
+
+def test_attempt_on_closed_task_is_noop():
+    policy = RetryPolicy(CONFIG)
+    policy.attempt(KEY)
+    assert KEY not in policy._tasks
+
+    policy.failure(KEY, ValueError("失败"), now=1000)
+    policy.attempt(KEY)
+    assert policy._tasks[KEY].state == CLOSED
+    assert policy.snapshot()['retrying'] == 1
+
+    # 其他任务不受影响
+    policy.success((1, 2))
+    assert policy._tasks[KEY].failures == 1
@@ -0,0 +1,123 @@
+"""
+价格汇总测试：时间桶对齐、OHLC 合并（包括乱序样本）、未变化采集的样本延续和写出的行
+"""
+from decimal import Decimal
+from datetime import datetime
+
+import pytest
+
+from collector import rollup
+from collector.rollup import RollupAccumulator, bucket_start
+
+# 2024-05-01 00:00:00 UTC
+DAY = 1714521600
+
+
+@pytest.fixture(autouse=True)
+def utc_days(monkeypatch):
+    monkeypatch.setitem(rollup.ROLLUP_CONFIG, 'day_offset_hours', 0)
+
+
+def bucket(accumulator, resolution, at, quality=0):
+    seconds = rollup.RESOLUTIONS[resolution]
+    return accumulator.buckets[(resolution, 0, 1, quality, bucket_start(at, seconds))]
+
+
+def test_bucket_start(monkeypatch):
+    assert bucket_start(DAY + 59.9, 60) == DAY
+    assert bucket_start(DAY + 60, 60) == DAY + 60
+    assert bucket_start(DAY + 3599, 3600) == DAY
+    assert bucket_start(DAY + 86399, 86400) == DAY
+
+    # 日桶对齐到 UTC+8 零点，即 UTC 前一天 16:00
+    monkeypatch.setitem(rollup.ROLLUP_CONFIG, 'day_offset_hours', 8)
+    assert bucket_start(DAY + 3600, 86400) == DAY - 8 * 3600
+    assert bucket_start(DAY + 16 * 3600, 86400) == DAY + 16 * 3600
+    # 分钟和小时桶不受影响
+    assert bucket_start(DAY + 3601, 3600) == DAY + 3600
+
+
+def test_ohlc_merge():
+    accumulator = RollupAccumulator()
+    accumulator.add(0, 1, 0, DAY + 10, 2000, 20000, 10, 2)
+    accumulator.add(0, 1, 0, DAY + 20, 3000, 30000, 10, 3, min_price=2500)
+    accumulator.add(0, 1, 0, DAY + 30, 1000, 5000, 5, 1)
+
+    entry = bucket(accumulator, '1m', DAY)
+    open_price, high, low, close, lowest, pq_sum, quantity_sum, quantity, orders, samples, first, last = entry
+    assert (open_price, high, low, close, lowest) == (2000, 3000, 1000, 1000, 1000)
+    assert (pq_sum, quantity_sum, quantity, orders, samples) == (55000, 25, 5, 1, 3)
+    assert (first, last) == (DAY + 10, DAY + 30)
+    # 三种粒度各一个桶
+    assert len(accumulator) == 3
+
+
+def test_out_of_order_samples():
+    accumulator = RollupAccumulator()
+    accumulator.add(0, 1, 0, DAY + 30, 2000, 20000, 10, 2)
+    accumulator.add(0, 1, 0, DAY + 10, 1500, 15000, 10, 4)  # 更早的样本成为开盘价，不改变收盘
+
+    entry = bucket(accumulator, '1h', DAY)
+    assert entry[0] == 1500 and entry[3] == 2000
+    assert entry[8] == 2  # 订单数来自最后一个样本
+    assert (entry[10], entry[11]) == (DAY + 10, DAY + 30)
+
+
+def test_samples_split_across_buckets():
+    accumulator = RollupAccumulator()
+    accumulator.add(0, 1, 0, DAY + 50, 2000, 20000, 10, 2)
+    accumulator.add(0, 1, 0, DAY + 70, 3000, 30000, 10, 2)
+
+    assert bucket(accumulator, '1m', DAY)[9] == 1
+    assert bucket(accumulator, '1m', DAY + 60)[9] == 1
+    assert bucket(accumulator, '1h', DAY)[9] == 2
+    assert len(accumulator) == 4
+
+
+def test_add_stats_uses_weighted_average():
+    accumulator = RollupAccumulator()
+    stats = {0: [1500, 2000 * 10 + 1500 * 30, 40, 2], 1: [4000, 0, 0, 0]}
+    accumulator.add_stats(0, 1, stats, DAY)
+    # 未变化的采集用同样的统计再合并一次，样本数增加、收盘延续
+    accumulator.add_stats(0, 1, stats, DAY + 30)
+
+    entry = bucket(accumulator, '1m', DAY)
+    assert entry[0] == entry[3] == round(65000 / 40)
+    assert entry[4] == 1500
+    assert entry[9] == 2
+    # 数量为 0 的品质不产生样本
+    assert ('1m', 0, 1, 1, DAY) not in accumulator.buckets
+
+
+class FakeDb:
+    def __init__(self):
+        self.calls = []
+
+    def execute_values(self, sql, values, template=None, suffix=''):
+        self.calls.append((sql, values, suffix))
+
+
+def test_flush_writes_one_upsert_per_resolution():
+    accumulator = RollupAccumulator()
+    accumulator.add(0, 1, 2, DAY + 10, 2000, 20000, 10, 2)
+    accumulator.add(0, 1, 2, DAY + 20, 1000, 30000, 30, 3)
+    db = FakeDb()
+    accumulator.flush(db)
+
+    assert len(accumulator) == 0
+    assert [sql.split()[2] for sql, _, _ in db.calls] == [
+        'market_rollup_1m', 'market_rollup_1h', 'market_rollup_1d'
+    ]
+    assert all(suffix.startswith('ON DUPLICATE KEY UPDATE') for _, _, suffix in db.calls)
+
+    row = db.calls[0][1][0]
+    assert row[:4] == (0, 1, 2, datetime(2024, 5, 1))
+    assert row[4:10] == (
+        Decimal('2.000'), Decimal('2.000'), Decimal('1.000'), Decimal('1.000'),
+        Decimal('1.000'), Decimal('1.250')
+    )
+    assert row[10:15] == (Decimal('50.000'), 40, 30, 3, 2)
+    assert row[15] == datetime(2024, 5, 1, 0, 0, 10)
+
+    accumulator.flush(db)
+    assert len(db.calls) == 3
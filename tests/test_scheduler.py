@@ -0,0 +1,133 @@
+"""
+自适应调度器测试：变化率估计、周期上下限、全局预算放大和优先队列出队
+"""
+from collector.scheduler import AdaptiveScheduler
+
+CONFIG = {
+    "max_staleness": 100,
+    "target_change": 0.2,
+    "smoothing": 0.5,
+    "request_budget": 1000.0
+}
+
+
+def make_scheduler(rows, **config):
+    scheduler = AdaptiveScheduler(10, dict(CONFIG, **config))
+    scheduler.load(rows)
+    return scheduler
+
+
+def task_row(task_id, product, interval=None, change_rate=None):
+    return {
+        'id': task_id,
+        'server_type': 0,
+        'product_type': product,
+        'poll_interval': interval,
+        'change_rate': change_rate,
+        'last_poll_time': None,
+        'next_due_time': None
+    }
+
+
+def test_interval_follows_change_rate():
+    scheduler = make_scheduler([task_row(1, 'a')])
+    key = (0, 'a')
+
+    # 第一次采集没有上次时间，无法估计变化率，使用最小周期
+    assert scheduler.record(key, 0.5, now=1000) == 1010
+    assert scheduler._tasks[key].change_rate is None
+
+    # 100 秒内全部订单变化 -> 每秒 0.01，周期 0.2 / 0.01 = 20 秒
+    assert scheduler.record(key, 1.0, now=1100) == 1120
+    assert scheduler._tasks[key].change_rate == 0.01
+
+    # 没有变化时按平滑系数向 0 衰减：0.01 + 0.5 * (0 - 0.01)，周期延长到 40 秒
+    assert scheduler.record(key, 0.0, now=1120) == 1160
+    assert scheduler._tasks[key].interval == 40
+
+
+def test_interval_clamped_to_bounds():
+    scheduler = make_scheduler([task_row(1, 'a')])
+    key = (0, 'a')
+    scheduler.record(key, None, now=1000)
+
+    # 变化极快也不低于最小周期
+    scheduler.record(key, 1.0, now=1001)
+    assert scheduler._tasks[key].interval == 10
+
+    # 变化极慢也不超过最大陈旧时间
+    scheduler._tasks[key].change_rate = 1e-9
+    scheduler.record(key, None, now=1011)
+    assert scheduler._tasks[key].interval == 100
+
+
+def test_zero_change_rate_doubles_interval():
+    scheduler = make_scheduler([task_row(1, 'a', interval=30, change_rate=0.0)])
+    key = (0, 'a')
+
+    assert scheduler.record(key, None, now=1000) == 1060
+    assert scheduler.record(key, None, now=1060) == 1160  # 120 被截断到 100
+
+
+def test_budget_stretches_interval():
+    rows = [task_row(1, 'a', interval=10), task_row(2, 'b', interval=10)]
+
+    # 需求 0.2 次/秒，预算 0.1 次/秒 -> 周期放大一倍
+    scheduler = make_scheduler(rows, request_budget=0.1)
+    assert scheduler.record((0, 'a'), None, now=1000) == 1020
+
+    # 放大后的周期同样不超过最大陈旧时间
+    scheduler = make_scheduler(rows, request_budget=0.001)
+    assert scheduler.record((0, 'a'), None, now=1000) == 1100
+
+    # 预算充足时不放大
+    scheduler = make_scheduler(rows)
+    assert scheduler.record((0, 'a'), None, now=1000) == 1010
+
+
+def test_pop_due_order_and_in_flight():
+    scheduler = make_scheduler([task_row(1, 'a'), task_row(2, 'b')])
+    scheduler.defer((0, 'a'), 20, now=1000)
+    scheduler.defer((0, 'b'), 10, now=1000)
+
+    assert scheduler.pop_due(now=1005) is None
+    assert scheduler.seconds_until_next(now=1005) == 5
+    assert scheduler.pop_due(now=1030) == (0, 'b')
+    assert scheduler.pop_due(now=1030) == (0, 'a')
+    # 执行中的任务不会被重复取出
+    assert scheduler.pop_due(now=1030) is None
+
+    # 重新加载时不会把执行中的任务再次放回队列
+    scheduler.load([task_row(1, 'a'), task_row(2, 'b')])
+    assert scheduler.pop_due(now=1030) is None
+
+    scheduler.defer((0, 'a'), 0, now=1030)
+    assert scheduler.pop_due(now=1030) == (0, 'a')
+
+
+def test_retain_drops_removed_tasks():
+    scheduler = make_scheduler([task_row(1, 'a'), task_row(2, 'b')])
+    scheduler.defer((0, 'a'), 0, now=1000)
+    scheduler.defer((0, 'b'), 0, now=1000)
+
+    assert scheduler.retain({(0, 'b')}) == 1
+    assert len(scheduler) == 1
+    assert scheduler.task_id((0, 'a')) is None
+    # 已移除任务留在堆中的条目会被跳过
+    assert scheduler.pop_due(now=1000) == (0, 'b')
+    assert scheduler.pop_due(now=1000) is None
+    assert scheduler.record((0, 'a'), 0.5, now=1000) is None
+
+
+def test_take_dirty_returns_changed_tasks_once():
+    scheduler = make_scheduler([task_row(1, 'a'), task_row(2, 'b')])
+    scheduler.take_dirty()
+
+    scheduler.record((0, 'a'), None, now=1000)
+    rows = scheduler.take_dirty()
+    assert len(rows) == 1
+    interval, change_rate, last_poll, next_due, task_id = rows[0]
+    assert (interval, change_rate, task_id) == (10, None, 1)
+    assert last_poll.timestamp() == 1000
+    assert next_due.timestamp() == 1010
+    assert scheduler.take_dirty() == []
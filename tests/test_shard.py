@@ -0,0 +1,69 @@
+"""
+分片分配测试：rendezvous 哈希的覆盖性、确定性，以及进程加入或退出时的换主范围
+"""
+from collector import shard as shard_module
+from collector.shard import ShardCoordinator, assign_tasks, shard_weight
+
+WORKERS = ['host-a:1', 'host-b:2', 'host-c:3']
+TASKS = list(range(1, 301))
+
+
+def owners(assignment):
+    return {task_id: worker for worker, tasks in assignment.items() for task_id in tasks}
+
+
+def test_assignment_is_disjoint_and_complete():
+    assignment = assign_tasks(WORKERS, TASKS)
+
+    assert set(assignment) == set(WORKERS)
+    assert sum(len(tasks) for tasks in assignment.values()) == len(TASKS)
+    assert set().union(*assignment.values()) == set(TASKS)
+    # 300 个任务分给 3 个进程，不应明显偏斜
+    assert all(50 <= len(tasks) <= 150 for tasks in assignment.values())
+
+
+def test_assignment_independent_of_order():
+    assert assign_tasks(WORKERS, TASKS) == assign_tasks(list(reversed(WORKERS)), TASKS[::-1])
+    assert shard_weight('host-a:1', 7) == shard_weight('host-a:1', 7)
+
+
+def test_adding_worker_only_moves_tasks_to_it():
+    before = owners(assign_tasks(WORKERS, TASKS))
+    after = owners(assign_tasks(WORKERS + ['host-d:4'], TASKS))
+
+    moved = [task_id for task_id in TASKS if before[task_id] != after[task_id]]
+    assert moved
+    assert all(after[task_id] == 'host-d:4' for task_id in moved)
+
+
+def test_removing_worker_only_moves_its_tasks():
+    before = owners(assign_tasks(WORKERS, TASKS))
+    after = owners(assign_tasks(WORKERS[:2], TASKS))
+
+    for task_id in TASKS:
+        if before[task_id] != 'host-c:3':
+            assert after[task_id] == before[task_id]
+        else:
+            assert after[task_id] in WORKERS[:2]
+
+
+def test_no_workers():
+    assert assign_tasks([], TASKS) == {}
+    assert assign_tasks(WORKERS, []) == {worker: set() for worker in WORKERS}
+
+
+def test_heartbeat_failure_drops_owned_tasks(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("数据库不可用")
+
+    monkeypatch.setattr(shard_module, 'Database', unavailable)
+    coordinator = ShardCoordinator('host-a:1')
+    coordinator._set_owned(frozenset({(0, 1)}))
+    assert coordinator.version == 1
+
+    assert coordinator.heartbeat() is False
+    assert coordinator.owned == frozenset()
+    assert coordinator.version == 2
+    # 分片没有变化时版本号不变
+    coordinator._set_owned(frozenset())
+    assert coordinator.version == 2
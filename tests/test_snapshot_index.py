@@ -0,0 +1,121 @@
+"""
+订单索引比对测试：新增/变化/下架/重新发布/未变化的分类，以及写入成功后的合并
+"""
+from datetime import datetime
+
+from collector.columns import SnapshotColumns
+from collector.snapshot_index import OrderIndex, SnapshotDiff
+
+
+def order(market_id, price=1.5, quantity=10, quality=0, fees=3, posted='2024-05-01T08:00:00Z'):
+    return {
+        'id': market_id,
+        'kind': 1,
+        'quantity': quantity,
+        'quality': quality,
+        'price': price,
+        'fees': fees,
+        'posted': posted,
+        'seller': {
+            'id': 100 + market_id,
+            'company': f'公司{market_id}',
+            'realmId': 0,
+            'certificates': 1,
+            'contest_wins': 0,
+            'npc': False
+        }
+    }
+
+
+def indexed(*items):
+    index = OrderIndex('0_1')
+    index.apply(index.diff(SnapshotColumns.from_items(list(items))))
+    return index
+
+
+def test_first_snapshot_inserts_everything():
+    index = OrderIndex('0_1')
+    diff = index.diff(SnapshotColumns.from_items([order(1), order(2)]))
+
+    assert [i for i, _ in diff.inserted] == [0, 1]
+    assert diff.changed == [] and diff.removed == [] and diff.unchanged == 0
+    assert diff.change_ratio == 1.0
+    # 比对本身不修改索引
+    assert index.orders == {}
+
+    index.apply(diff)
+    assert index.orders[1] == ((1500, 10, 0, 3, '2024-05-01T08:00:00'), 1)
+
+
+def test_diff_classification():
+    index = indexed(order(1), order(2), order(3), order(4))
+    diff = index.diff(SnapshotColumns.from_items([
+        order(1),                                   # 未变化
+        order(2, quantity=5),                       # 数量变化
+        order(3, posted='2024-05-01T09:00:00Z'),    # 重新发布
+        order(5)                                    # 新订单
+    ]))
+
+    assert diff.unchanged == 1
+    assert [(i, version) for i, _, version in diff.changed] == [(1, 2), (2, 2)]
+    assert diff.reposted == [3]
+    assert [i for i, _ in diff.inserted] == [3]
+    assert diff.removed == [4]
+    assert diff.change_ratio == 4 / 5
+
+
+def test_apply_bumps_versions_and_drops_removed():
+    index = indexed(order(1), order(2))
+    diff = index.diff(SnapshotColumns.from_items([order(1, price=2.0)]))
+    index.apply(diff)
+
+    assert index.orders == {1: ((2000, 10, 0, 3, '2024-05-01T08:00:00'), 2)}
+
+    # 再变化一次版本号继续递增
+    index.apply(index.diff(SnapshotColumns.from_items([order(1, price=2.5)])))
+    assert index.orders[1][1] == 3
+
+
+def test_unchanged_snapshot_has_zero_ratio():
+    index = indexed(order(1), order(2))
+    diff = index.diff(SnapshotColumns.from_items([order(2), order(1)]))
+
+    assert diff.unchanged == 2
+    assert diff.change_ratio == 0.0
+    assert SnapshotDiff(SnapshotColumns()).change_ratio == 0.0
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def fetch_all(self, sql, params=None):
+        self.queries.append(sql)
+        return self.rows
+
+
+class FakeTable:
+    label = '0_1'
+    name = 'market_orders'
+
+    def where(self):
+        return 'server_type = 0 AND product_type = 1'
+
+
+def test_warm_state_matches_api_state():
+    # 数据库中的发布时间是 MySQL 四舍五入后的整秒，必须与接口时间得到相同的状态
+    db = FakeDb([{
+        'market_id': 1,
+        'price': 1.5,
+        'quantity': 10,
+        'quality': 0,
+        'fees': 3,
+        'posted_time': datetime(2024, 5, 1, 8, 0, 1),
+        'data_version': 4
+    }])
+    index = OrderIndex.warm(db, FakeTable())
+
+    assert 'is_valid = 1' in db.queries[0]
+    diff = index.diff(SnapshotColumns.from_items([order(1, posted='2024-05-01T08:00:00.6Z')]))
+    assert diff.unchanged == 1 and diff.changed == []